@@ -1,11 +1,9 @@
-from transformers import pipeline
 from mistralai.client import MistralClient
 from mistralai.models.chat_completion import ChatMessage
 from ..config import settings
 
 class QueryAnalyzer:
     def __init__(self):
-        self.classifier = pipeline("text-classification", model="distilbert-base-uncased")
         self.mistral_client = MistralClient(api_key=settings.MISTRAL_API_KEY)
 
     def generate_sql_query(self, prompt: str) -> str:
@@ -22,8 +20,6 @@ class QueryAnalyzer:
         return response.choices[0].message.content
 
     def determine_visualization_type(self, prompt: str) -> str:
-        result = self.classifier(prompt)
-        
         if "trend" in prompt.lower() or "evolution" in prompt.lower():
             return "line"
         elif "distribution" in prompt.lower() or "frequency" in prompt.lower():
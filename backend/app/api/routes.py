@@ -6,8 +6,7 @@ from ..ai.query_analyzer import QueryAnalyzer
 from pydantic import BaseModel
 import logging
 
-# Configuration du logging
-logging.basicConfig(level=logging.INFO)
+# Handlers configurés par l'application (setup_logging)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -34,7 +33,7 @@ async def health_check(db: Session = Depends(get_db)):
         db.execute("SELECT 1")
         db_status = "healthy"
     except Exception as e:
-        logger.error(f"Database health check failed: {str(e)}")
+        logger.error("Database health check failed: %s", e)
         db_status = "unhealthy"
 
     return HealthResponse(
@@ -46,11 +45,11 @@ async def health_check(db: Session = Depends(get_db)):
 @router.post("/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest, db: Session = Depends(get_db)):
     try:
-        logger.info(f"Processing query: {request.prompt}")
+        logger.info("Processing query: %s", request.prompt)
         
         # Générer la requête SQL
         sql_query = query_analyzer.generate_sql_query(request.prompt)
-        logger.info(f"Generated SQL query: {sql_query}")
+        logger.info("Generated SQL query: %s", sql_query)
         
         # Exécuter la requête
         result = db.execute(sql_query)
@@ -59,7 +58,7 @@ async def process_query(request: QueryRequest, db: Session = Depends(get_db)):
         
         # Déterminer le type de visualisation
         viz_type = query_analyzer.determine_visualization_type(request.prompt)
-        logger.info(f"Visualization type determined: {viz_type}")
+        logger.info("Visualization type determined: %s", viz_type)
         
         return QueryResponse(
             data=data,
@@ -68,7 +67,7 @@ async def process_query(request: QueryRequest, db: Session = Depends(get_db)):
             sql_query=sql_query
         )
     except Exception as e:
-        logger.error(f"Error processing query: {str(e)}")
+        logger.error("Error processing query: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing query: {str(e)}"
@@ -1,70 +1,134 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
-from ....db.base import get_db
+from typing import List, Dict, Any, Optional, Tuple
+from ....db.base import get_db, get_read_db, ReadSessionLocal, is_statement_timeout, run_db
 from ....services.ai_service import AIService
+from ....services.result_store import ResultStore
+from ....services.rollups import RollupManager
+from ....services.query_planner import ACTION_QUEUE, QueryPlanner, QueryRejectedError, SlowLane
+from ....services.sql_template import execute_template, parameterize
+from ....services.chart_reduction import reduce_for_chart
+from ....services.serialization import (
+    ARROW_MEDIA_TYPE,
+    COLUMNAR_MEDIA_TYPE,
+    FORMAT_ARROW,
+    FORMAT_COLUMNAR,
+    FORMAT_JSON,
+    negotiate_format,
+    to_arrow_ipc,
+    to_columnar_json,
+    unique_column_names
+)
+from ....core.config import settings
 from ....core.logging import get_logger
+from ....core.rate_limit import RateLimiter
+from ....core.metrics import PROCESS_START_TIME, registry, stage, start_request_timings
+from ....core.deadline import DeadlineExceeded, RequestDeadline, current_deadline, start_deadline
 from pydantic import BaseModel, Field, validator
 from sqlalchemy.exc import SQLAlchemyError
+import asyncio
+import json
 import time
 from functools import wraps
 
 router = APIRouter()
 logger = get_logger(__name__)
 ai_service = AIService()
+result_store = ResultStore()
+query_planner = QueryPlanner()
+rollup_manager = RollupManager()
+slow_lane = SlowLane(settings.SLOW_QUERY_CONCURRENCY)
 
 def rate_limit(max_requests: int = 100, window: int = 3600):
-    """Décorateur pour limiter le nombre de requêtes par IP."""
-    requests = {}
-    
+    """Décorateur pour limiter le nombre de requêtes par IP (fenêtre glissante).
+
+    L'état est partagé entre workers si RATE_LIMIT_BACKEND vaut "sqlite".
+    """
     def decorator(func):
+        limiter = RateLimiter(max_requests, window)
+
         @wraps(func)
         async def wrapper(request: Request, *args, **kwargs):
-            client_ip = request.client.host
-            current_time = time.time()
-            
-            # Nettoie les anciennes requêtes
-            requests[client_ip] = [t for t in requests.get(client_ip, []) 
-                                 if current_time - t < window]
-            
-            # Vérifie la limite
-            if len(requests.get(client_ip, [])) >= max_requests:
+            key = f"{func.__name__}:{request.client.host}"
+            if limiter.blocking:
+                allowed, retry_after = await run_in_threadpool(limiter.hit, key)
+            else:
+                allowed, retry_after = limiter.hit(key)
+            if not allowed:
                 raise HTTPException(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Too many requests. Please try again later."
+                    detail="Too many requests. Please try again later.",
+                    headers={"Retry-After": str(retry_after)}
                 )
             
-            # Ajoute la nouvelle requête
-            requests.setdefault(client_ip, []).append(current_time)
-            
             return await func(request, *args, **kwargs)
         return wrapper
     return decorator
 
+def _check_prompt(v: str) -> str:
+    if not v.strip():
+        raise ValueError("Prompt cannot be empty or whitespace")
+    if len(v.split()) < 2:
+        raise ValueError("Prompt must contain at least 2 words")
+    return v
+
 class QueryRequest(BaseModel):
     prompt: str = Field(..., min_length=3, max_length=500)
     page: int = Field(1, ge=1)
     page_size: int = Field(10, ge=1, le=100)
+    result_id: Optional[str] = Field(None, max_length=64)
+    # Si fourni : résultat complet réduit pour le graphique au lieu d'une page
+    max_points: Optional[int] = Field(None, ge=10, le=settings.CHART_MAX_POINTS_LIMIT)
 
     @validator('prompt')
     def validate_prompt(cls, v):
         """Valide le contenu du prompt."""
-        if not v.strip():
-            raise ValueError("Prompt cannot be empty or whitespace")
-        if len(v.split()) < 2:
-            raise ValueError("Prompt must contain at least 2 words")
-        return v
+        return _check_prompt(v)
 
 class QueryResponse(BaseModel):
     data: List[Dict[str, Any]]
     visualization_type: str
     title: str
     sql_query: str
-    total_count: int
+    # None si le résultat est tronqué (total inconnu) ; la pagination porte sur les lignes stockées
+    total_count: Optional[int] = None
     page: int
     page_size: int
     total_pages: int
     execution_time: float
+    result_id: Optional[str] = None
+    truncated: bool = False
+    query_plan: Optional[Dict[str, Any]] = None
+    rollup: Optional[str] = None
+    reduction: Optional[Dict[str, Any]] = None
+
+class BatchQueryRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=settings.BATCH_MAX_PROMPTS)
+    page_size: int = Field(10, ge=1, le=100)
+    max_points: Optional[int] = Field(None, ge=10, le=settings.CHART_MAX_POINTS_LIMIT)
+
+    @validator('prompts', each_item=True)
+    def validate_prompts(cls, v):
+        """Valide chaque prompt comme pour /query."""
+        if not 3 <= len(v) <= 500:
+            raise ValueError("Prompt must be between 3 and 500 characters")
+        return _check_prompt(v)
+
+class BatchItemResponse(BaseModel):
+    prompt: str
+    status_code: int
+    result: Optional[QueryResponse] = None
+    error: Optional[Any] = None
+    shared_result: bool = False  # même requête SQL qu'un prompt précédent du lot
+    timings: Dict[str, float]
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchItemResponse]
+    distinct_queries: int
+    execution_time: float
 
 class HealthResponse(BaseModel):
     status: str
@@ -76,14 +140,12 @@ class HealthResponse(BaseModel):
 @router.get("/health", response_model=HealthResponse)
 async def health_check(db: Session = Depends(get_db)):
     """Vérifie la santé du service et de ses dépendances."""
-    start_time = time.time()
-    
     try:
         # Vérifie la base de données
-        db.execute("SELECT 1")
+        await run_db(db.execute, text("SELECT 1"))
         db_status = "healthy"
     except SQLAlchemyError as e:
-        logger.error(f"Database health check failed: {str(e)}")
+        logger.error("Database health check failed: %s", e)
         db_status = "unhealthy"
 
     # Vérifie le service AI
@@ -91,7 +153,7 @@ async def health_check(db: Session = Depends(get_db)):
         ai_service.determine_visualization_type("test")
         ai_status = "healthy"
     except Exception as e:
-        logger.error(f"AI service health check failed: {str(e)}")
+        logger.error("AI service health check failed: %s", e)
         ai_status = "unhealthy"
 
     return HealthResponse(
@@ -99,82 +161,614 @@ async def health_check(db: Session = Depends(get_db)):
         version="1.0.0",
         database_status=db_status,
         ai_service_status=ai_status,
-        uptime=time.time() - start_time
+        uptime=time.time() - PROCESS_START_TIME
     )
 
+def _cache_metrics() -> List[str]:
+    """Expose les compteurs des caches au format Prometheus."""
+    stats = ai_service.get_cache_stats()
+    lines = []
+    if stats.get("enabled"):
+        for name, key, kind in (
+            ("sql_cache_hits_total", "hits", "counter"),
+            ("sql_cache_misses_total", "misses", "counter"),
+            ("sql_cache_evictions_total", "evictions", "counter"),
+            ("sql_cache_entries", "size", "gauge"),
+        ):
+            lines += [f"# TYPE {name} {kind}", f"{name} {stats[key]}"]
+    index = stats.get("prompt_index")
+    if index:
+        lines += [
+            "# TYPE prompt_index_reuses_total counter", f"prompt_index_reuses_total {index['reuses']}",
+            "# TYPE prompt_index_few_shot_total counter", f"prompt_index_few_shot_total {index['few_shot_requests']}",
+            "# TYPE prompt_index_entries gauge", f"prompt_index_entries {index['size']}",
+        ]
+    return lines
+
+registry.register_collector(_cache_metrics)
+
+@router.get("/cache/stats")
+async def cache_stats() -> Dict[str, Any]:
+    """Retourne les compteurs du cache prompt -> SQL."""
+    return ai_service.get_cache_stats()
+
+def _build_page_response(
+    meta: Dict[str, Any],
+    page: int,
+    page_size: int,
+    start_time: float,
+    response_format: str = FORMAT_JSON,
+    max_points: Optional[int] = None
+):
+    """Construit la réponse d'une page à partir d'un résultat matérialisé.
+
+    En format colonnaire (JSON ou Arrow), les lignes ne passent pas par
+    QueryResponse et les noms de colonnes ne sont émis qu'une fois.
+    Avec max_points, la réponse porte tout le résultat matérialisé, réduit
+    selon le type de visualisation (une seule page).
+    """
+    columns = meta["columns"]
+    reduction = None
+    if max_points:
+        with stage("fetch_page"):
+            rows = result_store.fetch_rows(meta["result_id"], 0, meta["stored_count"])
+        with stage("reduce"):
+            columns, rows, reduction = reduce_for_chart(
+                columns, rows, meta["visualization_type"], max_points
+            )
+        if reduction is not None:
+            reduction["input_rows"] = meta["stored_count"]
+        page, page_size, total_pages = 1, max(len(rows), 1), 1
+    else:
+        with stage("fetch_page"):
+            rows = result_store.fetch_rows(meta["result_id"], (page - 1) * page_size, page_size)
+        # Seules les lignes stockées sont paginables
+        total_pages = (meta["stored_count"] + page_size - 1) // page_size
+
+    metadata = {
+        "visualization_type": meta["visualization_type"],
+        "title": meta["title"],
+        "sql_query": meta["sql_query"],
+        "total_count": meta["total_count"],
+        "page": page,
+        "page_size": page_size,
+        "total_pages": total_pages,
+        "execution_time": time.time() - start_time,
+        "result_id": meta["result_id"],
+        "truncated": meta["truncated"],
+        "query_plan": meta.get("query_plan"),
+        "rollup": meta.get("rollup"),
+        "reduction": reduction
+    }
+
+    # En JSON, l'encodage final par FastAPI n'est compté que dans la durée totale
+    with stage("serialize"):
+        if response_format == FORMAT_ARROW:
+            return Response(content=to_arrow_ipc(columns, rows, metadata), media_type=ARROW_MEDIA_TYPE)
+        if response_format == FORMAT_COLUMNAR:
+            return Response(content=to_columnar_json(columns, rows, metadata), media_type=COLUMNAR_MEDIA_TYPE)
+
+        names = unique_column_names(columns)
+        return QueryResponse(
+            data=[dict(zip(names, row)) for row in rows],
+            **metadata
+        )
+
+def _get_result_meta(result_id: str) -> Dict[str, Any]:
+    """Retourne les métadonnées d'un résultat matérialisé ou lève une 404."""
+    meta = result_store.get_meta(result_id)
+    if meta is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Result not found or expired"
+        )
+    return meta
+
+def _plan_query(db: Session, sql_query: str) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
+    """Redirige vers une table d'agrégats si possible, puis estime le coût."""
+    with stage("plan"):
+        sql_query, rollup = rollup_manager.rewrite(db, sql_query)
+        sql_query, query_plan = query_planner.guard(db, sql_query)
+    return sql_query, rollup, query_plan
+
+def _execute_and_materialize(db: Session, sql_query: str, title: str) -> Dict[str, Any]:
+    """Exécute la requête une seule fois et matérialise le résultat.
+
+    Le nombre total de lignes est obtenu pendant cette lecture.
+    """
+    with stage("execute"):
+        result = execute_template(db, sql_query)
+        return result_store.materialize(result, sql_query, title=title)
+
+def _choose_visualization(meta: Dict[str, Any], prompt: str) -> str:
+    """Détermine le type de visualisation à partir d'un échantillon du résultat."""
+    with stage("visualization"):
+        sample = result_store.fetch_rows(meta["result_id"], 0, settings.VIZ_SAMPLE_ROWS)
+        viz_type = ai_service.determine_visualization_type(
+            prompt,
+            columns=meta["columns"],
+            rows=sample,
+            row_count=meta["stored_count"]
+        )
+    result_store.set_visualization_type(meta["result_id"], viz_type)
+    return viz_type
+
+@router.get("/results/{result_id}", response_model=QueryResponse)
+async def get_result_page(
+    request: Request,
+    result_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=100),
+    format: Optional[str] = Query(None, pattern="^(json|columnar|arrow)$"),
+    max_points: Optional[int] = Query(None, ge=10, le=settings.CHART_MAX_POINTS_LIMIT)
+):
+    """Retourne une page d'un résultat déjà matérialisé, sans appel au LLM ni ré-exécution.
+
+    Avec max_points, retourne les données du graphique, réduites côté serveur.
+    """
+    start_time = time.time()
+    response_format = negotiate_format(format, request.headers.get("accept"))
+    meta = await run_db(_get_result_meta, result_id)
+    return await run_db(_build_page_response, meta, page, page_size, start_time, response_format, max_points)
+
+# Code non standard (nginx) : le client a fermé la connexion avant la réponse
+STATUS_CLIENT_CLOSED_REQUEST = 499
+
+def _request_timeout(request: Request) -> float:
+    """Budget demandé par le client (en-tête X-Request-Timeout, en secondes), borné."""
+    try:
+        timeout = float(request.headers.get("x-request-timeout", settings.REQUEST_TIMEOUT))
+    except ValueError:
+        timeout = settings.REQUEST_TIMEOUT
+    return min(max(timeout, 1.0), settings.REQUEST_TIMEOUT_MAX)
+
+async def _watch_disconnect(request: Request, deadline: RequestDeadline, task: asyncio.Future) -> None:
+    """Annule le traitement dès que le client se déconnecte."""
+    while not task.done():
+        if await request.is_disconnected():
+            logger.info("Client %s disconnected, cancelling request", request.client.host)
+            deadline.cancel()
+            task.cancel()
+            return
+        await asyncio.sleep(settings.DISCONNECT_POLL_INTERVAL)
+
+async def _run_with_deadline(request: Request, coro):
+    """Exécute le traitement d'une requête sous son échéance.
+
+    L'échéance est héritée par chaque étape (tâches, threads de run_db,
+    instructions SQL). Si elle est dépassée ou si le client se déconnecte,
+    l'appel au LLM est annulé et les instructions SQL en cours sont
+    interrompues ; on attend la fin des threads concernés avant de rendre
+    la main, la session pouvant alors être refermée sans risque.
+    """
+    deadline = start_deadline(_request_timeout(request))
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(_watch_disconnect(request, deadline, task))
+    try:
+        await asyncio.wait({task}, timeout=deadline.remaining())
+    finally:
+        watcher.cancel()
+        if not task.done():
+            deadline.cancel()
+            task.cancel()
+            # cancel() ne fait que demander l'annulation : la tâche doit la traiter
+            await asyncio.wait({task})
+        pending = deadline.pending_work()
+        if pending:
+            await asyncio.wait([asyncio.wrap_future(work) for work in pending])
+
+    if task.cancelled():
+        if deadline.cancelled.is_set() and deadline.remaining() > 0:
+            raise HTTPException(
+                status_code=STATUS_CLIENT_CLOSED_REQUEST,
+                detail="Client closed request"
+            )
+        logger.warning("Request deadline exceeded: %s", request.url.path)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Request deadline exceeded"
+        )
+    return task.result()
+
+def _slow_lane_timeout() -> float:
+    deadline = current_deadline()
+    if deadline is None:
+        return settings.SLOW_QUERY_WAIT_TIMEOUT
+    return min(settings.SLOW_QUERY_WAIT_TIMEOUT, deadline.remaining())
+
+async def _acquire_slow_lane() -> bool:
+    """Attend une place dans la file des requêtes coûteuses, sans fuite si la requête est annulée."""
+    acquire = asyncio.ensure_future(run_in_threadpool(slow_lane.acquire, _slow_lane_timeout()))
+    try:
+        return await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # La place obtenue après l'annulation est rendue aussitôt
+        acquire.add_done_callback(
+            lambda done: slow_lane.release() if not done.cancelled() and done.result() else None
+        )
+        raise
+
 @router.post("/query", response_model=QueryResponse)
 @rate_limit(max_requests=100, window=3600)
 async def process_query(
     request: Request,
     query_request: QueryRequest,
-    db: Session = Depends(get_db)
+    format: Optional[str] = Query(None, pattern="^(json|columnar|arrow)$"),
+    db: Session = Depends(get_read_db)
 ):
-    """Traite une requête d'analyse de données."""
+    """Traite une requête d'analyse de données.
+
+    Le format de réponse colonnaire est choisi par `format=columnar|arrow`
+    ou par l'en-tête Accept. Les accès base passent par run_db : une requête
+    longue ne bloque pas la boucle d'événements du worker. Le traitement est
+    borné par l'échéance de la requête (X-Request-Timeout) et abandonné si
+    le client se déconnecte.
+    """
     start_time = time.time()
+    response_format = negotiate_format(format, request.headers.get("accept"))
+    return await _run_with_deadline(
+        request,
+        _process_query(request, query_request, response_format, db, start_time)
+    )
+
+async def _process_query(
+    request: Request,
+    query_request: QueryRequest,
+    response_format: str,
+    db: Session,
+    start_time: float
+):
+    # Pages suivantes : lecture directe du résultat matérialisé
+    if query_request.result_id:
+        meta = await run_db(_get_result_meta, query_request.result_id)
+        return await run_db(
+            _build_page_response,
+            meta, query_request.page, query_request.page_size, start_time, response_format,
+            query_request.max_points
+        )
     
     try:
-        logger.info(f"Processing query from {request.client.host}: {query_request.prompt}")
+        logger.info("Processing query from %s: %s", request.client.host, query_request.prompt)
         
         # Génère la requête SQL
-        sql_query = ai_service.generate_sql_query(query_request.prompt)
-        
-        # Calcule l'offset pour la pagination
-        offset = (query_request.page - 1) * query_request.page_size
-        
-        # Ajoute la pagination à la requête SQL
-        paginated_sql = f"""
-        WITH base_query AS (
-            {sql_query}
-        )
-        SELECT * FROM base_query
-        LIMIT {query_request.page_size}
-        OFFSET {offset}
-        """
-        
-        # Exécute la requête paginée
-        result = db.execute(paginated_sql)
-        data = [dict(zip([col[0] for col in result.cursor.description], row)) 
-                for row in result.fetchall()]
-        
-        # Compte le nombre total de résultats
-        count_sql = f"SELECT COUNT(*) as total FROM ({sql_query}) as count_query"
-        total_count = db.execute(count_sql).scalar()
+        sql_query = await ai_service.agenerate_sql_query(query_request.prompt)
         
-        # Calcule le nombre total de pages
-        total_pages = (total_count + query_request.page_size - 1) // query_request.page_size
-        
-        # Détermine le type de visualisation
-        viz_type = ai_service.determine_visualization_type(query_request.prompt)
+        # Redirige vers une table d'agrégats si possible, puis estime le coût
+        sql_query, rollup, query_plan = await run_db(_plan_query, db, sql_query)
+        in_slow_lane = bool(query_plan) and query_plan["action"] == ACTION_QUEUE
+        if in_slow_lane:
+            with stage("queue_wait"):
+                acquired = await _acquire_slow_lane()
+            if not acquired:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many expensive queries in progress. Please try again later."
+                )
         
-        execution_time = time.time() - start_time
+        try:
+            meta = await run_db(_execute_and_materialize, db, sql_query, query_request.prompt)
+        finally:
+            if in_slow_lane:
+                slow_lane.release()
+        meta["query_plan"] = query_plan
+        meta["rollup"] = rollup
+        meta["visualization_type"] = await run_db(_choose_visualization, meta, query_request.prompt)
         
-        return QueryResponse(
-            data=data,
-            visualization_type=viz_type,
-            title=query_request.prompt,
-            sql_query=sql_query,
-            total_count=total_count,
-            page=query_request.page,
-            page_size=query_request.page_size,
-            total_pages=total_pages,
-            execution_time=execution_time
+        return await run_db(
+            _build_page_response,
+            meta, query_request.page, query_request.page_size, start_time, response_format,
+            query_request.max_points
         )
         
+    except HTTPException:
+        raise
+    except (DeadlineExceeded, asyncio.TimeoutError) as e:
+        logger.warning("Request abandoned: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Request deadline exceeded"
+        )
+    except QueryRejectedError as e:
+        logger.warning("Query rejected by cost guard: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": str(e), "query_plan": e.plan}
+        )
     except ValueError as e:
-        logger.error(f"Invalid query: {str(e)}")
+        logger.error("Invalid query: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
     except SQLAlchemyError as e:
-        logger.error(f"Database error: {str(e)}")
+        if is_statement_timeout(e):
+            logger.warning("Query exceeded time budget: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Query exceeded the execution time budget"
+            )
+        logger.error("Database error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database error occurred"
         )
     except Exception as e:
-        logger.error(f"Error processing query: {str(e)}")
+        logger.error("Error processing query: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred"
-        ) 
\ No newline at end of file
+        )
+
+def _describe_error(exc: Exception) -> Tuple[int, Any]:
+    """Code HTTP et détail d'une erreur, comme les renverrait /query."""
+    if isinstance(exc, HTTPException):
+        return exc.status_code, exc.detail
+    if isinstance(exc, (DeadlineExceeded, asyncio.TimeoutError)):
+        return status.HTTP_504_GATEWAY_TIMEOUT, "Request deadline exceeded"
+    if isinstance(exc, QueryRejectedError):
+        return status.HTTP_422_UNPROCESSABLE_ENTITY, {"message": str(exc), "query_plan": exc.plan}
+    if isinstance(exc, ValueError):
+        return status.HTTP_400_BAD_REQUEST, str(exc)
+    if isinstance(exc, SQLAlchemyError):
+        if is_statement_timeout(exc):
+            return status.HTTP_504_GATEWAY_TIMEOUT, "Query exceeded the execution time budget"
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, "Database error occurred"
+    return status.HTTP_500_INTERNAL_SERVER_ERROR, "An unexpected error occurred"
+
+async def _generate_batch_item(item: Dict[str, Any]) -> None:
+    """Génère le SQL d'un prompt du lot ; exécuté dans sa propre tâche."""
+    # Chaque tâche a sa copie du contexte : relevé des étapes propre au prompt
+    start_request_timings(item["timings"])
+    try:
+        item["sql_query"] = await ai_service.agenerate_sql_query(item["prompt"])
+    except Exception as e:
+        item["error"] = e
+
+def _begin_snapshot(db: Session) -> None:
+    """Ouvre une transaction explicite : toutes les requêtes du lot lisent le même instantané."""
+    db.connection().exec_driver_sql("BEGIN")
+
+def _execute_batch_query(db: Session, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Réécrit, contrôle, exécute et matérialise la requête d'un prompt du lot."""
+    sql_query, rollup, query_plan = _plan_query(db, item["sql_query"])
+    in_slow_lane = bool(query_plan) and query_plan["action"] == ACTION_QUEUE
+    if in_slow_lane:
+        with stage("queue_wait"):
+            acquired = slow_lane.acquire(_slow_lane_timeout())
+        if not acquired:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many expensive queries in progress. Please try again later."
+            )
+    try:
+        meta = _execute_and_materialize(db, sql_query, item["prompt"])
+    finally:
+        if in_slow_lane:
+            slow_lane.release()
+    meta["query_plan"] = query_plan
+    meta["rollup"] = rollup
+    with stage("visualization"):
+        meta["sample"] = result_store.fetch_rows(meta["result_id"], 0, settings.VIZ_SAMPLE_ROWS)
+    return meta
+
+def _run_batch(
+    items: List[Dict[str, Any]],
+    page_size: int,
+    max_points: Optional[int],
+    start_time: float
+) -> int:
+    """Exécute les requêtes du lot sur une seule connexion et un seul instantané.
+
+    Les requêtes identiques (même gabarit et mêmes paramètres) ne sont
+    exécutées et matérialisées qu'une fois. Retourne le nombre de requêtes
+    distinctes exécutées.
+    """
+    executed: Dict[Tuple, Any] = {}
+    with ReadSessionLocal() as db:
+        _begin_snapshot(db)
+        for item in items:
+            if item["error"] is not None:
+                continue
+            start_request_timings(item["timings"])
+            deadline = current_deadline()
+            if deadline is not None and deadline.expired():
+                item["error"] = DeadlineExceeded("Request deadline exceeded or client disconnected")
+                continue
+            template = parameterize(item["sql_query"])
+            key = (template.text, tuple(sorted(template.params.items())))
+            try:
+                if key in executed:
+                    item["shared_result"] = True
+                else:
+                    try:
+                        executed[key] = _execute_batch_query(db, item)
+                    except Exception as e:
+                        executed[key] = e
+                        if db.bind.dialect.name != "sqlite":
+                            # DuckDB invalide la transaction après une erreur
+                            db.rollback()
+                            _begin_snapshot(db)
+                outcome = executed[key]
+                if isinstance(outcome, Exception):
+                    raise outcome
+
+                meta = dict(outcome, title=item["prompt"])
+                with stage("visualization"):
+                    meta["visualization_type"] = ai_service.determine_visualization_type(
+                        item["prompt"],
+                        columns=meta["columns"],
+                        rows=meta.pop("sample"),
+                        row_count=meta["stored_count"]
+                    )
+                if not item["shared_result"]:
+                    result_store.set_visualization_type(meta["result_id"], meta["visualization_type"])
+                item["result"] = _build_page_response(
+                    meta, 1, page_size, start_time, FORMAT_JSON, max_points
+                )
+            except Exception as e:
+                item["error"] = e
+    return len(executed)
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+@rate_limit(max_requests=100, window=3600)
+async def process_query_batch(request: Request, batch_request: BatchQueryRequest):
+    """Traite les prompts d'un tableau de bord en un seul appel.
+
+    Le SQL est généré en parallèle pour tous les prompts, puis les requêtes
+    sont exécutées sur une seule connexion en lecture et un même instantané
+    (résultats cohérents entre panneaux), les doublons une seule fois.
+    Chaque prompt a son propre résultat, ses durées par étape et son erreur
+    éventuelle ; l'échec d'un prompt n'interrompt pas les autres. Le lot
+    entier partage l'échéance de la requête.
+    """
+    start_time = time.time()
+    logger.info("Processing batch of %s prompts from %s", len(batch_request.prompts), request.client.host)
+    return await _run_with_deadline(request, _process_query_batch(batch_request, start_time))
+
+async def _process_query_batch(batch_request: BatchQueryRequest, start_time: float) -> BatchQueryResponse:
+    items = [
+        {"prompt": prompt, "sql_query": None, "result": None, "error": None,
+         "shared_result": False, "timings": {}}
+        for prompt in batch_request.prompts
+    ]
+
+    with stage("batch_generate"):
+        await asyncio.gather(*(_generate_batch_item(item) for item in items))
+    with stage("batch_execute"):
+        distinct_queries = await run_db(
+            _run_batch, items, batch_request.page_size, batch_request.max_points, start_time
+        )
+
+    results = []
+    for item in items:
+        if item["error"] is not None:
+            status_code, detail = _describe_error(item["error"])
+            if status_code >= 500:
+                logger.error("Batch prompt failed: %s", item["error"])
+        else:
+            status_code, detail = status.HTTP_200_OK, None
+        results.append(BatchItemResponse(
+            prompt=item["prompt"],
+            status_code=status_code,
+            result=item["result"],
+            error=detail,
+            shared_result=item["shared_result"],
+            timings={name: round(seconds, 6) for name, seconds in item["timings"].items()}
+        ))
+
+    return BatchQueryResponse(
+        results=results,
+        distinct_queries=distinct_queries,
+        execution_time=time.time() - start_time
+    )
+
+def _ndjson(payload: Dict[str, Any]) -> bytes:
+    """Sérialise un événement NDJSON."""
+    return (json.dumps(payload, default=str) + "\n").encode("utf-8")
+
+def _stream_rows(
+    prompt: str,
+    sql_query: str,
+    batch_size: int,
+    start_time: float,
+    query_plan: Optional[Dict[str, Any]] = None
+):
+    """Exécute la requête et émet les métadonnées puis les lignes par lots.
+
+    La session est ouverte ici et non via get_db : les dépendances sont
+    refermées avant l'envoi d'une StreamingResponse.
+    """
+    in_slow_lane = bool(query_plan) and query_plan["action"] == ACTION_QUEUE
+    if in_slow_lane and not slow_lane.acquire(settings.SLOW_QUERY_WAIT_TIMEOUT):
+        yield _ndjson({"type": "error", "detail": "Too many expensive queries in progress"})
+        return
+
+    db = ReadSessionLocal()
+    total_count = 0
+    try:
+        # Les en-têtes sont déjà partis : ces étapes ne vont que dans l'histogramme
+        with stage("execute"):
+            result = execute_template(db, sql_query)
+            columns = list(result.keys())
+            first_batch = [list(row) for row in result.fetchmany(batch_size)]
+
+        # Le type de visualisation est déduit du premier lot
+        with stage("visualization"):
+            viz_type = ai_service.determine_visualization_type(
+                prompt,
+                columns=columns,
+                rows=first_batch
+            )
+        yield _ndjson({
+            "type": "meta",
+            "title": prompt,
+            "sql_query": sql_query,
+            "visualization_type": viz_type,
+            "columns": columns,
+            "query_plan": query_plan
+        })
+
+        batch = first_batch
+        while batch:
+            total_count += len(batch)
+            yield _ndjson({"type": "rows", "rows": batch})
+            batch = [list(row) for row in result.fetchmany(batch_size)]
+
+        yield _ndjson({
+            "type": "end",
+            "total_count": total_count,
+            "execution_time": time.time() - start_time
+        })
+    except SQLAlchemyError as e:
+        logger.error("Database error while streaming: %s", e)
+        detail = "Query exceeded the execution time budget" if is_statement_timeout(e) else "Database error occurred"
+        yield _ndjson({"type": "error", "detail": detail})
+    finally:
+        db.close()
+        if in_slow_lane:
+            slow_lane.release()
+
+def _plan_stream_query(sql_query: str) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
+    with ReadSessionLocal() as db:
+        return _plan_query(db, sql_query)
+
+@router.post("/query/stream")
+@rate_limit(max_requests=100, window=3600)
+async def stream_query(
+    request: Request,
+    query_request: QueryRequest,
+    batch_size: int = Query(settings.STREAM_BATCH_SIZE, ge=1, le=10_000)
+):
+    """Variante en flux de /query : réponse NDJSON émise au fil des lots fetchmany.
+
+    Première ligne : métadonnées (SQL, type de visualisation, colonnes) ;
+    puis des lignes {"type": "rows"} ; enfin {"type": "end"} avec le total.
+    """
+    start_time = time.time()
+    try:
+        logger.info("Streaming query from %s: %s", request.client.host, query_request.prompt)
+        sql_query = await ai_service.agenerate_sql_query(query_request.prompt)
+        sql_query, rollup, query_plan = await run_db(_plan_stream_query, sql_query)
+    except QueryRejectedError as e:
+        logger.warning("Query rejected by cost guard: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": str(e), "query_plan": e.plan}
+        )
+    except ValueError as e:
+        logger.error("Invalid query: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error("Error processing query: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred"
+        )
+
+    return StreamingResponse(
+        _stream_rows(query_request.prompt, sql_query, batch_size, start_time, query_plan),
+        media_type="application/x-ndjson"
+    )
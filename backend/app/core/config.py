@@ -22,20 +22,121 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" ou "sqlite" (partagé entre workers)
+    RATE_LIMIT_DB_PATH: str = "./data/rate_limits.db"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
     
     # Base de données
     DATABASE_URL: str = "sqlite:///./data/analytics.db"
+
+    # Moteur en lecture seule (requêtes générées)
+    READ_POOL_SIZE: int = 8
+    READ_POOL_MAX_OVERFLOW: int = 4
+    READ_POOL_TIMEOUT: int = 10  # secondes
+    DB_EXECUTOR_WORKERS: int = 0  # threads dédiés aux requêtes, 0 = taille du pool de lecture
+    SQLITE_MMAP_SIZE: int = 268_435_456  # 256 Mo
+    SQLITE_CACHE_SIZE_KB: int = 65_536  # 64 Mo par connexion
+    SQLITE_CACHED_STATEMENTS: int = 128
+    SQL_STATEMENT_TIMEOUT: float = 15.0  # secondes, 0 pour désactiver
+    SQL_PROGRESS_STEPS: int = 10_000
+
+    # Moteur analytique colonnaire (ex. duckdb:///./data/analytics.duckdb) ; vide = SQLite
+    ANALYTICS_DATABASE_URL: str = ""
+    ANALYTICS_SYNC_INTERVAL: int = 300  # secondes
+    ANALYTICS_SYNC_BATCH_SIZE: int = 200_000
+    ANALYTICS_THREADS: int = 0  # 0 = tous les cœurs
+    ANALYTICS_MEMORY_LIMIT: str = ""  # ex. "4GB", vide = défaut DuckDB
+
+    # Garde-fou de coût (EXPLAIN QUERY PLAN)
+    SQL_PLAN_GUARD_ENABLED: bool = True
+    SQL_PLAN_MAX_COST: int = 1_000_000  # au-delà : SQL_PLAN_ACTION
+    SQL_PLAN_REJECT_COST: int = 50_000_000  # au-delà : refus
+    SQL_PLAN_MAX_CROSS_JOIN_ROWS: int = 10_000_000
+    SQL_PLAN_ACTION: str = "queue"  # "limit", "queue" ou "reject"
+    SQL_PLAN_AUTO_LIMIT: int = 10_000
+    SLOW_QUERY_CONCURRENCY: int = 1
+    SLOW_QUERY_WAIT_TIMEOUT: float = 30.0  # secondes
+
+    # Échéance des requêtes HTTP (en-tête X-Request-Timeout envoyé par le client)
+    REQUEST_TIMEOUT: float = 30.0  # secondes, si le client n'en indique pas
+    REQUEST_TIMEOUT_MAX: float = 120.0
+    DISCONNECT_POLL_INTERVAL: float = 0.5  # secondes entre deux vérifications de déconnexion
     
     # API Keys
     MISTRAL_API_KEY: str
+    MISTRAL_ENDPOINT: str = "https://api.mistral.ai"
     
     # Configuration du modèle
     MODEL_NAME: str = "distilbert-base-uncased"
     MODEL_CACHE_DIR: str = "./model_cache"
-    
+
+    # Choix de la visualisation
+    CLASSIFIER_MODEL: str = "distilbert-base-uncased"
+    VIZ_CLASSIFIER_ENABLED: bool = False
+    # Serveur d'inférence partagé (backend/inference_main.py) : unix:///chemin ou http://hôte:port.
+    # Vide : le classifieur est chargé dans chaque worker
+    INFERENCE_SERVER_URL: str = ""
+    INFERENCE_TIMEOUT: float = 2.0  # secondes
+    INFERENCE_RETRY_INTERVAL: float = 30.0  # secondes sans appel après un échec
+    VIZ_SAMPLE_ROWS: int = 5000
+
+    # Réduction des résultats pour les graphiques (max_points)
+    CHART_MAX_POINTS_LIMIT: int = 10_000
+    CHART_PIE_TOP_K: int = 10
+
+    # Appels LLM
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_MAX_CONNECTIONS: int = 16
+    LLM_TIMEOUT: int = 30  # secondes
+
+    # Cache prompt -> SQL
+    SQL_CACHE_ENABLED: bool = True
+    SQL_CACHE_PATH: str = "./data/sql_cache.db"
+    SQL_CACHE_MAX_ENTRIES: int = 5000
+    SQL_CACHE_TTL: int = 86400  # secondes
+    SQL_CACHE_ACCESS_FLUSH_INTERVAL: float = 30.0  # report en base des accès servis par la mémoire
+    SQL_TEMPLATE_CACHE_SIZE: int = 2048  # gabarits dont la validation et le plan sont mémorisés
+
+    # Catalogue du schéma injecté dans le prompt
+    SCHEMA_CATALOG_TOKEN_BUDGET: int = 600
+    SCHEMA_CATALOG_CHECK_INTERVAL: float = 5.0  # secondes entre deux sondes de version
+    SCHEMA_CATALOG_STATS_TTL: float = 600.0  # délai minimal entre deux recalculs après écriture
+    SCHEMA_CATALOG_SCAN_ROWS: int = 100_000  # en deçà, statistiques calculées sur toutes les colonnes
+    SCHEMA_CATALOG_MAX_ENUM: int = 30  # cardinalité maximale d'une colonne catégorielle
+    SCHEMA_CATALOG_TOP_VALUES: int = 8
+    SCHEMA_CATALOG_SAMPLE_ROWS: int = 200_000  # au-delà, valeurs fréquentes lues sur les dernières lignes
+
+    # Index de similarité prompt -> SQL (réutilisation et exemples few-shot)
+    PROMPT_INDEX_ENABLED: bool = True
+    PROMPT_INDEX_PATH: str = "./data/prompt_index.db"
+    PROMPT_INDEX_MAX_ENTRIES: int = 2000
+    PROMPT_INDEX_REUSE_THRESHOLD: float = 0.85  # similarité cosinus
+    PROMPT_INDEX_MIN_SIMILARITY: float = 0.35  # seuil des exemples few-shot
+    PROMPT_INDEX_FEW_SHOT_K: int = 3
+
+    # Tables d'agrégats
+    ROLLUPS_ENABLED: bool = True
+    ROLLUP_REFRESH_INTERVAL: int = 60  # secondes
+
+    # Ingestion en masse
+    INGEST_BATCH_SIZE: int = 50_000
+    INGEST_COMMIT_ROWS: int = 500_000
+    INGEST_DEFER_INDEX_ROWS: int = 200_000
+
+    # Résultats matérialisés (pagination)
+    RESULT_STORE_PATH: str = "./data/results.db"
+    RESULT_STORE_TTL: int = 3600  # secondes
+    RESULT_STORE_MAX_ROWS: int = 100_000
+    RESULT_STORE_BATCH_SIZE: int = 1000
+    STREAM_BATCH_SIZE: int = 500
+    BATCH_MAX_PROMPTS: int = 20  # prompts par appel à /query/batch
+
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    LOG_JSON: bool = False  # une ligne JSON par enregistrement au lieu de LOG_FORMAT
+    LOG_FILE: str = "logs/app.log"
+    LOG_QUEUE_SIZE: int = 10_000  # au-delà, les enregistrements sont abandonnés (et comptés)
     
     class Config:
         env_file = ".env"
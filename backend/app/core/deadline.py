@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+class DeadlineExceeded(Exception):
+    """Le budget de temps de la requête est épuisé, ou le client est parti."""
+
+class RequestDeadline:
+    """Échéance d'une requête HTTP, propagée à toutes ses étapes.
+
+    Les instructions SQL en cours s'y enregistrent (fonction d'interruption
+    de leur connexion) : cancel() les interrompt immédiatement, depuis
+    n'importe quel thread. Les moteurs bornent en outre chaque instruction
+    par le temps restant.
+    """
+
+    def __init__(self, timeout: float):
+        self.expires_at = time.monotonic() + timeout
+        self.cancelled = threading.Event()
+        self._interrupts: List[Callable[[], None]] = []
+        self._work: List[Future] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.cancelled.is_set() or time.monotonic() >= self.expires_at
+
+    def check(self) -> None:
+        """Lève DeadlineExceeded si la requête ne doit pas continuer."""
+        if self.expired():
+            raise DeadlineExceeded("Request deadline exceeded or client disconnected")
+
+    def attach(self, interrupt: Callable[[], None]) -> None:
+        """Enregistre l'interruption de l'instruction qui démarre."""
+        with self._lock:
+            self._interrupts.append(interrupt)
+        if self.cancelled.is_set():
+            interrupt()
+
+    def detach(self, interrupt: Callable[[], None]) -> None:
+        with self._lock:
+            if interrupt in self._interrupts:
+                self._interrupts.remove(interrupt)
+
+    def track(self, future: Future) -> None:
+        """Suit un travail soumis à un pool de threads pour cette requête."""
+        with self._lock:
+            self._work = [work for work in self._work if not work.done()]
+            self._work.append(future)
+
+    def pending_work(self) -> List[Future]:
+        """Travaux encore en cours (à attendre avant de libérer la session)."""
+        with self._lock:
+            return [work for work in self._work if not work.done()]
+
+    def cancel(self) -> None:
+        """Abandonne la requête et interrompt ses instructions en cours."""
+        self.cancelled.set()
+        with self._lock:
+            interrupts = list(self._interrupts)
+        for interrupt in interrupts:
+            interrupt()
+
+_current_deadline: ContextVar[Optional[RequestDeadline]] = ContextVar("request_deadline", default=None)
+
+def start_deadline(timeout: float) -> RequestDeadline:
+    """Crée l'échéance de la requête courante (héritée par ses tâches et threads)."""
+    deadline = RequestDeadline(timeout)
+    _current_deadline.set(deadline)
+    return deadline
+
+def current_deadline() -> Optional[RequestDeadline]:
+    return _current_deadline.get()
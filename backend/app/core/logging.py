@@ -1,66 +1,175 @@
+import atexit
+import json
 import logging
+import queue
+import re
 import sys
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Dict, Optional
 from backend.app.core.config import settings
+from backend.app.core.metrics import registry
 
-class SecretFilter(logging.Filter):
-    """Filtre pour masquer les secrets dans les logs."""
-    def filter(self, record):
-        if hasattr(record, 'msg') and isinstance(record.msg, str):
-            record.msg = record.msg.replace(settings.SECRET_KEY, "***SECRET_KEY***")
-            record.msg = record.msg.replace(settings.MISTRAL_API_KEY, "***MISTRAL_API_KEY***")
-        return True
+LOG_RECORDS_DROPPED = registry.counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full."
+)
+
+# Loggers des dépendances dont le niveau suit LOG_LEVEL
+THIRD_PARTY_LOGGERS = [
+    "uvicorn",
+    "uvicorn.access",
+    "fastapi",
+    "sqlalchemy",
+    "transformers"
+]
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+class SecretRedactor:
+    """Masque les secrets en une seule passe d'une expression précompilée."""
+
+    def __init__(self, secrets: Dict[str, str]):
+        # Un secret vide remplacerait chaque position de la chaîne : ignoré
+        self._labels = {value: f"***{name}***" for name, value in secrets.items() if value}
+        alternatives = sorted(self._labels, key=len, reverse=True)
+        self._pattern = re.compile("|".join(map(re.escape, alternatives))) if alternatives else None
+
+    def redact(self, message: str) -> str:
+        if self._pattern is None:
+            return message
+        return self._pattern.sub(lambda match: self._labels[match.group(0)], message)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler qui n'écrit jamais sur le thread appelant.
+
+    Le message est assemblé (msg % args) au moment de l'appel, seule étape qui
+    doit voir les arguments dans leur état courant ; le formatage et les
+    écritures se font dans le thread du QueueListener. Si la file est pleine,
+    l'enregistrement est abandonné et compté plutôt que de bloquer la requête.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        record = logging.makeLogRecord(record.__dict__)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = message
+        record.message = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+class RedactingQueueListener(QueueListener):
+    """Masque les secrets une fois par enregistrement, avant les handlers."""
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler, redactor: SecretRedactor):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.redactor = redactor
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.message = self.redactor.redact(record.msg)
+        if record.exc_text:
+            record.exc_text = self.redactor.redact(record.exc_text)
+        return record
+
+    def enqueue_sentinel(self) -> None:
+        # À l'arrêt, attendre une place plutôt que perdre le signal de fin
+        self.queue.put(self._sentinel)
+
+class JsonFormatter(logging.Formatter):
+    """Un objet JSON par ligne, pour l'ingestion par un collecteur de logs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+def _build_formatter() -> logging.Formatter:
+    if settings.LOG_JSON:
+        return JsonFormatter()
+    return logging.Formatter(settings.LOG_FORMAT)
 
 def setup_logging() -> None:
-    """Configure le système de logging."""
+    """Configure le système de logging.
+
+    Les loggers n'alimentent qu'une file en mémoire ; un QueueListener
+    unique masque les secrets puis écrit vers la console et le fichier.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
     # Création du dossier de logs si nécessaire
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
-    # Configuration du format de log
-    log_format = logging.Formatter(settings.LOG_FORMAT)
-    
+    log_file = Path(settings.LOG_FILE)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    formatter = _build_formatter()
+
     # Handler pour la console
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(log_format)
-    console_handler.addFilter(SecretFilter())
-    
+    console_handler.setFormatter(formatter)
+
     # Handler pour les fichiers
     file_handler = RotatingFileHandler(
-        log_dir / "app.log",
+        log_file,
         maxBytes=10_000_000,  # 10MB
         backupCount=5
     )
-    file_handler.setFormatter(log_format)
-    file_handler.addFilter(SecretFilter())
-    
-    # Configuration du logger racine
+    file_handler.setFormatter(formatter)
+
+    redactor = SecretRedactor({
+        "SECRET_KEY": settings.SECRET_KEY,
+        "MISTRAL_API_KEY": settings.MISTRAL_API_KEY,
+    })
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = RedactingQueueListener(log_queue, console_handler, file_handler, redactor=redactor)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    # Configuration du logger racine. Les handlers déjà présents (basicConfig
+    # d'un module importé) écriraient en synchrone et sans masquage : retirés
     root_logger = logging.getLogger()
     root_logger.setLevel(settings.LOG_LEVEL)
-    # Évite la duplication de handlers
-    if not any(isinstance(h, logging.StreamHandler) for h in root_logger.handlers):
-        root_logger.addHandler(console_handler)
-    if not any(isinstance(h, RotatingFileHandler) for h in root_logger.handlers):
-        root_logger.addHandler(file_handler)
-    
-    # Configuration des loggers spécifiques
-    loggers = [
-        "uvicorn",
-        "uvicorn.access",
-        "fastapi",
-        "sqlalchemy",
-        "transformers"
-    ]
-    
-    for logger_name in loggers:
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(_queue_handler)
+
+    # Les handlers propres des dépendances (StreamHandler d'uvicorn, sans
+    # propagation) écriraient chaque ligne une seconde fois : remplacés par
+    # la propagation vers la racine
+    for logger_name in THIRD_PARTY_LOGGERS:
         logger = logging.getLogger(logger_name)
         logger.setLevel(settings.LOG_LEVEL)
-        if not any(isinstance(h, logging.StreamHandler) for h in logger.handlers):
-            logger.addHandler(console_handler)
-        if not any(isinstance(h, RotatingFileHandler) for h in logger.handlers):
-            logger.addHandler(file_handler)
-        logger.addFilter(SecretFilter())
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.propagate = True
+
+def shutdown_logging() -> None:
+    """Vide la file et arrête le thread d'écriture."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
 
 def get_logger(name: str) -> logging.Logger:
-    return logging.getLogger(name) 
\ No newline at end of file
+    return logging.getLogger(name)
@@ -0,0 +1,74 @@
+import json
+import time
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .metrics import HTTP_DURATION, HTTP_REQUESTS, server_timing_header, start_request_timings
+
+# Middlewares ASGI purs : contrairement à BaseHTTPMiddleware (@app.middleware),
+# ils transmettent tel quel le canal `receive`, ce qui laisse l'application
+# voir `http.disconnect` (request.is_disconnected()) quand le client part.
+
+class CatchExceptionsMiddleware:
+    """Transforme une exception non gérée en réponse JSON 500."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            # Réponse déjà commencée (flux) : impossible d'envoyer une erreur propre
+            if response_started:
+                raise
+            body = json.dumps({"detail": f"Erreur interne du serveur: {str(exc)}"}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+
+class TimingMiddleware:
+    """Métriques par route et en-tête Server-Timing par étape.
+
+    La durée est mesurée jusqu'à l'envoi des en-têtes de la réponse.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = start_request_timings()
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                path = getattr(scope.get("route"), "path", "unmatched")
+                HTTP_REQUESTS.inc(path=path, status=str(message["status"]))
+                HTTP_DURATION.observe(elapsed, path=path)
+                headers = MutableHeaders(scope=message)
+                headers["Server-Timing"] = server_timing_header(timings, elapsed)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
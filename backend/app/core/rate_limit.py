@@ -0,0 +1,168 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Tuple
+from .config import settings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+def _window_state(
+    stored_start: float,
+    prev_count: int,
+    curr_count: int,
+    now: float,
+    window: int
+) -> Tuple[float, int, int]:
+    """Fait avancer l'état (début de fenêtre, compte précédent, compte courant) jusqu'à `now`."""
+    window_start = math.floor(now / window) * window
+    if stored_start == window_start:
+        return window_start, prev_count, curr_count
+    if stored_start == window_start - window:
+        return window_start, curr_count, 0
+    return window_start, 0, 0
+
+def _evaluate(
+    window_start: float,
+    prev_count: int,
+    curr_count: int,
+    now: float,
+    window: int,
+    max_requests: int
+) -> Tuple[bool, int]:
+    """Applique la fenêtre glissante approchée et retourne (autorisé, délai Retry-After)."""
+    elapsed = now - window_start
+    estimate = prev_count * (window - elapsed) / window + curr_count
+    if estimate + 1 <= max_requests:
+        return True, 0
+
+    if curr_count + 1 > max_requests:
+        # Attendre la fenêtre suivante, où le compte courant devient le compte précédent
+        wait = (window_start + window - now) + window * (1 - (max_requests - 1) / curr_count)
+    else:
+        # Attendre que la part pondérée de la fenêtre précédente diminue suffisamment
+        wait = window_start + window * (1 - (max_requests - curr_count - 1) / prev_count) - now
+    return False, max(1, math.ceil(wait))
+
+class MemoryRateLimitBackend:
+    """Compteurs en mémoire, bornés en nombre de clés, avec éviction des clés inactives."""
+
+    BLOCKING = False
+
+    def __init__(self, max_keys: int = settings.RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._counters: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, now: float, window: int, max_requests: int) -> Tuple[bool, int]:
+        with self._lock:
+            # Les clés sont ordonnées par dernier accès : les plus anciennes sont en tête
+            while self._counters:
+                oldest_key, oldest = next(iter(self._counters.items()))
+                if now - oldest[3] <= 2 * window and len(self._counters) < self.max_keys:
+                    break
+                del self._counters[oldest_key]
+
+            state = self._counters.pop(key, None) or [0.0, 0, 0, now]
+            window_start, prev_count, curr_count = _window_state(state[0], state[1], state[2], now, window)
+            allowed, retry_after = _evaluate(window_start, prev_count, curr_count, now, window, max_requests)
+            if allowed:
+                curr_count += 1
+            self._counters[key] = [window_start, prev_count, curr_count, now]
+            return allowed, retry_after
+
+class SQLiteRateLimitBackend:
+    """Compteurs partagés entre les workers uvicorn via une table SQLite locale."""
+
+    PURGE_INTERVAL = 60  # secondes
+    # BEGIN IMMEDIATE peut attendre le verrou d'un autre worker (jusqu'au timeout de 5 s)
+    BLOCKING = True
+
+    def __init__(self, path: str = settings.RATE_LIMIT_DB_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                window_start REAL NOT NULL,
+                prev_count INTEGER NOT NULL,
+                curr_count INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def hit(self, key: str, now: float, window: int, max_requests: int) -> Tuple[bool, int]:
+        with self._lock:
+            # BEGIN IMMEDIATE : lecture-modification-écriture atomique entre processus
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT window_start, prev_count, curr_count FROM rate_limits WHERE key = ?",
+                    (key,)
+                ).fetchone() or (0.0, 0, 0)
+                window_start, prev_count, curr_count = _window_state(row[0], row[1], row[2], now, window)
+                allowed, retry_after = _evaluate(window_start, prev_count, curr_count, now, window, max_requests)
+                if allowed:
+                    curr_count += 1
+                self._conn.execute(
+                    """
+                    INSERT INTO rate_limits (key, window_start, prev_count, curr_count, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        window_start = excluded.window_start,
+                        prev_count = excluded.prev_count,
+                        curr_count = excluded.curr_count,
+                        updated_at = excluded.updated_at
+                    """,
+                    (key, window_start, prev_count, curr_count, now)
+                )
+                if now - self._last_purge > self.PURGE_INTERVAL:
+                    self._conn.execute("DELETE FROM rate_limits WHERE updated_at < ?", (now - 2 * window,))
+                    self._last_purge = now
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return allowed, retry_after
+
+class RateLimiter:
+    """Limiteur à fenêtre glissante approchée (deux compteurs par clé, O(1) par requête)."""
+
+    def __init__(self, max_requests: int, window: int, backend=None):
+        self.max_requests = max_requests
+        self.window = window
+        self.backend = backend or create_rate_limit_backend()
+
+    @property
+    def blocking(self) -> bool:
+        """Indique si hit() peut attendre une E/S : à appeler hors de la boucle d'événements."""
+        return getattr(self.backend, "BLOCKING", False)
+
+    def hit(self, key: str) -> Tuple[bool, int]:
+        """Enregistre une requête ; retourne (autorisée, secondes avant nouvel essai)."""
+        try:
+            return self.backend.hit(key, time.time(), self.window, self.max_requests)
+        except sqlite3.Error as e:
+            # Un incident sur le stockage partagé ne doit pas bloquer le service
+            logger.error("Rate limiter backend error: %s", e)
+            return True, 0
+
+_shared_backend = None
+
+def create_rate_limit_backend():
+    """Retourne le backend configuré (RATE_LIMIT_BACKEND = "memory" ou "sqlite")."""
+    global _shared_backend
+    if _shared_backend is None:
+        if settings.RATE_LIMIT_BACKEND == "sqlite":
+            _shared_backend = SQLiteRateLimitBackend()
+        else:
+            _shared_backend = MemoryRateLimitBackend()
+    return _shared_backend
@@ -1,7 +1,26 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from ..core.config import settings
+from ..core.deadline import current_deadline
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import threading
+import time
+from typing import Optional
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _sqlite_path(url: str):
+    """Retourne le chemin du fichier SQLite, ou None pour une base en mémoire."""
+    database = make_url(url).database
+    if not database or database == ":memory:" or database.startswith("file:"):
+        return None
+    return database
 
 engine = create_engine(
     settings.DATABASE_URL,
@@ -10,12 +29,243 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
+if _is_sqlite(settings.DATABASE_URL):
+    @event.listens_for(engine, "connect")
+    def _set_write_pragmas(dbapi_connection, connection_record):
+        """Active le WAL pour que les lecteurs ne soient pas bloqués par les écritures."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+def _is_columnar(url: str) -> bool:
+    return bool(url) and make_url(url).get_backend_name() == "duckdb"
+
+def columnar_path(url: str = settings.ANALYTICS_DATABASE_URL):
+    """Retourne le chemin du fichier du moteur colonnaire, ou None s'il n'est pas configuré."""
+    if not _is_columnar(url):
+        return None
+    return make_url(url).database or None
+
+def _statement_deadline(state) -> Optional[float]:
+    """Échéance de l'instruction qui démarre : budget par instruction borné par celui de la requête.
+
+    L'instruction est aussi rattachée à la requête courante, dont l'abandon
+    (client parti) l'interrompt immédiatement.
+    """
+    deadline = None
+    if settings.SQL_STATEMENT_TIMEOUT > 0:
+        deadline = time.monotonic() + settings.SQL_STATEMENT_TIMEOUT
+    request = current_deadline()
+    if request is not None:
+        deadline = request.expires_at if deadline is None else min(deadline, request.expires_at)
+        if request.cancelled.is_set():
+            deadline = time.monotonic()
+        if state["request"] is not request:
+            _detach_request(state)
+            request.attach(state["interrupt"])
+            state["request"] = request
+    return deadline
+
+def _detach_request(state) -> None:
+    if state["request"] is not None:
+        state["request"].detach(state["interrupt"])
+        state["request"] = None
+
+def _create_columnar_engine(url: str):
+    """Crée le moteur DuckDB (dialecte duckdb_engine) en lecture seule.
+
+    Le fichier est un miroir de `sales` remplacé atomiquement par la
+    synchronisation ; un minuteur interrompt les instructions trop longues.
+    """
+    config = {}
+    if settings.ANALYTICS_THREADS > 0:
+        config["threads"] = settings.ANALYTICS_THREADS
+    if settings.ANALYTICS_MEMORY_LIMIT:
+        config["memory_limit"] = settings.ANALYTICS_MEMORY_LIMIT
+
+    columnar_engine = create_engine(
+        url,
+        connect_args={"read_only": True, "config": config},
+        pool_size=settings.READ_POOL_SIZE,
+        max_overflow=settings.READ_POOL_MAX_OVERFLOW,
+        pool_timeout=settings.READ_POOL_TIMEOUT,
+        pool_pre_ping=True
+    )
+
+    @event.listens_for(columnar_engine, "connect")
+    def _init_statement_state(dbapi_connection, connection_record):
+        connection_record.info["statement_state"] = {
+            "deadline": None,
+            "timer": None,
+            "request": None,
+            "interrupt": dbapi_connection.interrupt
+        }
+
+    @event.listens_for(columnar_engine, "before_cursor_execute")
+    def _arm_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        state = conn.info.get("statement_state")
+        if state is None:
+            return
+        if state["timer"] is not None:
+            state["timer"].cancel()
+            state["timer"] = None
+        state["deadline"] = _statement_deadline(state)
+        if state["deadline"] is None:
+            return
+        timer = threading.Timer(max(state["deadline"] - time.monotonic(), 0.0), state["interrupt"])
+        timer.daemon = True
+        timer.start()
+        state["timer"] = timer
+
+    @event.listens_for(columnar_engine, "checkin")
+    def _disarm_statement_timer(dbapi_connection, connection_record):
+        state = connection_record.info.get("statement_state")
+        if state is not None:
+            if state["timer"] is not None:
+                state["timer"].cancel()
+            state["timer"] = None
+            state["deadline"] = None
+            _detach_request(state)
+
+    return columnar_engine
+
+def _create_read_engine():
+    """Crée le moteur en lecture seule utilisé pour les requêtes générées par le LLM.
+
+    Si ANALYTICS_DATABASE_URL désigne DuckDB, les requêtes sont exécutées sur
+    le miroir colonnaire. Sinon, connexions SQLite ouvertes en mode=ro, réglées
+    pour la lecture (mmap, cache, tables temporaires en mémoire) et
+    interrompues par le progress handler de SQLite lorsqu'une instruction
+    dépasse son budget de temps.
+    """
+    if _is_columnar(settings.ANALYTICS_DATABASE_URL):
+        return _create_columnar_engine(settings.ANALYTICS_DATABASE_URL)
+
+    path = _sqlite_path(settings.DATABASE_URL) if _is_sqlite(settings.DATABASE_URL) else None
+    if path is None:
+        return engine
+
+    read_engine = create_engine(
+        f"sqlite:///file:{path}?mode=ro&uri=true",
+        connect_args={
+            "check_same_thread": False,
+            "cached_statements": settings.SQLITE_CACHED_STATEMENTS
+        },
+        pool_size=settings.READ_POOL_SIZE,
+        max_overflow=settings.READ_POOL_MAX_OVERFLOW,
+        pool_timeout=settings.READ_POOL_TIMEOUT
+    )
+
+    @event.listens_for(read_engine, "connect")
+    def _set_read_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+        # Échéance de l'instruction en cours, consultée par le progress handler ;
+        # interrupt() sert à l'abandon immédiat (client déconnecté)
+        state = {"deadline": None, "request": None, "interrupt": dbapi_connection.interrupt}
+        connection_record.info["statement_state"] = state
+
+        def _progress_handler():
+            deadline = state["deadline"]
+            return 1 if deadline is not None and time.monotonic() > deadline else 0
+
+        dbapi_connection.set_progress_handler(_progress_handler, settings.SQL_PROGRESS_STEPS)
+
+    @event.listens_for(read_engine, "before_cursor_execute")
+    def _arm_statement_budget(conn, cursor, statement, parameters, context, executemany):
+        state = conn.info.get("statement_state")
+        if state is not None:
+            state["deadline"] = _statement_deadline(state)
+
+    @event.listens_for(read_engine, "checkin")
+    def _disarm_statement_budget(dbapi_connection, connection_record):
+        state = connection_record.info.get("statement_state")
+        if state is not None:
+            state["deadline"] = None
+            _detach_request(state)
+
+    return read_engine
+
+read_engine = _create_read_engine()
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Pool de threads réservé aux accès base : une requête analytique longue
+# n'occupe ni la boucle d'événements ni le pool partagé de Starlette.
+# Dimensionné sur le pool de connexions en lecture : un thread ne reste
+# jamais bloqué en attente d'une connexion libre.
+_db_executor: Optional[ThreadPoolExecutor] = None
+_db_executor_lock = threading.Lock()
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Pool des accès base, recréé au besoin après shutdown_db_executor()."""
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(
+                max_workers=settings.DB_EXECUTOR_WORKERS or settings.READ_POOL_SIZE + settings.READ_POOL_MAX_OVERFLOW,
+                thread_name_prefix="db"
+            )
+        return _db_executor
+
+def shutdown_db_executor() -> None:
+    """Arrête le pool à la fin du cycle de vie de l'application ; les appels encore en file sont annulés."""
+    global _db_executor
+    with _db_executor_lock:
+        executor, _db_executor = _db_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+async def run_db(func, *args, **kwargs):
+    """Exécute un appel bloquant (SQLAlchemy, SQLite, DuckDB) dans le pool des accès base.
+
+    Le contexte courant (relevé des étapes, échéance de la requête) est
+    propagé au thread ; l'appel n'est pas exécuté si l'échéance est passée
+    et reste suivi par l'échéance jusqu'à sa fin.
+    """
+    context = contextvars.copy_context()
+    future = get_db_executor().submit(context.run, _call_in_budget, func, *args, **kwargs)
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.track(future)
+    # Annulée avant son démarrage, la tâche n'est jamais exécutée
+    return await asyncio.wrap_future(future)
+
+def _call_in_budget(func, *args, **kwargs):
+    # Travail mis en file pour une requête déjà abandonnée : ignoré
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check()
+    return func(*args, **kwargs)
+
+async def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        # close() rend la connexion au pool après un ROLLBACK : hors de la boucle,
+        # et même si l'échéance de la requête est passée
+        await asyncio.get_running_loop().run_in_executor(get_db_executor(), db.close)
+
+async def get_read_db():
+    """Session en lecture seule pour l'exécution des requêtes analytiques.
+
+    Les appels sur la session doivent passer par run_db.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        await asyncio.get_running_loop().run_in_executor(get_db_executor(), db.close)
+
+def is_statement_timeout(exc: Exception) -> bool:
+    """Indique si l'erreur provient d'une instruction interrompue (budget dépassé)."""
+    return isinstance(exc, DBAPIError) and "interrupt" in str(exc.orig).lower()
 
 def init_db():
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
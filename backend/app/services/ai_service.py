@@ -1,16 +1,42 @@
-from transformers import pipeline
 from mistralai.client import MistralClient
+from mistralai.async_client import MistralAsyncClient
 from mistralai.models.chat_completion import ChatMessage
 from ..core.config import settings
+from ..core.deadline import DeadlineExceeded
 from ..core.logging import get_logger
+from ..core.metrics import LLM_REQUESTS, stage
+from ..db.base import read_engine, run_db
+from .sql_cache import SQLQueryCache
+from .prompt_index import PromptIndex
+from .schema_catalog import SchemaCatalog
+from .singleflight import SingleFlight
+from .chart_recommender import recommend_chart
+from .inference import get_classifier
+from .sql_template import parameterize
+import asyncio
 import re
-from functools import lru_cache
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+import threading
+from collections import OrderedDict
 import sqlparse
-from sqlparse.sql import Token, TokenType
+from sqlparse import tokens as T
 
 logger = get_logger(__name__)
 
+# Instructions et fonctions interdites dans une requête générée (SQLite et DuckDB)
+FORBIDDEN_KEYWORDS = {
+    'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'UPSERT', 'CREATE', 'ALTER', 'DROP',
+    'TRUNCATE', 'ATTACH', 'DETACH', 'PRAGMA', 'VACUUM', 'REINDEX', 'ANALYZE',
+    'GRANT', 'REVOKE', 'INSTALL', 'LOAD', 'COPY', 'EXPORT', 'IMPORT', 'CALL',
+    'SET', 'RESET', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE',
+}
+FORBIDDEN_FUNCTIONS = {
+    'load_extension', 'readfile', 'writefile', 'edit', 'fts3_tokenizer',
+    'read_csv', 'read_csv_auto', 'read_parquet', 'read_json', 'read_json_auto',
+    'read_text', 'read_blob', 'glob', 'sqlite_scan', 'sqlite_attach', 'getenv',
+}
+MAX_SUBQUERY_DEPTH = 3
+
 class AIService:
     _instance = None
     _initialized = False
@@ -29,66 +55,106 @@ class AIService:
     def _load_models(self):
         """Charge les modèles une seule fois."""
         try:
-            self.classifier = pipeline(
-                "text-classification",
-                model=settings.CLASSIFIER_MODEL,
-                cache_dir=settings.MODEL_CACHE_DIR
+            # Le classifieur n'est plus sur le chemin critique : chargé à la demande,
+            # dans ce processus ou dans le serveur d'inférence partagé
+            self.classifier = get_classifier()
+            self.mistral_client = MistralClient(
+                api_key=settings.MISTRAL_API_KEY,
+                endpoint=settings.MISTRAL_ENDPOINT
+            )
+            # Client asynchrone : pool httpx persistant (keep-alive) partagé par les requêtes
+            self.async_mistral_client = MistralAsyncClient(
+                api_key=settings.MISTRAL_API_KEY,
+                endpoint=settings.MISTRAL_ENDPOINT,
+                timeout=settings.LLM_TIMEOUT,
+                max_concurrent_requests=settings.LLM_MAX_CONNECTIONS
             )
-            self.mistral_client = MistralClient(api_key=settings.MISTRAL_API_KEY)
+            self._llm_semaphore: Optional[asyncio.Semaphore] = None
+            self._singleflight = SingleFlight()
+            self.schema_catalog = SchemaCatalog()
+            self.sql_cache = SQLQueryCache() if settings.SQL_CACHE_ENABLED else None
+            self.prompt_index = PromptIndex() if settings.PROMPT_INDEX_ENABLED else None
+            self._validation_cache: "OrderedDict[str, bool]" = OrderedDict()
+            self._validation_lock = threading.Lock()
         except Exception as e:
-            logger.error(f"Error loading models: {str(e)}")
+            logger.error("Error loading models: %s", e)
             raise RuntimeError("Failed to initialize AI models")
 
     def _validate_sql_query(self, query: str) -> bool:
         """Valide que la requête SQL est sécurisée."""
         try:
-            # Parse la requête SQL
-            parsed = sqlparse.parse(query)[0]
-            
+            statements = [
+                statement for statement in sqlparse.parse(query)
+                if statement.token_first(skip_ws=True, skip_cm=True) is not None
+            ]
+            if len(statements) != 1:
+                logger.warning("Query must contain exactly one statement")
+                return False
+            parsed = statements[0]
+
             # Vérifie que c'est une requête SELECT
-            if not parsed.get_type().upper() == 'SELECT':
+            if parsed.get_type().upper() != 'SELECT':
                 logger.warning("Query is not a SELECT statement")
                 return False
-            
-            # Liste des tokens autorisés
-            allowed_tokens = {
-                TokenType.Keyword: {'SELECT', 'FROM', 'WHERE', 'GROUP', 'BY', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'ON', 'AS', 'AND', 'OR', 'NOT', 'IN', 'LIKE', 'IS', 'NULL', 'ASC', 'DESC'},
-                TokenType.Whitespace: None,  # Tous les espaces sont autorisés
-                TokenType.Identifier: None,  # Tous les identifiants sont autorisés
-                TokenType.Number: None,      # Tous les nombres sont autorisés
-                TokenType.String: None,      # Toutes les chaînes sont autorisées
-                TokenType.Operator: {'=', '>', '<', '>=', '<=', '<>', '!=', '+', '-', '*', '/'},
-                TokenType.Punctuation: {',', '.', '(', ')', ';'},
-            }
-            
-            # Vérifie chaque token
-            for token in parsed.tokens:
-                if token.ttype in allowed_tokens:
-                    if allowed_tokens[token.ttype] is not None:
-                        if token.value.upper() not in allowed_tokens[token.ttype]:
-                            logger.warning(f"Unauthorized token: {token.value}")
-                            return False
-                else:
-                    logger.warning(f"Unauthorized token type: {token.ttype}")
-                    return False
-            
-            # Vérifie la profondeur des sous-requêtes
+
+            tokens = [
+                token for token in parsed.flatten()
+                if not token.is_whitespace and token.ttype not in T.Comment
+            ]
+            depth = 0
             subquery_depth = 0
-            for token in parsed.tokens:
-                if token.ttype == TokenType.Punctuation and token.value == '(':
-                    subquery_depth += 1
-                elif token.ttype == TokenType.Punctuation and token.value == ')':
-                    subquery_depth -= 1
-                if subquery_depth > 3:  # Limite la profondeur des sous-requêtes
-                    logger.warning("Query has too many nested subqueries")
+            for i, token in enumerate(tokens):
+                value = token.value.upper()
+                if token.ttype in T.Keyword:
+                    if (token.ttype in T.DML and value != 'SELECT') or token.ttype in T.DDL:
+                        logger.warning("Unauthorized statement keyword: %s", token.value)
+                        return False
+                    if value in FORBIDDEN_KEYWORDS:
+                        logger.warning("Unauthorized token: %s", token.value)
+                        return False
+                    if value == 'SELECT':
+                        # Profondeur d'une sous-requête = parenthèses qui l'entourent
+                        subquery_depth = max(subquery_depth, depth)
+                elif token.ttype in T.Punctuation and value == '(':
+                    depth += 1
+                elif token.ttype in T.Punctuation and value == ')':
+                    depth -= 1
+
+                is_call = i + 1 < len(tokens) and tokens[i + 1].value == '('
+                if is_call and token.value.lower() in FORBIDDEN_FUNCTIONS:
+                    logger.warning("Unauthorized function: %s", token.value)
                     return False
-            
+
+            if subquery_depth > MAX_SUBQUERY_DEPTH:
+                logger.warning("Query has too many nested subqueries")
+                return False
+
             return True
-            
+
         except Exception as e:
-            logger.error(f"Error validating SQL query: {str(e)}")
+            logger.error("Error validating SQL query: %s", e)
             return False
 
+    def is_safe_sql(self, query: str) -> bool:
+        """Valide la requête, avec mémorisation par gabarit.
+
+        Deux requêtes qui ne diffèrent que par leurs littéraux de filtre
+        partagent le même résultat de validation.
+        """
+        template = parameterize(query)
+        with self._validation_lock:
+            cached = self._validation_cache.get(template.fingerprint)
+            if cached is not None:
+                self._validation_cache.move_to_end(template.fingerprint)
+                return cached
+
+        result = self._validate_sql_query(template.text)
+        with self._validation_lock:
+            self._validation_cache[template.fingerprint] = result
+            while len(self._validation_cache) > settings.SQL_TEMPLATE_CACHE_SIZE:
+                self._validation_cache.popitem(last=False)
+        return result
+
     def _sanitize_prompt(self, prompt: str) -> str:
         """Nettoie et valide le prompt."""
         if not prompt or not isinstance(prompt, str):
@@ -107,86 +173,216 @@ class AIService:
             
         return sanitized
 
+    def _get_cached_sql(self, sanitized_prompt: str) -> Tuple[Optional[str], Optional[str], List[Tuple[str, str]]]:
+        """Retourne (sql connu, empreinte du schéma, exemples few-shot).
+
+        Consulte le cache exact puis l'index de similarité : un prompt très
+        proche d'un prompt déjà traité réutilise son SQL, sinon ses plus
+        proches voisins servent d'exemples au LLM.
+        """
+        if self.sql_cache is None and self.prompt_index is None:
+            return None, None, []
+        # Le dialecte fait partie de la clé : une requête SQLite n'est pas forcément valide sur DuckDB
+        schema_fingerprint = f"{self.schema_catalog.fingerprint()}:{read_engine.dialect.name}"
+        if self.sql_cache is not None:
+            cached_sql = self.sql_cache.get(sanitized_prompt, schema_fingerprint)
+            if cached_sql is not None:
+                logger.info("SQL cache hit for prompt: %s", sanitized_prompt)
+                return cached_sql, schema_fingerprint, []
+
+        if self.prompt_index is None:
+            return None, schema_fingerprint, []
+        similar_sql, examples = self.prompt_index.match(sanitized_prompt, schema_fingerprint)
+        if similar_sql is not None and self.sql_cache is not None:
+            self.sql_cache.set(sanitized_prompt, schema_fingerprint, similar_sql)
+        return similar_sql, schema_fingerprint, examples
+
+    def _build_messages(
+        self,
+        sanitized_prompt: str,
+        examples: Sequence[Tuple[str, str]] = ()
+    ) -> List[ChatMessage]:
+        """Construit les messages envoyés au LLM, précédés d'éventuels exemples few-shot."""
+        messages = [
+            ChatMessage(
+                role="system",
+                content="""You are a SQL expert. Generate a SQL query based on the user's request.
+                Rules:
+                1. Only generate SELECT queries
+                2. Do not include any DML or DDL operations
+                3. Use proper table aliases
+                4. Include comments explaining the query
+                5. Use parameterized queries where possible
+                6. Avoid dynamic SQL
+                7. Use proper SQL injection prevention techniques
+                8. Target SQL dialect: """ + read_engine.dialect.name + """
+                9. Only use the tables, columns and values described below
+
+                Database schema:
+""" + self.schema_catalog.prompt_block()
+            )
+        ]
+        for example_prompt, example_sql in examples:
+            messages.append(ChatMessage(role="user", content=f"Generate a SQL query for: {example_prompt}"))
+            messages.append(ChatMessage(role="assistant", content=example_sql))
+        messages.append(
+            ChatMessage(
+                role="user",
+                content=f"Generate a SQL query for: {sanitized_prompt}"
+            )
+        )
+        return messages
+
+    def _finalize_sql(self, response, sanitized_prompt: str, schema_fingerprint: Optional[str]) -> str:
+        """Extrait, valide et met en cache la requête SQL renvoyée par le LLM."""
+        sql_query = response.choices[0].message.content.strip()
+
+        # Valide la requête générée
+        with stage("validation"):
+            is_safe = self.is_safe_sql(sql_query)
+        if not is_safe:
+            logger.warning("Generated unsafe SQL query: %s", sql_query)
+            raise ValueError("Generated SQL query is not safe")
+
+        logger.info("Generated SQL query: %s", sql_query)
+        if self.sql_cache is not None:
+            self.sql_cache.set(sanitized_prompt, schema_fingerprint, sql_query)
+        if self.prompt_index is not None:
+            self.prompt_index.add(sanitized_prompt, sql_query, schema_fingerprint)
+        return sql_query
+
     def generate_sql_query(self, prompt: str) -> str:
         """Génère une requête SQL sécurisée à partir du prompt."""
         try:
             # Nettoie le prompt
-            sanitized_prompt = self._sanitize_prompt(prompt)
-            
-            messages = [
-                ChatMessage(
-                    role="system",
-                    content="""You are a SQL expert. Generate a SQL query based on the user's request.
-                    Rules:
-                    1. Only generate SELECT queries
-                    2. Do not include any DML or DDL operations
-                    3. Use proper table aliases
-                    4. Include comments explaining the query
-                    5. Use parameterized queries where possible
-                    6. Avoid dynamic SQL
-                    7. Use proper SQL injection prevention techniques"""
-                ),
-                ChatMessage(
-                    role="user",
-                    content=f"Generate a SQL query for: {sanitized_prompt}"
-                )
-            ]
-            
-            response = self.mistral_client.chat(
-                model=settings.MODEL_NAME,
-                messages=messages
+            with stage("sanitize"):
+                sanitized_prompt = self._sanitize_prompt(prompt)
+
+            # Consulte le cache prompt -> SQL puis l'index de similarité
+            with stage("cache_lookup"):
+                cached_sql, schema_fingerprint, examples = self._get_cached_sql(sanitized_prompt)
+            if cached_sql is not None:
+                return cached_sql
+
+            messages = self._build_messages(sanitized_prompt, examples)
+            try:
+                with stage("llm"):
+                    response = self.mistral_client.chat(model=settings.MODEL_NAME, messages=messages)
+            except Exception:
+                LLM_REQUESTS.inc(outcome="error")
+                raise
+            LLM_REQUESTS.inc(outcome="ok")
+            return self._finalize_sql(response, sanitized_prompt, schema_fingerprint)
+
+        except Exception as e:
+            logger.error("Error generating SQL query: %s", e)
+            raise RuntimeError("Failed to generate SQL query") from e
+
+    async def agenerate_sql_query(self, prompt: str) -> str:
+        """Version asynchrone de generate_sql_query.
+
+        N'occupe pas la boucle d'événements pendant l'appel au LLM ni pendant
+        les accès au cache et à l'index (SQLite, via run_db), limite le nombre
+        d'appels simultanés et fusionne les prompts identiques en vol.
+        L'annulation et les dépassements de délai sont propagés tels quels.
+        """
+        try:
+            with stage("sanitize"):
+                sanitized_prompt = self._sanitize_prompt(prompt)
+
+            if not self.schema_catalog.ready:
+                # Première construction du catalogue : hors de la boucle d'événements
+                await run_db(self.schema_catalog.refresh)
+
+            with stage("cache_lookup"):
+                cached_sql, schema_fingerprint, examples = await run_db(self._get_cached_sql, sanitized_prompt)
+            if cached_sql is not None:
+                return cached_sql
+
+            key = SQLQueryCache.normalize_prompt(sanitized_prompt)
+            return await self._singleflight.do(
+                key,
+                lambda: self._acall_llm(sanitized_prompt, schema_fingerprint, examples)
             )
-            
-            sql_query = response.choices[0].message.content.strip()
-            
-            # Valide la requête générée
-            if not self._validate_sql_query(sql_query):
-                logger.warning(f"Generated unsafe SQL query: {sql_query}")
-                raise ValueError("Generated SQL query is not safe")
-            
-            logger.info(f"Generated SQL query: {sql_query}")
-            return sql_query
-            
+
+        except (asyncio.CancelledError, asyncio.TimeoutError, TimeoutError, DeadlineExceeded):
+            raise
         except Exception as e:
-            logger.error(f"Error generating SQL query: {str(e)}")
+            logger.error("Error generating SQL query: %s", e)
             raise RuntimeError("Failed to generate SQL query") from e
 
-    def determine_visualization_type(self, prompt: str) -> str:
-        """Détermine le type de visualisation approprié."""
+    async def _acall_llm(
+        self,
+        sanitized_prompt: str,
+        schema_fingerprint: Optional[str],
+        examples: Sequence[Tuple[str, str]] = ()
+    ) -> str:
+        """Appelle le LLM via le client asynchrone, sous la limite de concurrence."""
+        if self._llm_semaphore is None:
+            # Créé paresseusement pour être lié à la boucle d'uvicorn
+            self._llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
+        messages = self._build_messages(sanitized_prompt, examples)
+        with stage("llm_wait"):
+            await self._llm_semaphore.acquire()
+        try:
+            with stage("llm"):
+                response = await self.async_mistral_client.chat(model=settings.MODEL_NAME, messages=messages)
+        except Exception:
+            LLM_REQUESTS.inc(outcome="error")
+            raise
+        finally:
+            self._llm_semaphore.release()
+        LLM_REQUESTS.inc(outcome="ok")
+        # Validation et écritures du cache et de l'index : hors de la boucle
+        return await run_db(self._finalize_sql, response, sanitized_prompt, schema_fingerprint)
+
+    def determine_visualization_type(
+        self,
+        prompt: str,
+        columns: Optional[Sequence[str]] = None,
+        rows: Optional[Sequence[Sequence[Any]]] = None,
+        row_count: Optional[int] = None
+    ) -> str:
+        """Détermine le type de visualisation à partir du résultat de la requête.
+
+        Le schéma et le contenu du résultat priment ; le prompt ne sert qu'à départager.
+        """
         try:
             # Nettoie le prompt
             sanitized_prompt = self._sanitize_prompt(prompt)
-            
-            # Utilise le cache si disponible
-            cached_result = self.get_cached_classification(sanitized_prompt)
-            if cached_result and cached_result.get("type"):
-                return cached_result["type"]
-            
-            # Classification du prompt
-            result = self.classifier(sanitized_prompt)
-            logger.info(f"Classification result: {result}")
-            
-            # Analyse sémantique du prompt
-            prompt_lower = sanitized_prompt.lower()
-            
-            # Règles de décision pour le type de visualisation
-            if any(word in prompt_lower for word in ["trend", "evolution", "time", "period"]):
-                return "line"
-            elif any(word in prompt_lower for word in ["distribution", "frequency", "histogram"]):
-                return "histogram"
-            elif any(word in prompt_lower for word in ["proportion", "percentage", "ratio", "part"]):
-                return "pie"
-            elif any(word in prompt_lower for word in ["compare", "comparison", "versus"]):
-                return "bar"
-            else:
-                return "bar"  # Type par défaut
+
+            hint = self.classify_prompt(sanitized_prompt) if settings.VIZ_CLASSIFIER_ENABLED else None
+            return recommend_chart(
+                columns or [],
+                rows or [],
+                prompt=sanitized_prompt,
+                row_count=row_count,
+                hint=hint
+            )
                 
         except Exception as e:
-            logger.error(f"Error determining visualization type: {str(e)}")
+            logger.error("Error determining visualization type: %s", e)
             return "bar"  # Type par défaut en cas d'erreur
 
-    @staticmethod
-    @lru_cache(maxsize=100)
-    def get_cached_classification(prompt: str) -> Dict[str, Any]:
-        """Cache les résultats de classification pour les prompts identiques."""
-        return {"type": "bar"}  # Valeur par défaut 
\ No newline at end of file
+    def classify_prompt(self, prompt: str) -> Optional[str]:
+        """Classe le prompt avec le modèle de classification (désactivé par défaut).
+
+        Le modèle n'est chargé qu'au premier appel, ou interrogé dans le
+        serveur d'inférence si INFERENCE_SERVER_URL est défini (None s'il est
+        indisponible) ; son label n'est retenu que s'il correspond à un type
+        de visualisation connu.
+        """
+        label = self.classifier.classify([prompt])[0]
+        logger.info("Classification result: %s", label)
+        return label
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs du cache prompt -> SQL et de l'index de similarité."""
+        if self.sql_cache is None:
+            stats = {"enabled": False}
+        else:
+            stats = {"enabled": True, **self.sql_cache.stats()}
+        if self.prompt_index is not None:
+            stats["prompt_index"] = self.prompt_index.stats()
+        return stats 
\ No newline at end of file
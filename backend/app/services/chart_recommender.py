@@ -0,0 +1,135 @@
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Mots-clés du prompt, utilisés uniquement pour départager les candidats
+KEYWORDS = {
+    "line": ["trend", "evolution", "time", "period", "évolution", "tendance", "mensuel", "par mois", "par jour", "par an"],
+    "histogram": ["distribution", "frequency", "histogram", "répartition", "fréquence", "histogramme"],
+    "pie": ["proportion", "percentage", "ratio", "part", "pourcentage"],
+    "bar": ["compare", "comparison", "versus", "comparaison", "comparer", "top", "classement"],
+}
+
+# Ordre de préférence en cas d'égalité
+PREFERENCE = ["bar", "line", "histogram", "pie", "scatter"]
+
+MAX_PIE_CATEGORIES = 8
+MIN_HISTOGRAM_ROWS = 20
+# Valeurs analysées élément par élément quand aucun format commun n'est reconnu
+MIXED_DATE_SAMPLE = 200
+
+def _is_temporal(name: str, series: pd.Series) -> bool:
+    """Détecte une colonne temporelle (type datetime ou chaînes de dates)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return False
+    values = series.dropna()
+    if values.empty:
+        return False
+    first = values.iloc[0]
+    if not isinstance(first, str) and "date" not in name.lower():
+        return False
+    # Format déduit de la première valeur : une seule passe vectorisée
+    date_format = guess_datetime_format(first) if isinstance(first, str) else None
+    if date_format is not None:
+        parsed = pd.to_datetime(values, errors="coerce", format=date_format)
+        if parsed.notna().mean() >= 0.9:
+            return True
+    # Formats hétérogènes : analyse élément par élément, sur un échantillon
+    sample = values.iloc[:MIXED_DATE_SAMPLE]
+    parsed = pd.to_datetime(sample, errors="coerce", format="mixed")
+    return parsed.notna().mean() >= 0.9
+
+def profile_result(df: pd.DataFrame, row_count: Optional[int] = None) -> Dict[str, Any]:
+    """Calcule le profil d'un résultat : colonnes temporelles, numériques et catégorielles."""
+    temporal: List[str] = []
+    numeric: List[str] = []
+    categorical: List[str] = []
+    cardinality: Dict[str, int] = df.nunique(dropna=True).to_dict() if not df.empty else {}
+
+    for name in df.columns:
+        series = df[name]
+        if _is_temporal(str(name), series):
+            temporal.append(name)
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            # Les identifiants n'apportent rien à la visualisation
+            if str(name).lower() == "id" or str(name).lower().endswith("_id"):
+                continue
+            numeric.append(name)
+        else:
+            categorical.append(name)
+
+    non_negative = False
+    if numeric and not df.empty:
+        values = df[numeric].to_numpy(dtype=float, na_value=np.nan)
+        non_negative = not bool((values < 0).any())
+
+    return {
+        "row_count": row_count if row_count is not None else len(df),
+        "temporal": temporal,
+        "numeric": numeric,
+        "categorical": categorical,
+        "cardinality": cardinality,
+        "non_negative": non_negative,
+    }
+
+def _keyword_scores(prompt: Optional[str]) -> Dict[str, int]:
+    """Nombre de groupes de mots-clés du prompt en faveur de chaque type."""
+    scores = {viz_type: 0 for viz_type in PREFERENCE}
+    if not prompt:
+        return scores
+    prompt_lower = prompt.lower()
+    for viz_type, words in KEYWORDS.items():
+        if any(word in prompt_lower for word in words):
+            scores[viz_type] += 1
+    return scores
+
+def recommend_chart(
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    prompt: Optional[str] = None,
+    row_count: Optional[int] = None,
+    hint: Optional[str] = None
+) -> str:
+    """Recommande un type de graphique à partir du schéma et du contenu du résultat.
+
+    Les types des colonnes, leur cardinalité et le nombre de lignes déterminent
+    le score de chaque graphique ; les mots-clés du prompt (et l'éventuel
+    label `hint` d'un classifieur) ne départagent que les ex æquo.
+    """
+    keywords = _keyword_scores(prompt)
+    if hint in keywords:
+        keywords[hint] += 1
+    scores = {viz_type: 0 for viz_type in PREFERENCE}
+
+    if columns and rows:
+        df = pd.DataFrame(list(rows), columns=list(columns)).infer_objects()
+        profile = profile_result(df, row_count)
+        temporal = profile["temporal"]
+        numeric = profile["numeric"]
+        categorical = profile["categorical"]
+        n_rows = profile["row_count"]
+
+        if temporal and numeric:
+            scores["line"] += 3
+        if categorical and numeric:
+            scores["bar"] += 2
+            low_card = min(profile["cardinality"].get(col, 0) for col in categorical)
+            if low_card <= MAX_PIE_CATEGORIES and profile["non_negative"]:
+                scores["pie"] += 1
+        if len(numeric) == 1 and not categorical and not temporal and n_rows >= MIN_HISTOGRAM_ROWS:
+            scores["histogram"] += 3
+        if len(numeric) >= 2 and not categorical and not temporal:
+            scores["scatter"] += 2
+        if categorical and not numeric and not temporal:
+            scores["histogram"] += 2
+        if n_rows <= 1:
+            scores["bar"] += 1
+
+    best = max(
+        PREFERENCE,
+        key=lambda viz_type: (scores[viz_type], keywords[viz_type], -PREFERENCE.index(viz_type))
+    )
+    return best
@@ -0,0 +1,162 @@
+from collections import defaultdict
+from numbers import Number
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..core.config import settings
+
+OTHER_LABEL = "Autres"
+
+Rows = List[List[Any]]
+Reduction = Optional[Dict[str, Any]]
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+def _numeric_columns(rows: Sequence[Sequence[Any]], width: int) -> List[int]:
+    """Indices des colonnes dont les valeurs non nulles sont toutes numériques."""
+    numeric = []
+    for index in range(width):
+        values = [row[index] for row in rows if row[index] is not None]
+        if values and all(_is_number(value) for value in values):
+            numeric.append(index)
+    return numeric
+
+def _as_float(rows: Sequence[Sequence[Any]], index: int) -> np.ndarray:
+    return np.array(
+        [np.nan if row[index] is None else float(row[index]) for row in rows],
+        dtype=np.float64
+    )
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices retenus par Largest-Triangle-Three-Buckets.
+
+    Le premier et le dernier point sont conservés ; chaque seau intermédiaire
+    garde le point qui forme le plus grand triangle avec le point retenu
+    précédemment et la moyenne du seau suivant, ce qui préserve pics et creux.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start = end
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+
+        candidates_x = x[start:end]
+        candidates_y = y[start:end]
+        areas = np.abs(
+            (x[previous] - average_x) * (candidates_y - y[previous])
+            - (x[previous] - candidates_x) * (average_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    selected[-1] = n - 1
+    return selected
+
+def reduce_line(columns: Sequence[str], rows: Rows, max_points: int) -> Tuple[Sequence[str], Rows, Reduction]:
+    """Décime une série temporelle par LTTB, sur la première colonne numérique hors abscisse."""
+    numeric = [index for index in _numeric_columns(rows, len(columns)) if index != 0]
+    if not numeric:
+        return columns, _stride_sample(rows, max_points), {"method": "sample"}
+    x = _as_float(rows, 0) if 0 in _numeric_columns(rows, 1) else np.arange(len(rows), dtype=np.float64)
+    y = np.nan_to_num(_as_float(rows, numeric[0]))
+    indices = lttb_indices(x, y, max_points)
+    return columns, [rows[i] for i in indices], {"method": "lttb", "column": columns[numeric[0]]}
+
+def reduce_histogram(columns: Sequence[str], rows: Rows, max_points: int) -> Tuple[Sequence[str], Rows, Reduction]:
+    """Remplace les valeurs par des effectifs pré-calculés par classe (np.histogram)."""
+    numeric = _numeric_columns(rows, len(columns))
+    if not numeric:
+        return reduce_category_bars(columns, rows, max_points)
+    values = _as_float(rows, numeric[0])
+    values = values[~np.isnan(values)]
+    edges = np.histogram_bin_edges(values, bins="auto")
+    if len(edges) - 1 > max_points:
+        edges = np.histogram_bin_edges(values, bins=max_points)
+    counts, edges = np.histogram(values, bins=edges)
+    binned = [
+        [float(edges[i]), float(edges[i + 1]), int(counts[i])]
+        for i in range(len(counts))
+    ]
+    return ["bin_start", "bin_end", "count"], binned, {"method": "bins", "column": columns[numeric[0]]}
+
+def _category_totals(columns: Sequence[str], rows: Rows) -> Tuple[List[str], List[Tuple[Any, float]]]:
+    """Total par catégorie (somme de la première colonne numérique, sinon effectif), décroissant."""
+    numeric = _numeric_columns(rows, len(columns))
+    label_index = next((i for i in range(len(columns)) if i not in numeric), 0)
+    value_index = next((i for i in numeric if i != label_index), None)
+
+    totals: Dict[Any, float] = defaultdict(float)
+    for row in rows:
+        totals[row[label_index]] += 1 if value_index is None else (row[value_index] or 0)
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    value_name = columns[value_index] if value_index is not None else "count"
+    return [columns[label_index], value_name], ranked
+
+def reduce_category_bars(columns: Sequence[str], rows: Rows, max_points: int) -> Tuple[Sequence[str], Rows, Reduction]:
+    """Histogramme de données catégorielles : une barre par catégorie, les max_points plus hautes.
+
+    Contrairement au camembert, les catégories écartées ne sont pas regroupées.
+    """
+    names, ranked = _category_totals(columns, rows)
+    kept = ranked[:max_points]
+    return (
+        names,
+        [[label, value] for label, value in kept],
+        {"method": "top_bars", "k": max_points, "omitted_categories": len(ranked) - len(kept)}
+    )
+
+def reduce_pie(columns: Sequence[str], rows: Rows, max_points: int) -> Tuple[Sequence[str], Rows, Reduction]:
+    """Garde les k catégories les plus importantes et regroupe le reste sous « Autres »."""
+    names, ranked = _category_totals(columns, rows)
+
+    top_k = max(1, min(max_points, settings.CHART_PIE_TOP_K))
+    kept = ranked[:top_k]
+    rest = ranked[top_k:]
+    if rest:
+        kept.append((OTHER_LABEL, sum(value for _, value in rest)))
+
+    return (
+        names,
+        [[label, value] for label, value in kept],
+        {"method": "top_k", "k": top_k, "grouped_categories": len(rest)}
+    )
+
+def _stride_sample(rows: Rows, max_points: int) -> Rows:
+    """Échantillon régulier, premier et dernier points inclus."""
+    indices = np.unique(np.linspace(0, len(rows) - 1, max_points).astype(np.int64))
+    return [rows[i] for i in indices]
+
+def reduce_for_chart(
+    columns: Sequence[str],
+    rows: Rows,
+    viz_type: str,
+    max_points: int
+) -> Tuple[Sequence[str], Rows, Reduction]:
+    """Réduit un résultat à au plus max_points éléments selon le type de graphique.
+
+    Ligne : LTTB ; histogramme : effectifs par classe (par catégorie, les
+    plus hautes barres, pour des données non numériques) ; camembert : top-k et
+    « Autres » ; autres types : échantillon régulier. Un résultat déjà assez
+    petit est renvoyé tel quel (réduction None), sauf pour l'histogramme et
+    le camembert dont l'agrégation est toujours appliquée.
+    """
+    if not rows or not columns:
+        return columns, rows, None
+    if viz_type == "histogram":
+        return reduce_histogram(columns, rows, max_points)
+    if viz_type == "pie":
+        return reduce_pie(columns, rows, max_points)
+    if len(rows) <= max_points:
+        return columns, rows, None
+    if viz_type == "line":
+        return reduce_line(columns, rows, max_points)
+    return columns, _stride_sample(rows, max_points), {"method": "sample"}
@@ -0,0 +1,216 @@
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+from sqlalchemy import text
+from ..core.config import settings
+from ..core.logging import get_logger
+from ..db.base import engine, read_engine, columnar_path
+
+logger = get_logger(__name__)
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows : un seul worker
+    fcntl = None
+
+SALES_DDL = """
+    CREATE TABLE sales (
+        id BIGINT PRIMARY KEY,
+        date DATE,
+        product VARCHAR,
+        category VARCHAR,
+        amount DOUBLE,
+        customer_age INTEGER
+    )
+"""
+
+SALES_SCHEMA_FIELDS = [
+    ("id", "int64"),
+    ("date", "string"),
+    ("product", "string"),
+    ("category", "string"),
+    ("amount", "float64"),
+    ("customer_age", "int64"),
+]
+
+class ColumnarMirror:
+    """Recopie la table `sales` de SQLite vers le fichier DuckDB interrogé par l'API.
+
+    La copie est écrite dans un fichier temporaire puis substituée
+    atomiquement : les requêtes en cours terminent sur l'ancienne version et
+    les nouvelles connexions ouvrent la nouvelle. `sales` étant alimentée en
+    ajout seul, seules les lignes au-delà du plus grand id du miroir sont
+    ajoutées à une copie du fichier existant ; un vidage ou une suppression
+    entraîne une copie complète. Un verrou de fichier réserve la
+    synchronisation à un seul worker à la fois ; les autres rouvrent leurs
+    connexions quand le fichier a été remplacé.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or columnar_path()
+        self._lock = threading.Lock()
+        self._mirror_identity: Optional[Tuple[int, int]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _source_version(self) -> Tuple[int, int]:
+        with engine.connect() as conn:
+            max_id, count = conn.execute(text("SELECT MAX(id), COUNT(*) FROM sales")).one()
+        return (max_id or 0, count)
+
+    def _mirror_version(self) -> Optional[Tuple[int, int]]:
+        """(plus grand id, nombre de lignes) du miroir, ou None s'il est absent ou illisible."""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with read_engine.connect() as conn:
+                max_id, count = conn.execute(text("SELECT MAX(id), COUNT(*) FROM sales")).one()
+        except Exception as e:
+            logger.warning("Cannot read columnar mirror, copying it again: %s", e)
+            return None
+        return (max_id or 0, count)
+
+    def _appended_only(self, mirror: Tuple[int, int], source: Tuple[int, int]) -> bool:
+        """Vrai si `sales` n'a reçu que des lignes d'id supérieur au miroir depuis sa copie."""
+        mirror_max_id, mirror_count = mirror
+        with engine.connect() as conn:
+            new_rows = conn.execute(
+                text("SELECT COUNT(*) FROM sales WHERE id > :id"), {"id": mirror_max_id}
+            ).scalar()
+        return mirror_count + new_rows == source[1]
+
+    def _file_identity(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _reload_if_replaced(self) -> None:
+        """Ferme les connexions inactives si un autre worker a remplacé le fichier."""
+        identity = self._file_identity()
+        if self._mirror_identity is not None and identity != self._mirror_identity:
+            read_engine.dispose()
+        self._mirror_identity = identity
+
+    @contextmanager
+    def _sync_lock(self, wait: bool) -> Iterator[bool]:
+        """Verrou de synchronisation partagé entre workers ; produit False s'il est déjà pris."""
+        if fcntl is None:
+            yield True
+            return
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _copy(self, target: str, after_id: Optional[int] = None) -> int:
+        """Écrit dans `target` les lignes de `sales` (d'id > after_id si fourni) ; retourne leur nombre.
+
+        Sans after_id, `target` est un nouveau fichier et la table y est créée.
+        """
+        import duckdb
+
+        if pa is None:
+            raise RuntimeError("pyarrow est requis pour la synchronisation colonnaire")
+        schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in SALES_SCHEMA_FIELDS])
+
+        copied = 0
+        target_conn = duckdb.connect(target)
+        try:
+            if after_id is None:
+                target_conn.execute(SALES_DDL)
+            query = "SELECT id, date, product, category, amount, customer_age FROM sales"
+            if after_id is not None:
+                query += " WHERE id > :after_id"
+            with engine.connect() as source:
+                result = source.execution_options(stream_results=True).execute(
+                    text(query + " ORDER BY id"), {"after_id": after_id}
+                )
+                while True:
+                    rows = result.fetchmany(settings.ANALYTICS_SYNC_BATCH_SIZE)
+                    if not rows:
+                        break
+                    columns = list(zip(*rows))
+                    batch = pa.Table.from_arrays(
+                        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                        schema=schema
+                    )
+                    target_conn.register("sales_batch", batch)
+                    target_conn.execute(
+                        "INSERT INTO sales SELECT id, CAST(date AS DATE), product, category, "
+                        "amount, customer_age FROM sales_batch"
+                    )
+                    target_conn.unregister("sales_batch")
+                    copied += len(rows)
+            target_conn.execute("CHECKPOINT")
+        finally:
+            target_conn.close()
+        return copied
+
+    def sync(self, force: bool = False, wait: bool = False) -> int:
+        """Synchronise le miroir si `sales` a changé ; retourne le nombre de lignes copiées.
+
+        Si un autre worker synchronise déjà, retourne 0 sans attendre, sauf
+        avec wait (démarrage : le miroir doit exister avant de servir).
+        """
+        if not self.enabled:
+            return 0
+        with self._lock, self._sync_lock(wait) as acquired:
+            self._reload_if_replaced()
+            if not acquired:
+                return 0
+            try:
+                source = self._source_version()
+                mirror = None if force else self._mirror_version()
+                if mirror == source:
+                    return 0
+                incremental = mirror is not None and self._appended_only(mirror, source)
+            except Exception as e:
+                logger.error("Columnar sync failed: cannot read source version: %s", e)
+                return 0
+
+            started = time.perf_counter()
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            for leftover in (tmp_path, f"{tmp_path}.wal"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            try:
+                if incremental:
+                    # Copie du fichier (sans relire SQLite) puis ajout des nouvelles lignes
+                    shutil.copyfile(self.path, tmp_path)
+                    copied = self._copy(tmp_path, after_id=mirror[0])
+                else:
+                    copied = self._copy(tmp_path)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.error("Columnar sync failed: %s", e)
+                return 0
+
+            # Les connexions inactives pointent vers l'ancien fichier
+            read_engine.dispose()
+            self._mirror_identity = self._file_identity()
+            logger.info(
+                "Columnar mirror synced (%s): %s rows in %.1fs",
+                "incremental" if incremental else "full", copied, time.perf_counter() - started
+            )
+            return copied
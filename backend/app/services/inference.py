@@ -0,0 +1,155 @@
+import http.client
+import json
+import socket
+import threading
+import time
+from typing import List, Optional, Sequence
+from urllib.parse import unquote, urlsplit
+from ..core.config import settings
+from ..core.logging import get_logger
+from ..core.metrics import registry
+
+logger = get_logger(__name__)
+
+INFERENCE_REQUESTS = registry.counter(
+    "inference_requests_total",
+    "Classifier calls by backend (local, remote) and outcome.",
+    labelnames=("backend", "outcome")
+)
+
+class LocalClassifier:
+    """Classifieur chargé dans le processus courant, au premier appel.
+
+    transformers et torch ne sont importés qu'à ce moment : un worker qui
+    délègue au serveur d'inférence ne les charge jamais.
+    """
+
+    def __init__(self):
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._pipeline is None:
+                from transformers import pipeline
+                logger.info("Loading classifier model %s", settings.CLASSIFIER_MODEL)
+                self._pipeline = pipeline(
+                    "text-classification",
+                    model=settings.CLASSIFIER_MODEL,
+                    cache_dir=settings.MODEL_CACHE_DIR
+                )
+        return self._pipeline
+
+    def classify(self, texts: Sequence[str]) -> List[Optional[str]]:
+        """Label (en minuscules) de chaque texte."""
+        results = self.load()(list(texts))
+        INFERENCE_REQUESTS.inc(backend="local", outcome="ok")
+        return [result["label"].lower() if result else None for result in results]
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """Connexion HTTP sur une socket Unix locale."""
+
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+class InferenceClient:
+    """Client léger du serveur d'inférence partagé (inference_main).
+
+    L'URL est `unix:///chemin/vers/socket` ou `http://hôte:port`. Chaque
+    thread garde sa connexion (keep-alive). Si le serveur est injoignable,
+    classify() renvoie des labels None (le choix du graphique se fait alors
+    sans indice du modèle) et le serveur n'est réessayé qu'après
+    INFERENCE_RETRY_INTERVAL secondes, pour ne pas payer un timeout par
+    requête pendant une panne.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.timeout = timeout
+        if parts.scheme == "unix":
+            self._socket_path = unquote(parts.netloc + parts.path)
+            self._address = None
+        elif parts.scheme == "http":
+            self._socket_path = None
+            self._address = (parts.hostname, parts.port or 80)
+        else:
+            raise ValueError(f"Unsupported inference server URL: {url}")
+        self._local = threading.local()
+        self._unavailable_until = 0.0
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if self._socket_path is not None:
+                connection = _UnixHTTPConnection(self._socket_path, self.timeout)
+            else:
+                connection = http.client.HTTPConnection(*self._address, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _post(self, path: str, payload: dict) -> dict:
+        body = json.dumps(payload).encode("utf-8")
+        # Une connexion keep-alive fermée par le serveur est rouverte une fois
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                data = response.read()
+            except (ConnectionError, http.client.HTTPException):
+                self._close()
+                if attempt:
+                    raise
+                continue
+            except OSError:
+                self._close()
+                raise
+            if response.status != 200:
+                raise RuntimeError(f"Inference server returned HTTP {response.status}")
+            return json.loads(data)
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def classify(self, texts: Sequence[str]) -> List[Optional[str]]:
+        if not self.available():
+            INFERENCE_REQUESTS.inc(backend="remote", outcome="skipped")
+            return [None] * len(texts)
+        try:
+            labels = self._post("/classify", {"texts": list(texts)})["labels"]
+        except (OSError, RuntimeError, ValueError, KeyError) as e:
+            self._unavailable_until = time.monotonic() + settings.INFERENCE_RETRY_INTERVAL
+            INFERENCE_REQUESTS.inc(backend="remote", outcome="error")
+            logger.warning(
+                "Inference server unavailable, classifying without model for %ss: %s",
+                settings.INFERENCE_RETRY_INTERVAL, e
+            )
+            return [None] * len(texts)
+        INFERENCE_REQUESTS.inc(backend="remote", outcome="ok")
+        return labels
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier():
+    """Classifieur du processus : client du serveur d'inférence si INFERENCE_SERVER_URL est défini."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            if settings.INFERENCE_SERVER_URL:
+                _classifier = InferenceClient(settings.INFERENCE_SERVER_URL, settings.INFERENCE_TIMEOUT)
+            else:
+                _classifier = LocalClassifier()
+        return _classifier
@@ -0,0 +1,256 @@
+"""Chargement en masse de fichiers CSV ou Parquet dans la table `sales`.
+
+Exemple :
+    python -m backend.app.services.ingestion ventes_2024-06-01.csv ventes.parquet
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import pandas as pd
+from sqlalchemy import text
+from ..core.config import settings
+from ..core.logging import get_logger, setup_logging
+from ..db.base import engine, init_db
+from ..models.sales import Sale
+from .rollups import RollupManager, clear_rollups
+
+logger = get_logger(__name__)
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    pq = None
+
+COLUMNS = ["date", "product", "category", "amount", "customer_age"]
+REQUIRED_COLUMNS = ["date", "product", "category", "amount"]
+
+INSERT_SQL = (
+    "INSERT INTO sales (date, product, category, amount, customer_age) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+
+DEFER_AUTO = "auto"
+DEFER_ALWAYS = "always"
+DEFER_NEVER = "never"
+
+def _detect_format(path: Path) -> str:
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if suffixes and suffixes[-1] in (".parquet", ".pq"):
+        return "parquet"
+    if ".csv" in suffixes or ".txt" in suffixes:
+        return "csv"
+    raise ValueError(f"Format de fichier non reconnu : {path.name}")
+
+def estimate_rows(path: Path, file_format: str) -> int:
+    """Estime le nombre de lignes d'un fichier sans le lire entièrement."""
+    if file_format == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    if path.suffix.lower() != ".csv":
+        # Fichier compressé : pas d'estimation fiable à partir de la taille
+        return 0
+    with open(path, "rb") as f:
+        sample = f.read(1 << 16)
+    lines = sample.count(b"\n")
+    if not lines:
+        return 0
+    return int(os.path.getsize(path) / (len(sample) / lines))
+
+def iter_chunks(path: Path, file_format: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Lit le fichier par blocs de `chunk_size` lignes."""
+    if file_format == "parquet":
+        if pq is None:
+            raise RuntimeError("pyarrow est requis pour lire les fichiers Parquet")
+        parquet_file = pq.ParquetFile(path)
+        available = set(parquet_file.schema_arrow.names)
+        columns = [name for name in COLUMNS if name in available] or None
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=True)
+
+def normalize_chunk(df: pd.DataFrame) -> Tuple[List[tuple], int]:
+    """Convertit un bloc en tuples prêts à insérer ; retourne (lignes, lignes rejetées).
+
+    Les ids du fichier sont ignorés : ils sont attribués par la base afin de
+    rester croissants, ce dont dépend le rafraîchissement des agrégats.
+    """
+    df = df.rename(columns=lambda name: str(name).strip().lower())
+    missing = [name for name in REQUIRED_COLUMNS if name not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+    if "customer_age" not in df.columns:
+        df["customer_age"] = None
+
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    amounts = pd.to_numeric(df["amount"], errors="coerce")
+    ages = pd.to_numeric(df["customer_age"], errors="coerce")
+    products = df["product"].astype("string").str.strip()
+    categories = df["category"].astype("string").str.strip()
+
+    valid = dates.notna() & amounts.notna() & products.notna() & categories.notna()
+    valid &= (products != "") & (categories != "")
+    rejected = int((~valid).sum())
+
+    ages = ages[valid].round().astype("Int64").astype(object)
+    rows = list(zip(
+        dates[valid].dt.strftime("%Y-%m-%d"),
+        products[valid].astype(object),
+        categories[valid].astype(object),
+        amounts[valid].astype(float),
+        ages.where(ages.notna(), None),
+    ))
+    return rows, rejected
+
+class SalesIngestor:
+    """Charge des fichiers dans `sales` par `executemany` groupés en grosses transactions.
+
+    Pour les chargements volumineux, les index secondaires du modèle Sale
+    sont supprimés pendant l'écriture puis reconstruits en une passe.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.INGEST_BATCH_SIZE,
+        commit_rows: int = settings.INGEST_COMMIT_ROWS,
+        defer_index_rows: int = settings.INGEST_DEFER_INDEX_ROWS,
+    ):
+        self.batch_size = batch_size
+        self.commit_rows = max(commit_rows, batch_size)
+        self.defer_index_rows = defer_index_rows
+        self._is_sqlite = engine.dialect.name == "sqlite"
+
+    def _should_defer(self, estimated_rows: int, defer_indexes: str) -> bool:
+        if defer_indexes == DEFER_ALWAYS:
+            return True
+        if defer_indexes == DEFER_NEVER:
+            return False
+        return estimated_rows >= self.defer_index_rows
+
+    def _insert(self, conn, rows: List[tuple]) -> None:
+        if self._is_sqlite:
+            conn.exec_driver_sql(INSERT_SQL, rows)
+        else:
+            conn.execute(Sale.__table__.insert(), [dict(zip(COLUMNS, row)) for row in rows])
+
+    def _drop_indexes(self, conn) -> None:
+        with conn.begin():
+            for index in Sale.__table__.indexes:
+                index.drop(conn, checkfirst=True)
+
+    def _create_indexes(self, conn) -> None:
+        with conn.begin():
+            for index in Sale.__table__.indexes:
+                index.create(conn, checkfirst=True)
+            if self._is_sqlite:
+                conn.execute(text("ANALYZE sales"))
+
+    def ingest(
+        self,
+        paths: List[str],
+        file_format: Optional[str] = None,
+        defer_indexes: str = DEFER_AUTO,
+        truncate: bool = False,
+    ) -> Dict[str, Any]:
+        """Charge les fichiers et retourne un rapport (lignes, rejets, durée, débit)."""
+        init_db()
+        files = [(Path(p), file_format or _detect_format(Path(p))) for p in paths]
+        estimated = sum(estimate_rows(path, fmt) for path, fmt in files)
+        deferred = self._should_defer(estimated, defer_indexes)
+
+        written = 0
+        rejected = 0
+        started = time.perf_counter()
+        with engine.connect() as conn:
+            if self._is_sqlite:
+                # Le WAL garde la base cohérente ; seule la durabilité des
+                # dernières transactions est sacrifiée en cas de panne système
+                conn.exec_driver_sql("PRAGMA synchronous=OFF")
+                conn.commit()
+            try:
+                if truncate:
+                    with conn.begin():
+                        conn.execute(text("DELETE FROM sales"))
+                        if settings.ROLLUPS_ENABLED and self._is_sqlite:
+                            # Même transaction : les agrégats de l'ancien contenu
+                            # ne doivent jamais passer pour à jour pendant le chargement
+                            clear_rollups(conn)
+                if deferred:
+                    logger.info("Dropping sales secondary indexes for a load of ~%s rows", estimated)
+                    self._drop_indexes(conn)
+                transaction = conn.begin()
+                try:
+                    pending = 0
+                    for path, fmt in files:
+                        logger.info("Ingesting %s (%s)", path, fmt)
+                        for chunk in iter_chunks(path, fmt, self.batch_size):
+                            rows, chunk_rejected = normalize_chunk(chunk)
+                            rejected += chunk_rejected
+                            if rows:
+                                self._insert(conn, rows)
+                            written += len(rows)
+                            pending += len(rows)
+                            if pending >= self.commit_rows:
+                                transaction.commit()
+                                transaction = conn.begin()
+                                pending = 0
+                                elapsed = time.perf_counter() - started
+                                logger.info("%s rows committed (%.0f rows/s)", written, written / elapsed)
+                    transaction.commit()
+                except Exception:
+                    if transaction.is_active:
+                        transaction.rollback()
+                    raise
+                finally:
+                    if deferred:
+                        # Reconstruit les index même après un échec partiel
+                        index_started = time.perf_counter()
+                        self._create_indexes(conn)
+                        logger.info("Sales indexes rebuilt in %.1fs", time.perf_counter() - index_started)
+            finally:
+                if self._is_sqlite:
+                    conn.exec_driver_sql("PRAGMA synchronous=NORMAL")
+
+        elapsed = time.perf_counter() - started
+        report = {
+            "files": len(files),
+            "rows": written,
+            "rejected": rejected,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(written / elapsed) if elapsed else 0,
+            "deferred_indexes": deferred,
+        }
+        logger.info("Ingestion finished: %s", report)
+
+        if settings.ROLLUPS_ENABLED and (written or truncate):
+            # Après un vidage, les ids repartent de 1 : les filigranes ne sont plus valables
+            rollups = RollupManager()
+            if truncate:
+                rollups.rebuild()
+            else:
+                rollups.refresh()
+        return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Charge des fichiers CSV ou Parquet dans la table sales")
+    parser.add_argument("files", nargs="+", help="Fichiers à charger (.csv, .csv.gz, .parquet)")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Force le format des fichiers")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE)
+    parser.add_argument("--commit-rows", type=int, default=settings.INGEST_COMMIT_ROWS,
+                        help="Lignes écrites par transaction")
+    parser.add_argument("--defer-indexes", choices=[DEFER_AUTO, DEFER_ALWAYS, DEFER_NEVER], default=DEFER_AUTO,
+                        help="Supprime les index secondaires pendant le chargement")
+    parser.add_argument("--truncate", action="store_true", help="Vide la table avant le chargement")
+    args = parser.parse_args()
+
+    setup_logging()
+    ingestor = SalesIngestor(batch_size=args.batch_size, commit_rows=args.commit_rows)
+    report = ingestor.ingest(args.files, args.format, args.defer_indexes, args.truncate)
+    print(
+        f"{report['rows']:,} lignes chargées ({report['rejected']:,} rejetées) "
+        f"en {report['seconds']:.1f} s, soit {report['rows_per_second']:,} lignes/s"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..core.config import settings
+from ..core.logging import get_logger
+
+logger = get_logger(__name__)
+
+DIMENSIONS = 2048
+NGRAM_SIZES = (3, 4, 5)
+
+MONTHS = {
+    "janvier", "fevrier", "mars", "avril", "mai", "juin", "juillet", "aout",
+    "septembre", "octobre", "novembre", "decembre",
+    "january", "february", "march", "april", "may", "june", "july", "august",
+    "september", "october", "november", "december",
+}
+
+# Sens d'un tri, d'une comparaison ou d'une borne : deux prompts qui ne
+# diffèrent que par l'un de ces mots appellent des requêtes opposées
+DIRECTION_WORDS = {
+    "croissant", "croissante", "decroissant", "decroissante", "ascendant", "descendant",
+    "asc", "desc", "plus", "moins", "min", "max", "minimum", "maximum", "top", "flop",
+    "avant", "apres", "superieur", "superieure", "inferieur", "inferieure",
+    "meilleur", "meilleurs", "meilleure", "meilleures", "pire", "pires",
+    "premier", "premiers", "premiere", "premieres", "dernier", "derniers", "derniere", "dernieres",
+    "hausse", "baisse", "ascending", "descending", "increasing", "decreasing",
+    "more", "less", "most", "least", "highest", "lowest", "best", "worst",
+    "before", "after", "above", "below", "first", "last",
+}
+
+# Mots vides et formules de demande, sans incidence sur la requête
+STOPWORDS = {
+    "le", "la", "les", "l", "un", "une", "des", "de", "du", "d", "et", "a", "au", "aux",
+    "en", "sur", "pour", "par", "quel", "quelle", "quels", "quelles", "est", "sont",
+    "montre", "montrez", "affiche", "affichez", "donne", "donnez", "moi", "me", "je", "veux",
+    "voudrais", "voir", "liste", "listez", "the", "of", "by", "for", "in", "on", "and",
+    "show", "give", "display", "list", "what", "are", "is", "please", "stp", "svp",
+}
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+_QUOTED_RE = re.compile(r"[\"'«]([^\"'»]+)[\"'»]")
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+
+def normalize_text(prompt: str) -> str:
+    """Minuscules, sans accents ni ponctuation, espaces normalisés."""
+    decomposed = unicodedata.normalize("NFKD", prompt.lower())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_NON_WORD_RE.sub(" ", stripped).split())
+
+def literal_tokens(prompt: str) -> frozenset:
+    """Éléments du prompt qui changent le SQL sans changer sa forme.
+
+    Valeurs reprises en littéraux (nombres, mois, citations) et mots de sens
+    (tri, comparaison, bornes) : ils doivent être identiques pour réutiliser
+    la requête d'un voisin.
+    """
+    quoted = {match.strip().lower() for match in _QUOTED_RE.findall(prompt)}
+    normalized = normalize_text(prompt)
+    words = normalized.split()
+    numbers = set(_NUMBER_RE.findall(normalized))
+    months = {word for word in words if word in MONTHS}
+    directions = {word for word in words if word in DIRECTION_WORDS}
+    return frozenset(quoted | numbers | months | directions)
+
+def vectorize(prompt: str) -> np.ndarray:
+    """Vecteur de fréquences (log) des n-grammes de caractères, haché sur DIMENSIONS."""
+    words = [word for word in normalize_text(prompt).split() if word not in STOPWORDS]
+    text = f" {' '.join(words)} "
+    counts: Counter = Counter()
+    for size in NGRAM_SIZES:
+        for i in range(len(text) - size + 1):
+            counts[zlib.crc32(text[i:i + size].encode("utf-8")) % DIMENSIONS] += 1
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for index, count in counts.items():
+        vector[index] = 1.0 + math.log(count)
+    return vector
+
+class PromptIndex:
+    """Index de similarité des paires prompt -> SQL validées.
+
+    Les prompts sont représentés par des vecteurs TF-IDF de n-grammes de
+    caractères (robustes aux fautes, accords et reformulations proches),
+    conservés dans une matrice NumPy ; la recherche est un produit scalaire
+    entre vecteurs normalisés (similarité cosinus). Les paires sont
+    persistées dans SQLite et rechargées au démarrage.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.PROMPT_INDEX_PATH,
+        max_entries: int = settings.PROMPT_INDEX_MAX_ENTRIES
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._prompts: List[str] = []
+        self._sql: List[str] = []
+        self._fingerprints: List[str] = []
+        self._vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._idf: Optional[np.ndarray] = None
+        self.reuses = 0
+        self.few_shots = 0
+        self._conn = self._connect()
+        self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS prompt_examples (
+                prompt_key TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                sql_query TEXT NOT NULL,
+                schema_fingerprint TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        return conn
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT prompt_key, prompt, sql_query, schema_fingerprint FROM prompt_examples "
+            "ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        for key, prompt, sql_query, fingerprint in reversed(rows):
+            self._append(key, prompt, sql_query, fingerprint)
+        if rows:
+            logger.info("Prompt index loaded with %s examples", len(rows))
+
+    def _append(self, key: str, prompt: str, sql_query: str, fingerprint: str) -> None:
+        self._keys.append(key)
+        self._prompts.append(prompt)
+        self._sql.append(sql_query)
+        self._fingerprints.append(fingerprint)
+        self._vectors.append(vectorize(prompt))
+        self._matrix = None
+
+    def _build(self) -> None:
+        """Recalcule l'IDF et la matrice pondérée normalisée (après ajout)."""
+        raw = np.vstack(self._vectors)
+        document_frequency = (raw > 0).sum(axis=0)
+        self._idf = (np.log((1 + len(raw)) / (1 + document_frequency)) + 1).astype(np.float32)
+        weighted = raw * self._idf
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        self._matrix = weighted / np.maximum(norms, 1e-12)
+
+    def add(self, prompt: str, sql_query: str, schema_fingerprint: Optional[str]) -> None:
+        """Ajoute (ou remplace) une paire validée."""
+        fingerprint = schema_fingerprint or ""
+        key = hashlib.sha256(f"{fingerprint}\x00{normalize_text(prompt)}".encode("utf-8")).hexdigest()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO prompt_examples (prompt_key, prompt, sql_query, schema_fingerprint, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(prompt_key) DO UPDATE SET
+                    sql_query = excluded.sql_query,
+                    created_at = excluded.created_at
+                """,
+                (key, prompt, sql_query, fingerprint, time.time())
+            )
+            if key in self._keys:
+                index = self._keys.index(key)
+                for values in (self._keys, self._prompts, self._sql, self._fingerprints, self._vectors):
+                    del values[index]
+            self._append(key, prompt, sql_query, fingerprint)
+
+            overflow = len(self._keys) - self.max_entries
+            if overflow > 0:
+                evicted = self._keys[:overflow]
+                for values in (self._keys, self._prompts, self._sql, self._fingerprints, self._vectors):
+                    del values[:overflow]
+                self._conn.executemany(
+                    "DELETE FROM prompt_examples WHERE prompt_key = ?",
+                    [(key,) for key in evicted]
+                )
+
+    def search(
+        self,
+        prompt: str,
+        schema_fingerprint: Optional[str],
+        k: int = settings.PROMPT_INDEX_FEW_SHOT_K
+    ) -> List[Tuple[float, str, str]]:
+        """Retourne les k paires les plus proches : (similarité, prompt, sql)."""
+        fingerprint = schema_fingerprint or ""
+        with self._lock:
+            if not self._keys:
+                return []
+            if self._matrix is None:
+                self._build()
+            matrix, idf = self._matrix, self._idf
+            prompts, sql, fingerprints = list(self._prompts), list(self._sql), list(self._fingerprints)
+
+        query = vectorize(prompt) * idf
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        scores = matrix @ (query / norm)
+        # Paires générées pour un autre schéma ou un autre dialecte : ignorées
+        scores[np.array(fingerprints) != fingerprint] = -1.0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), prompts[i], sql[i]) for i in top if scores[i] > 0]
+
+    def match(
+        self,
+        prompt: str,
+        schema_fingerprint: Optional[str]
+    ) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+        """Retourne (sql réutilisable, exemples few-shot).
+
+        La requête d'un voisin n'est réutilisée qu'au-dessus du seuil de
+        confiance et si les valeurs citées (nombres, mois) et les mots de sens
+        sont identiques : « ventes de janvier » ne doit pas reprendre le SQL de
+        « ventes de février », ni un tri décroissant celui d'un tri croissant.
+        """
+        neighbours = self.search(prompt, schema_fingerprint)
+        if not neighbours:
+            return None, []
+
+        score, best_prompt, best_sql = neighbours[0]
+        if score >= settings.PROMPT_INDEX_REUSE_THRESHOLD and literal_tokens(prompt) == literal_tokens(best_prompt):
+            self.reuses += 1
+            logger.info("Reusing SQL of similar prompt (%.2f): %s", score, best_prompt)
+            return best_sql, []
+
+        examples = [
+            (example_prompt, example_sql)
+            for example_score, example_prompt, example_sql in neighbours
+            if example_score >= settings.PROMPT_INDEX_MIN_SIMILARITY
+        ]
+        if examples:
+            self.few_shots += 1
+        return None, examples
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._keys)
+        return {"size": size, "reuses": self.reuses, "few_shot_requests": self.few_shots}
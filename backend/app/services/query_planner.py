@@ -0,0 +1,219 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.logging import get_logger
+from .sql_template import parameterize
+
+logger = get_logger(__name__)
+
+ACTION_ALLOW = "allow"
+ACTION_LIMIT = "limit"
+ACTION_QUEUE = "queue"
+ACTION_REJECT = "reject"
+# Valeurs admises pour SQL_PLAN_ACTION (requête au-delà de SQL_PLAN_MAX_COST)
+OVER_BUDGET_ACTIONS = (ACTION_LIMIT, ACTION_QUEUE, ACTION_REJECT)
+
+_STEP_RE = re.compile(r"^(SCAN|SEARCH)\s+(?:TABLE\s+)?(\w+)(?:\s+AS\s+(\w+))?(.*)$", re.I)
+_FROM_CLAUSE_RE = re.compile(r"\bFROM\b(.*?)(?=\bWHERE\b|\bGROUP\b|\bORDER\b|\bHAVING\b|\bLIMIT\b|\bUNION\b|\bSELECT\b|\(|\)|;|$)", re.I | re.S)
+_TABLE_REF_RE = re.compile(r"^\s*[\"`]?(\w+)[\"`]?(?:\s+(?:AS\s+)?(?!(?:ON|USING|LEFT|RIGHT|FULL|INNER|OUTER|CROSS|NATURAL)\b)(\w+))?", re.I)
+
+class QueryRejectedError(ValueError):
+    """Requête refusée par le garde-fou de coût."""
+
+    def __init__(self, message: str, plan: Dict[str, Any]):
+        super().__init__(message)
+        self.plan = plan
+
+class SlowLane:
+    """File des requêtes coûteuses : limite leur nombre d'exécutions simultanées."""
+
+    def __init__(self, concurrency: int):
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        return self._semaphore.acquire(timeout=timeout)
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+class QueryPlanner:
+    """Estime le coût d'une requête via EXPLAIN QUERY PLAN avant son exécution.
+
+    Détecte les parcours complets, les B-trees temporaires (tri ou GROUP BY
+    sans index) et les produits cartésiens, puis décide selon les seuils
+    configurés : exécuter, ajouter un LIMIT, passer par la file lente ou refuser.
+    """
+
+    ROW_COUNT_TTL = 300  # secondes
+
+    def __init__(self):
+        # Vérifié au démarrage : une faute de frappe laisserait passer toutes les requêtes coûteuses
+        if settings.SQL_PLAN_ACTION not in OVER_BUDGET_ACTIONS:
+            raise ValueError(
+                f"Invalid SQL_PLAN_ACTION {settings.SQL_PLAN_ACTION!r}: "
+                f"expected one of {', '.join(OVER_BUDGET_ACTIONS)}"
+            )
+        self._row_counts: Dict[str, tuple] = {}
+        self._plans: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _explain(self, db: Session, sql_query: str) -> List[tuple]:
+        """EXPLAIN QUERY PLAN du gabarit paramétré, mémorisé par empreinte de gabarit.
+
+        Le plan de SQLite ne dépend pas des valeurs liées : les variantes d'une
+        même requête ne sont compilées qu'une fois par période ROW_COUNT_TTL.
+        """
+        template = parameterize(sql_query)
+        now = time.time()
+        with self._lock:
+            cached = self._plans.get(template.fingerprint)
+            if cached and now - cached[1] < self.ROW_COUNT_TTL:
+                self._plans.move_to_end(template.fingerprint)
+                return cached[0]
+
+        rows = [
+            tuple(row) for row in
+            db.execute(text(f"EXPLAIN QUERY PLAN {template.text}"), template.params).fetchall()
+        ]
+        with self._lock:
+            self._plans[template.fingerprint] = (rows, now)
+            while len(self._plans) > settings.SQL_TEMPLATE_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return rows
+
+    def _table_rows(self, db: Session, table: str) -> int:
+        """Estimation du nombre de lignes d'une table (MAX(rowid)), mise en cache."""
+        now = time.time()
+        with self._lock:
+            cached = self._row_counts.get(table)
+            if cached and now - cached[1] < self.ROW_COUNT_TTL:
+                return cached[0]
+        try:
+            rows = db.execute(text(f'SELECT MAX(rowid) FROM "{table}"')).scalar() or 0
+        except SQLAlchemyError:
+            # Vue, CTE ou table sans rowid : pas d'estimation
+            rows = 0
+        with self._lock:
+            self._row_counts[table] = (rows, now)
+        return rows
+
+    @staticmethod
+    def _aliases(sql_query: str) -> Dict[str, str]:
+        """Associe chaque alias de la requête au nom de sa table."""
+        references = []
+        for clause in _FROM_CLAUSE_RE.findall(sql_query):
+            references.extend(re.split(r",|\bJOIN\b", clause, flags=re.I))
+        # Jointures situées après une sous-requête : "(...) q JOIN sales s"
+        references.extend(sql_query[m.end():] for m in re.finditer(r"\bJOIN\b", sql_query, re.I))
+
+        aliases = {}
+        for reference in references:
+            match = _TABLE_REF_RE.match(reference)
+            if not match:
+                continue
+            table, alias = match.groups()
+            aliases[table.lower()] = table
+            if alias:
+                aliases[alias.lower()] = table
+        return aliases
+
+    def analyze(self, db: Session, sql_query: str) -> Optional[Dict[str, Any]]:
+        """Analyse le plan d'exécution et retourne un résumé avec l'action décidée.
+
+        Retourne None si le moteur n'est pas SQLite.
+        """
+        if not settings.SQL_PLAN_GUARD_ENABLED or db.get_bind().dialect.name != "sqlite":
+            return None
+
+        rows = self._explain(db, sql_query)
+        aliases = self._aliases(sql_query)
+
+        steps: List[str] = []
+        full_scans: List[Dict[str, Any]] = []
+        scans_by_parent: Dict[int, List[int]] = {}
+        temp_btrees = 0
+
+        for node_id, parent, _, detail in rows:
+            steps.append(detail)
+            if "TEMP B-TREE" in detail.upper():
+                temp_btrees += 1
+                continue
+            match = _STEP_RE.match(detail)
+            if not match or match.group(1).upper() != "SCAN":
+                continue
+            name = match.group(3) or match.group(2)
+            # Alias résolu vers sa table ; une CTE ou une constante donne 0 ligne estimée
+            table = aliases.get(name.lower(), aliases.get(match.group(2).lower(), match.group(2)))
+            table_rows = self._table_rows(db, table)
+            full_scans.append({
+                "table": table,
+                "rows": table_rows,
+                "covering_index": "COVERING INDEX" in detail.upper()
+            })
+            scans_by_parent.setdefault(parent, []).append(table_rows)
+
+        # Plusieurs parcours complets au même niveau : boucles imbriquées (produit cartésien)
+        cross_join = any(len(sizes) > 1 for sizes in scans_by_parent.values())
+        estimated_rows = 0
+        for sizes in scans_by_parent.values():
+            level_cost = 1
+            for size in sizes:
+                level_cost *= max(size, 1)
+            estimated_rows += level_cost if sizes else 0
+        estimated_cost = int(estimated_rows * (1 + 0.5 * temp_btrees))
+
+        plan = {
+            "steps": steps,
+            "full_scans": full_scans,
+            "temp_btrees": temp_btrees,
+            "cross_join": cross_join,
+            "estimated_rows": estimated_rows,
+            "estimated_cost": estimated_cost,
+            "action": ACTION_ALLOW,
+            "limited": False
+        }
+        plan["action"] = self._decide(plan)
+        return plan
+
+    @staticmethod
+    def _decide(plan: Dict[str, Any]) -> str:
+        """Applique les seuils configurés au résumé du plan."""
+        if plan["cross_join"] and plan["estimated_rows"] > settings.SQL_PLAN_MAX_CROSS_JOIN_ROWS:
+            return ACTION_REJECT
+        if plan["estimated_cost"] > settings.SQL_PLAN_REJECT_COST:
+            return ACTION_REJECT
+        if plan["estimated_cost"] > settings.SQL_PLAN_MAX_COST:
+            return settings.SQL_PLAN_ACTION
+        return ACTION_ALLOW
+
+    @staticmethod
+    def with_limit(sql_query: str, limit: int) -> str:
+        """Borne le nombre de lignes renvoyées par la requête."""
+        base = sql_query.strip().rstrip(";")
+        # Retours à la ligne : la requête peut se terminer par un commentaire "--"
+        return f"SELECT * FROM (\n{base}\n) AS limited_query LIMIT {int(limit)}"
+
+    def guard(self, db: Session, sql_query: str):
+        """Analyse la requête et applique la politique de coût.
+
+        Retourne (requête éventuellement bornée, résumé du plan) ; lève
+        QueryRejectedError si la requête est refusée.
+        """
+        plan = self.analyze(db, sql_query)
+        if plan is None:
+            return sql_query, None
+
+        if plan["action"] != ACTION_ALLOW:
+            logger.warning("Costly query plan (%s): %s", plan['action'], plan['steps'])
+        if plan["action"] == ACTION_REJECT:
+            raise QueryRejectedError("Query is too expensive to execute", plan)
+        if plan["action"] == ACTION_LIMIT:
+            plan["limited"] = True
+            return self.with_limit(sql_query, settings.SQL_PLAN_AUTO_LIMIT), plan
+        return sql_query, plan
@@ -0,0 +1,208 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from ..core.config import settings
+from ..core.logging import get_logger
+
+logger = get_logger(__name__)
+
+class ResultStore:
+    """Matérialise les résultats de requêtes pour une pagination sans ré-exécution.
+
+    La requête générée est exécutée une seule fois ; ses lignes sont copiées
+    par lots dans une base SQLite annexe, indexées par (result_id, row_num).
+    Les pages suivantes sont lues par plage de lignes sur la clé primaire,
+    à coût constant quelle que soit la profondeur de la page.
+    """
+
+    PURGE_INTERVAL = 60  # secondes
+
+    def __init__(
+        self,
+        path: str = settings.RESULT_STORE_PATH,
+        ttl: int = settings.RESULT_STORE_TTL,
+        max_rows: int = settings.RESULT_STORE_MAX_ROWS,
+        batch_size: int = settings.RESULT_STORE_BATCH_SIZE
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._conn = self._connect()
+
+    def _open(self) -> sqlite3.Connection:
+        """Ouvre une connexion à la base des résultats."""
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """Ouvre la connexion partagée et crée les tables si nécessaire."""
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._open()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS result_meta (
+                result_id TEXT PRIMARY KEY,
+                sql_query TEXT NOT NULL,
+                columns TEXT NOT NULL,
+                total_count INTEGER NOT NULL,
+                stored_count INTEGER NOT NULL,
+                visualization_type TEXT,
+                title TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS result_rows (
+                result_id TEXT NOT NULL,
+                row_num INTEGER NOT NULL,
+                row TEXT NOT NULL,
+                PRIMARY KEY (result_id, row_num)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_result_meta_created ON result_meta(created_at)")
+        return conn
+
+    def materialize(
+        self,
+        result,
+        sql_query: str,
+        title: Optional[str] = None,
+        visualization_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Copie un résultat SQLAlchemy dans le store et retourne ses métadonnées.
+
+        Au plus max_rows lignes sont lues et stockées, plus une qui indique
+        seulement que le résultat est tronqué : le curseur est alors refermé
+        sans lire le reste, et le total d'un résultat tronqué reste inconnu.
+        """
+        result_id = uuid.uuid4().hex
+        columns = list(result.keys())
+        total_count = 0
+        stored_count = 0
+
+        # Connexion dédiée : l'écriture ne bloque pas les lectures de pages concurrentes
+        conn = self._open() if self.path != ":memory:" else self._conn
+        try:
+            conn.execute("BEGIN")
+            try:
+                while total_count <= self.max_rows:
+                    rows = result.fetchmany(min(self.batch_size, self.max_rows + 1 - total_count))
+                    if not rows:
+                        break
+                    batch = [
+                        (result_id, stored_count + i, json.dumps(list(row), default=str))
+                        for i, row in enumerate(rows[:self.max_rows - stored_count])
+                    ]
+                    if batch:
+                        conn.executemany(
+                            "INSERT INTO result_rows (result_id, row_num, row) VALUES (?, ?, ?)",
+                            batch
+                        )
+                        stored_count += len(batch)
+                    total_count += len(rows)
+                result.close()
+
+                conn.execute(
+                    """
+                    INSERT INTO result_meta
+                        (result_id, sql_query, columns, total_count, stored_count,
+                         visualization_type, title, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (result_id, sql_query, json.dumps(columns), total_count, stored_count,
+                     visualization_type, title, time.time())
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            if conn is not self._conn:
+                conn.close()
+
+        if total_count > stored_count:
+            logger.warning("Result %s truncated: first %s rows stored", result_id, stored_count)
+        if time.time() - self._last_purge > self.PURGE_INTERVAL:
+            self.purge_expired()
+        return self.get_meta(result_id)
+
+    def set_visualization_type(self, result_id: str, visualization_type: str) -> None:
+        """Enregistre le type de visualisation associé au résultat."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE result_meta SET visualization_type = ? WHERE result_id = ?",
+                (visualization_type, result_id)
+            )
+
+    def get_meta(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """Retourne les métadonnées d'un résultat, ou None s'il est absent ou expiré."""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT result_id, sql_query, columns, total_count, stored_count,
+                       visualization_type, title, created_at
+                FROM result_meta WHERE result_id = ?
+                """,
+                (result_id,)
+            ).fetchone()
+        if row is None or time.time() - row[7] > self.ttl:
+            return None
+        return {
+            "result_id": row[0],
+            "sql_query": row[1],
+            "columns": json.loads(row[2]),
+            # Total inconnu au-delà de la troncature
+            "total_count": None if row[3] > row[4] else row[3],
+            "stored_count": row[4],
+            "truncated": row[3] > row[4],
+            "visualization_type": row[5],
+            "title": row[6],
+            "created_at": row[7]
+        }
+
+    def fetch_rows(self, result_id: str, start: int, limit: int) -> List[List[Any]]:
+        """Lit `limit` lignes à partir de la ligne `start` (accès par plage sur la clé)."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT row FROM result_rows
+                WHERE result_id = ? AND row_num >= ? AND row_num < ?
+                ORDER BY row_num
+                """,
+                (result_id, start, start + limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def purge_expired(self) -> int:
+        """Supprime les résultats expirés et retourne leur nombre."""
+        cutoff = time.time() - self.ttl
+        self._last_purge = time.time()
+        with self._lock:
+            expired = [
+                row[0] for row in self._conn.execute(
+                    "SELECT result_id FROM result_meta WHERE created_at < ?",
+                    (cutoff,)
+                ).fetchall()
+            ]
+            if not expired:
+                return 0
+            self._conn.execute("BEGIN")
+            try:
+                for result_id in expired:
+                    self._conn.execute("DELETE FROM result_rows WHERE result_id = ?", (result_id,))
+                    self._conn.execute("DELETE FROM result_meta WHERE result_id = ?", (result_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.info("Purged %s expired results", len(expired))
+        return len(expired)
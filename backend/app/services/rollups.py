@@ -0,0 +1,265 @@
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import sqlparse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.logging import get_logger
+from ..db.base import engine
+
+logger = get_logger(__name__)
+
+SALES_COLUMNS = {"id", "date", "product", "category", "amount", "customer_age"}
+
+# Tables d'agrégats, de la plus petite à la plus grande.
+# `dims` : colonnes de sales conservées ; `expressions` : expressions sur sales
+# remplacées par une colonne de l'agrégat.
+ROLLUPS: List[Dict[str, Any]] = [
+    {
+        "name": "monthly_category",
+        "table": "sales_rollup_monthly",
+        "dims": {"category"},
+        "key": ["month", "category"],
+        "select": "strftime('%Y-%m', date) AS month, category",
+        "group_by": "strftime('%Y-%m', date), category",
+        "expressions": [
+            (re.compile(r"strftime\(\s*'%Y-%m'\s*,\s*date\s*\)", re.I), "month"),
+        ],
+    },
+    {
+        "name": "age_category",
+        "table": "sales_rollup_age",
+        "dims": {"customer_age", "category"},
+        "key": ["customer_age", "category"],
+        "select": "customer_age, category",
+        "group_by": "customer_age, category",
+        "expressions": [],
+    },
+    {
+        "name": "daily_category_product",
+        "table": "sales_rollup_daily",
+        "dims": {"date", "category", "product"},
+        "key": ["date", "category", "product"],
+        "select": "date, category, product",
+        "group_by": "date, category, product",
+        "expressions": [],
+    },
+]
+
+# Agrégats sur sales et leur équivalent sur une table d'agrégats
+AGGREGATE_REWRITES = [
+    (re.compile(r"\bCOUNT\(\s*(?:\*|1|id)\s*\)", re.I), "SUM(sale_count)"),
+    (re.compile(r"\bCOUNT\(\s*amount\s*\)", re.I), "SUM(amount_count)"),
+    (re.compile(r"\bSUM\(\s*amount\s*\)", re.I), "SUM(total_amount)"),
+    (re.compile(r"\bAVG\(\s*amount\s*\)", re.I), "(SUM(total_amount) * 1.0 / SUM(amount_count))"),
+    (re.compile(r"\bMIN\(\s*amount\s*\)", re.I), "MIN(min_amount)"),
+    (re.compile(r"\bMAX\(\s*amount\s*\)", re.I), "MAX(max_amount)"),
+]
+
+# Fonctions d'agrégat reconnues ; toute autre (TOTAL, GROUP_CONCAT...) exclut les agrégats
+_AGGREGATE_CALL_RE = re.compile(r"\b(COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(", re.I)
+
+_FROM_SALES_RE = re.compile(
+    r"\bFROM\s+[\"`]?sales[\"`]?(?:\s+(?:AS\s+)?(?!(?:WHERE|GROUP|ORDER|HAVING|LIMIT)\b)(\w+))?",
+    re.I
+)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_ALIAS_DEF_RE = re.compile(r"\bAS\s+[\"`]?\w+[\"`]?", re.I)
+_IDENTIFIER_RE = re.compile(r"\b[a-z_][a-z0-9_]*\b", re.I)
+
+def _create_tables(conn) -> None:
+    """Crée les tables d'agrégats et la table des filigranes."""
+    for rollup in ROLLUPS:
+        dims = ", ".join(rollup["key"])
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {rollup['table']} (
+                {dims},
+                total_amount REAL NOT NULL,
+                amount_count INTEGER NOT NULL,
+                sale_count INTEGER NOT NULL,
+                min_amount REAL,
+                max_amount REAL,
+                PRIMARY KEY ({dims})
+            )
+        """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            watermark INTEGER NOT NULL
+        )
+    """))
+
+def clear_rollups(conn) -> None:
+    """Vide les agrégats et leurs filigranes, dans la transaction de l'appelant.
+
+    Sans filigrane, les agrégats ne sont plus considérés à jour : les requêtes
+    repartent sur sales jusqu'au prochain rafraîchissement.
+    """
+    _create_tables(conn)
+    for rollup in ROLLUPS:
+        conn.execute(text(f"DELETE FROM {rollup['table']}"))
+    conn.execute(text("DELETE FROM rollup_state"))
+
+class RollupManager:
+    """Maintient les tables d'agrégats de `sales` et y redirige les requêtes éligibles.
+
+    Le rafraîchissement est incrémental : seules les lignes dont l'id dépasse
+    le filigrane sont agrégées puis fusionnées (upsert). La table `sales` est
+    supposée alimentée en ajout seul ; rebuild() recalcule tout sinon.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """Intègre les nouvelles lignes de sales ; retourne le nombre de lignes traitées."""
+        if engine.dialect.name != "sqlite":
+            return 0
+        with self._lock:
+            try:
+                with engine.begin() as conn:
+                    # Verrou d'écriture dès le début : deux workers ne peuvent
+                    # pas lire le même filigrane et intégrer deux fois les mêmes lignes
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                    _create_tables(conn)
+                    high = conn.execute(text("SELECT MAX(id) FROM sales")).scalar() or 0
+                    processed = 0
+                    for rollup in ROLLUPS:
+                        low = conn.execute(
+                            text("SELECT watermark FROM rollup_state WHERE name = :name"),
+                            {"name": rollup["name"]}
+                        ).scalar() or 0
+                        if low >= high:
+                            continue
+                        keys = ", ".join(rollup["key"])
+                        conn.execute(text(f"""
+                            INSERT INTO {rollup['table']}
+                                ({keys}, total_amount, amount_count, sale_count, min_amount, max_amount)
+                            SELECT {rollup['select']},
+                                   COALESCE(SUM(amount), 0), COUNT(amount), COUNT(*),
+                                   MIN(amount), MAX(amount)
+                            FROM sales
+                            WHERE id > :low AND id <= :high
+                            GROUP BY {rollup['group_by']}
+                            ON CONFLICT ({keys}) DO UPDATE SET
+                                total_amount = total_amount + excluded.total_amount,
+                                amount_count = amount_count + excluded.amount_count,
+                                sale_count = sale_count + excluded.sale_count,
+                                min_amount = MIN(COALESCE(min_amount, excluded.min_amount), COALESCE(excluded.min_amount, min_amount)),
+                                max_amount = MAX(COALESCE(max_amount, excluded.max_amount), COALESCE(excluded.max_amount, max_amount))
+                        """), {"low": low, "high": high})
+                        conn.execute(text("""
+                            INSERT INTO rollup_state (name, watermark) VALUES (:name, :high)
+                            ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark
+                        """), {"name": rollup["name"], "high": high})
+                        processed = max(processed, high - low)
+            except SQLAlchemyError as e:
+                logger.error("Rollup refresh failed: %s", e)
+                return 0
+        if processed:
+            logger.info("Rollups refreshed up to id %s (%s new rows)", high, processed)
+        return processed
+
+    def rebuild(self) -> int:
+        """Vide les agrégats et les recalcule intégralement."""
+        if engine.dialect.name != "sqlite":
+            return 0
+        with self._lock:
+            with engine.begin() as conn:
+                clear_rollups(conn)
+        return self.refresh()
+
+    def _is_fresh(self, db: Session) -> bool:
+        """Vérifie que tous les agrégats couvrent la dernière ligne de sales."""
+        try:
+            high, low, count = db.execute(text(
+                "SELECT (SELECT MAX(id) FROM sales), MIN(watermark), COUNT(*) FROM rollup_state"
+            )).one()
+        except SQLAlchemyError:
+            return False
+        return count == len(ROLLUPS) and (high or 0) <= (low or 0)
+
+    @staticmethod
+    def _aggregates_supported(sql: str) -> bool:
+        """Vérifie que chaque agrégat se calcule à partir d'une table d'agrégats.
+
+        Un agrégat ne compte qu'une ligne par combinaison de dimensions, et
+        non une ligne par vente. Seuls les agrégats de AGGREGATE_REWRITES et
+        MIN/MAX (insensibles aux répétitions) sont donc acceptés ;
+        SUM/AVG/COUNT sur une dimension donneraient un résultat faux.
+        """
+        for match in _AGGREGATE_CALL_RE.finditer(sql):
+            depth, end = 0, match.end() - 1
+            for end in range(match.end() - 1, len(sql)):
+                depth += {"(": 1, ")": -1}.get(sql[end], 0)
+                if depth == 0:
+                    break
+            call = sql[match.start():end + 1]
+            if any(pattern.fullmatch(call) for pattern, _ in AGGREGATE_REWRITES):
+                continue
+            if match.group(1).upper() not in ("MIN", "MAX"):
+                return False
+        return True
+
+    @staticmethod
+    def _prepare(sql_query: str) -> Optional[str]:
+        """Normalise la requête et vérifie qu'elle porte sur sales seule, avec agrégation."""
+        sql = sqlparse.format(sql_query, strip_comments=True).strip().rstrip(";").strip()
+        if len(re.findall(r"\bFROM\b", sql, re.I)) != 1:
+            return None
+        if re.search(r"\b(JOIN|UNION|INTERSECT|EXCEPT|WITH|DISTINCT|OVER)\b", sql, re.I):
+            return None
+        match = _FROM_SALES_RE.search(sql)
+        if not match:
+            return None
+
+        # Supprime les préfixes de table ou d'alias (s.amount -> amount)
+        for prefix in filter(None, {match.group(1), "sales"}):
+            sql = re.sub(rf"\b{re.escape(prefix)}\.", "", sql)
+        sql = _FROM_SALES_RE.sub("FROM sales", sql)
+
+        if not re.search(r"\bGROUP\s+BY\b|\b(COUNT|SUM|AVG|MIN|MAX)\s*\(", sql, re.I):
+            return None
+        if re.search(r"\bSELECT\s+\*|,\s*\*", sql, re.I):
+            return None
+        return sql
+
+    def rewrite(self, db: Session, sql_query: str) -> Tuple[str, Optional[str]]:
+        """Redirige la requête vers le plus petit agrégat capable d'y répondre.
+
+        Retourne (requête, nom de l'agrégat) ; la requête est inchangée
+        si aucun agrégat n'est éligible ou s'ils ne sont pas à jour.
+        """
+        if not settings.ROLLUPS_ENABLED or db.get_bind().dialect.name != "sqlite":
+            return sql_query, None
+
+        sql = self._prepare(sql_query)
+        if sql is None or not self._aggregates_supported(_STRING_RE.sub("''", sql)):
+            return sql_query, None
+
+        for pattern, replacement in AGGREGATE_REWRITES:
+            sql = pattern.sub(replacement, sql)
+
+        for rollup in ROLLUPS:
+            candidate = sql
+            for pattern, replacement in rollup["expressions"]:
+                candidate = pattern.sub(replacement, candidate)
+
+            # Colonnes de sales encore référencées, hors littéraux et alias de sortie
+            scanned = _ALIAS_DEF_RE.sub(" ", _STRING_RE.sub("''", candidate))
+            scanned = scanned.replace("FROM sales", "")
+            columns = {name.lower() for name in _IDENTIFIER_RE.findall(scanned)} & SALES_COLUMNS
+            if not columns <= rollup["dims"]:
+                continue
+
+            if not self._is_fresh(db):
+                logger.info("Rollups are stale, querying base table")
+                return sql_query, None
+
+            rewritten = candidate.replace("FROM sales", f"FROM {rollup['table']}", 1)
+            logger.info("Query routed to rollup %s", rollup['name'])
+            return rewritten, rollup["name"]
+
+        return sql_query, None
@@ -0,0 +1,309 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from ..core.config import settings
+from ..core.logging import get_logger
+from ..db.base import get_db_executor, read_engine
+from .rollups import ROLLUPS
+
+logger = get_logger(__name__)
+
+# Tables techniques jamais présentées au LLM
+HIDDEN_TABLES = {rollup["table"] for rollup in ROLLUPS} | {"rollup_state"}
+
+CHARS_PER_TOKEN = 4
+
+# Niveaux de détail successifs pour tenir dans le budget de tokens :
+# (valeurs fréquentes par colonne, index, statistiques)
+RENDER_LEVELS = [
+    (settings.SCHEMA_CATALOG_TOP_VALUES, True, True),
+    (3, True, True),
+    (3, False, True),
+    (0, False, True),
+    (0, False, False),
+]
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _is_temporal(type_name: str) -> bool:
+    return any(word in type_name for word in ("DATE", "TIME"))
+
+def _is_numeric(type_name: str) -> bool:
+    return any(word in type_name for word in ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC"))
+
+class SchemaCatalog:
+    """Catalogue du schéma et de statistiques de colonnes, injecté dans le prompt du LLM.
+
+    Le catalogue décrit le moteur sur lequel les requêtes sont exécutées
+    (`bind`, le moteur de lecture) : le miroir DuckDB s'il est configuré,
+    avec ses types, sinon SQLite.
+
+    Tables, colonnes, index et statistiques (cardinalités issues de
+    sqlite_stat1, bornes des dates et nombres, valeurs fréquentes des colonnes
+    catégorielles) sont introspectés puis mis en cache. Une sonde légère
+    (schema_version, MAX(rowid) par table) détecte les changements : un DDL
+    reconstruit le catalogue immédiatement, un changement de données au plus
+    toutes les SCHEMA_CATALOG_STATS_TTL secondes. Les statistiques ne sont
+    calculées que si elles sont bon marché (colonne en tête d'un index ou
+    petite table) ; sur une grande table, les valeurs fréquentes sont lues
+    sur les SCHEMA_CATALOG_SAMPLE_ROWS dernières lignes. Sur DuckDB, dont les
+    parcours de colonnes sont peu coûteux, elles sont toujours calculées
+    (cardinalité approchée au-delà de SCHEMA_CATALOG_SCAN_ROWS).
+
+    Une fois le catalogue construit, prompt_block() et fingerprint() ne
+    bloquent jamais : la sonde et la reconstruction s'exécutent dans le pool
+    des accès base pendant que le catalogue précédent reste servi.
+    """
+
+    def __init__(
+        self,
+        bind: Engine = read_engine,
+        token_budget: int = settings.SCHEMA_CATALOG_TOKEN_BUDGET,
+        check_interval: float = settings.SCHEMA_CATALOG_CHECK_INTERVAL,
+        stats_ttl: float = settings.SCHEMA_CATALOG_STATS_TTL
+    ):
+        self.bind = bind
+        self.token_budget = token_budget
+        self.check_interval = check_interval
+        self.stats_ttl = stats_ttl
+        self._lock = threading.Lock()
+        self._tables: Optional[List[Dict[str, Any]]] = None
+        self._block = ""
+        self._fingerprint = ""
+        self._schema_version: Any = None
+        self._data_marker: Any = None
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        self._refreshing = False
+        self._schedule_lock = threading.Lock()
+
+    def _is_sqlite(self) -> bool:
+        return self.bind.dialect.name == "sqlite"
+
+    def _is_columnar(self) -> bool:
+        return self.bind.dialect.name == "duckdb"
+
+    def _row_count(self, conn: Connection, table: str) -> int:
+        """Nombre de lignes : MAX(rowid) sur SQLite, COUNT(*) (lu sur les métadonnées) sur DuckDB."""
+        if self._is_sqlite():
+            return conn.execute(text(f"SELECT MAX(rowid) FROM {_quote(table)}")).scalar() or 0
+        return conn.execute(text(f"SELECT COUNT(*) FROM {_quote(table)}")).scalar() or 0
+
+    def _probe(self, conn: Connection, table_names: List[str]) -> Tuple[Any, Any]:
+        """Retourne (version du schéma, marqueur de données) sans parcourir les tables."""
+        if not self._is_sqlite() and not self._is_columnar():
+            return "static", None
+        # Miroir DuckDB : schéma fixe, remplacé en bloc par la synchronisation
+        schema_version = conn.execute(text("PRAGMA schema_version")).scalar() if self._is_sqlite() else "static"
+        marker = tuple(self._row_count(conn, name) for name in table_names)
+        return schema_version, marker
+
+    def _table_names(self, conn: Connection) -> List[str]:
+        return [
+            name for name in sorted(inspect(conn).get_table_names())
+            if name not in HIDDEN_TABLES and not name.startswith("sqlite_")
+        ]
+
+    def _stat1(self, conn: Connection) -> Dict[str, int]:
+        """Nombre de valeurs distinctes de la colonne de tête de chaque index (sqlite_stat1)."""
+        try:
+            rows = conn.execute(text("SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL")).fetchall()
+        except SQLAlchemyError:
+            return {}
+        distinct = {}
+        for index_name, stat in rows:
+            parts = stat.split()
+            if len(parts) >= 2 and int(parts[1]) > 0:
+                distinct[index_name] = max(1, round(int(parts[0]) / int(parts[1])))
+        return distinct
+
+    def _column_stats(
+        self,
+        conn: Connection,
+        table: str,
+        column: Dict[str, Any],
+        rows: Optional[int],
+        distinct: Optional[int]
+    ) -> Dict[str, Any]:
+        """Statistiques d'une colonne : cardinalité, bornes, valeurs fréquentes."""
+        name = _quote(column["name"])
+        quoted_table = _quote(table)
+        stats: Dict[str, Any] = {}
+        if distinct is None and (rows or 0) <= settings.SCHEMA_CATALOG_SCAN_ROWS:
+            distinct = conn.execute(text(f"SELECT COUNT(DISTINCT {name}) FROM {quoted_table}")).scalar()
+        elif distinct is None and self._is_columnar():
+            distinct = conn.execute(text(f"SELECT approx_count_distinct({name}) FROM {quoted_table}")).scalar()
+        if distinct is not None:
+            stats["distinct"] = distinct
+
+        type_name = column["type"]
+        if _is_temporal(type_name) or _is_numeric(type_name):
+            low, high = conn.execute(text(f"SELECT MIN({name}), MAX({name}) FROM {quoted_table}")).one()
+            if low is not None:
+                stats["range"] = [str(low), str(high)]
+        elif distinct is not None and distinct <= settings.SCHEMA_CATALOG_MAX_ENUM:
+            params = {"limit": settings.SCHEMA_CATALOG_TOP_VALUES}
+            source, sample = quoted_table, ""
+            if self._is_sqlite() and (rows or 0) > settings.SCHEMA_CATALOG_SAMPLE_ROWS:
+                # Échantillon borné des lignes récentes : plage de rowid, sans parcourir l'index
+                source = f"{quoted_table} NOT INDEXED"
+                sample = " AND rowid > :min_rowid"
+                params["min_rowid"] = rows - settings.SCHEMA_CATALOG_SAMPLE_ROWS
+            values = conn.execute(text(
+                f"SELECT {name} FROM {source} WHERE {name} IS NOT NULL{sample} "
+                f"GROUP BY {name} ORDER BY COUNT(*) DESC LIMIT :limit"
+            ), params).scalars().all()
+            stats["top_values"] = [str(value) for value in values]
+        return stats
+
+    def _introspect(self, conn: Connection, table_names: List[str]) -> List[Dict[str, Any]]:
+        inspector = inspect(conn)
+        stat1 = self._stat1(conn) if self._is_sqlite() else {}
+        tables = []
+        for table in table_names:
+            primary_key = set(inspector.get_pk_constraint(table).get("constrained_columns") or [])
+            # Le miroir DuckDB n'a pas d'index secondaire (et duckdb_engine ne les reflète pas)
+            indexes = [] if self._is_columnar() else [
+                {"name": index["name"], "columns": [c for c in index["column_names"] if c]}
+                for index in inspector.get_indexes(table)
+            ]
+            rows = None
+            if self._is_sqlite() or self._is_columnar():
+                rows = self._row_count(conn, table)
+
+            # Colonnes en tête d'un index : bornes et groupements lus sur l'index
+            leading = {}
+            for index in indexes:
+                if index["columns"]:
+                    leading.setdefault(index["columns"][0], stat1.get(index["name"]))
+
+            columns = []
+            for column in inspector.get_columns(table):
+                info = {"name": column["name"], "type": str(column["type"]).upper()}
+                if column["name"] in primary_key:
+                    info["primary_key"] = True
+                elif self._is_columnar() or (self._is_sqlite() and (
+                    column["name"] in leading or (rows or 0) <= settings.SCHEMA_CATALOG_SCAN_ROWS
+                )):
+                    info["stats"] = self._column_stats(conn, table, info, rows, leading.get(column["name"]))
+                columns.append(info)
+
+            tables.append({"name": table, "rows": rows, "columns": columns, "indexes": indexes})
+        return tables
+
+    def _render(self, top_values: int, with_indexes: bool, with_stats: bool) -> str:
+        lines = []
+        for table in self._tables or []:
+            size = f" (~{table['rows']} rows)" if table["rows"] is not None else ""
+            lines.append(f"Table {table['name']}{size}:")
+            for column in table["columns"]:
+                line = f"  {column['name']} {column['type']}"
+                if column.get("primary_key"):
+                    line += " PRIMARY KEY"
+                stats = column.get("stats") or {}
+                if with_stats and "range" in stats:
+                    line += f" [{stats['range'][0]} .. {stats['range'][1]}]"
+                if with_stats and "distinct" in stats:
+                    line += f" ~{stats['distinct']} distinct"
+                if top_values and stats.get("top_values"):
+                    shown = stats["top_values"][:top_values]
+                    more = ", ..." if len(stats["top_values"]) > top_values or stats.get("distinct", 0) > len(shown) else ""
+                    line += " values: " + ", ".join(f"'{value}'" for value in shown) + more
+                lines.append(line)
+            if with_indexes and table["indexes"]:
+                lines.append("  indexes: " + ", ".join(
+                    f"{index['name']}({', '.join(index['columns'])})" for index in table["indexes"]
+                ))
+        return "\n".join(lines)
+
+    def _render_within_budget(self) -> str:
+        """Rend le catalogue au niveau de détail le plus élevé qui tient dans le budget."""
+        budget_chars = self.token_budget * CHARS_PER_TOKEN
+        block = ""
+        for level in RENDER_LEVELS:
+            block = self._render(*level)
+            if len(block) <= budget_chars:
+                return block
+        # Même réduit aux colonnes, le schéma dépasse : tronqué à la dernière ligne complète
+        return block[:budget_chars].rsplit("\n", 1)[0]
+
+    def _structure_fingerprint(self) -> str:
+        structure = [
+            [table["name"], [(c["name"], c["type"]) for c in table["columns"]],
+             [(i["name"], i["columns"]) for i in table["indexes"]]]
+            for table in self._tables or []
+        ]
+        return hashlib.sha256(json.dumps(structure).encode("utf-8")).hexdigest()[:16]
+
+    def refresh(self, force: bool = False) -> None:
+        """Vérifie la sonde et reconstruit le catalogue si nécessaire."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._tables is not None and now - self._checked_at < self.check_interval:
+                return
+            try:
+                with self.bind.connect() as conn:
+                    table_names = self._table_names(conn)
+                    schema_version, data_marker = self._probe(conn, table_names)
+                    stale_data = data_marker != self._data_marker and now - self._built_at >= self.stats_ttl
+                    if force or self._tables is None or schema_version != self._schema_version or stale_data:
+                        started = time.perf_counter()
+                        self._tables = self._introspect(conn, table_names)
+                        self._block = self._render_within_budget()
+                        self._fingerprint = self._structure_fingerprint()
+                        self._data_marker = data_marker
+                        self._built_at = now
+                        logger.info(
+                            "Schema catalog rebuilt in %.2fs (%s chars)",
+                            time.perf_counter() - started, len(self._block)
+                        )
+                    self._schema_version = schema_version
+            except SQLAlchemyError as e:
+                logger.error("Schema catalog refresh failed: %s", e)
+            self._checked_at = now
+
+    @property
+    def ready(self) -> bool:
+        return self._tables is not None
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _schedule_refresh(self) -> None:
+        """Lance la vérification dans le pool des accès base si elle est due (une seule à la fois).
+
+        Seule la première construction se fait dans l'appelant.
+        """
+        if not self.ready:
+            self.refresh()
+            return
+        if self._refreshing or time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._schedule_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        try:
+            get_db_executor().submit(self._refresh_in_background)
+        except RuntimeError:
+            # Pool arrêté (fin de l'application) : le catalogue courant reste servi
+            self._refreshing = False
+
+    def prompt_block(self) -> str:
+        """Description compacte du schéma pour le prompt système."""
+        self._schedule_refresh()
+        return self._block
+
+    def fingerprint(self) -> str:
+        """Empreinte de la structure (tables, colonnes, index), indépendante des données."""
+        self._schedule_refresh()
+        return self._fingerprint
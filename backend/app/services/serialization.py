@@ -0,0 +1,102 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence
+from ..core.logging import get_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # dépendance optionnelle
+    pa = None
+    pa_ipc = None
+
+logger = get_logger(__name__)
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNAR_MEDIA_TYPE = "application/vnd.columnar+json"
+ARROW_METADATA_KEY = b"query_metadata"
+
+FORMAT_JSON = "json"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_ARROW = "arrow"
+
+def negotiate_format(format_param: Optional[str], accept: Optional[str]) -> str:
+    """Choisit le format de réponse à partir du paramètre `format` ou de l'en-tête Accept.
+
+    Arrow retombe sur le JSON colonnaire si pyarrow n'est pas installé.
+    """
+    requested = (format_param or "").lower()
+    if not requested and accept:
+        if ARROW_MEDIA_TYPE in accept:
+            requested = FORMAT_ARROW
+        elif COLUMNAR_MEDIA_TYPE in accept:
+            requested = FORMAT_COLUMNAR
+
+    if requested == FORMAT_ARROW:
+        if pa is None:
+            logger.warning("pyarrow is not installed, falling back to columnar JSON")
+            return FORMAT_COLUMNAR
+        return FORMAT_ARROW
+    if requested == FORMAT_COLUMNAR:
+        return FORMAT_COLUMNAR
+    return FORMAT_JSON
+
+def unique_column_names(columns: Sequence[str]) -> List[str]:
+    """Rend les noms de colonnes uniques (`SELECT a.id, b.id` -> id, id_2), dans l'ordre."""
+    seen = set(columns)
+    if len(seen) == len(columns):
+        return list(columns)
+    names: List[str] = []
+    used = set()
+    for name in columns:
+        candidate, suffix = name, 2
+        # Un suffixe ne reprend pas le nom d'une autre colonne du résultat
+        while candidate in used or (candidate != name and candidate in seen):
+            candidate = f"{name}_{suffix}"
+            suffix += 1
+        used.add(candidate)
+        names.append(candidate)
+    return names
+
+def to_columns(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> Dict[str, List[Any]]:
+    """Transpose des lignes en colonnes, indexées par des noms rendus uniques."""
+    names = unique_column_names(columns)
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*rows))}
+
+def to_columnar_json(
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    metadata: Dict[str, Any]
+) -> bytes:
+    """Sérialise le résultat en JSON orienté colonnes (noms de colonnes émis une seule fois)."""
+    payload = dict(metadata)
+    payload["columns"] = unique_column_names(columns)
+    payload["data"] = to_columns(columns, rows)
+    return json.dumps(payload, default=str).encode("utf-8")
+
+def _to_arrow_array(values: List[Any]):
+    """Construit une colonne Arrow, en texte si les types sont hétérogènes."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+def to_arrow_ipc(
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    metadata: Dict[str, Any]
+) -> bytes:
+    """Sérialise le résultat en flux Arrow IPC ; les métadonnées vont dans le schéma."""
+    names = unique_column_names(columns)
+    data = to_columns(columns, rows)
+    arrays = [_to_arrow_array(data[name]) for name in names]
+    table = pa.Table.from_arrays(arrays, names=names)
+    table = table.replace_schema_metadata({
+        ARROW_METADATA_KEY: json.dumps(metadata, default=str).encode("utf-8")
+    })
+
+    sink = pa.BufferOutputStream()
+    with pa_ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+class _Call:
+    """Appel partagé : la tâche en cours et le nombre d'appelants qui l'attendent."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Regroupe les appels concurrents portant sur la même clé.
+
+    Le premier appelant lance la coroutine dans une tâche ; les suivants
+    attendent le même résultat (ou la même exception). La tâche n'est
+    annulée que lorsque tous les appelants ont abandonné.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Exécute func une seule fois par clé parmi les appels simultanés."""
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(func())
+            call = _Call(task)
+            self._calls[key] = call
+            task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call) -> None:
+        """Retire l'appel terminé du registre."""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def inflight(self) -> int:
+        """Nombre de clés en cours d'exécution."""
+        return len(self._calls)
@@ -0,0 +1,210 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any
+from ..core.config import settings
+from ..core.logging import get_logger
+
+logger = get_logger(__name__)
+
+class SQLQueryCache:
+    """Cache prompt -> SQL persistant (SQLite) avec éviction LRU/TTL.
+
+    Une couche mémoire LRU évite l'aller-retour disque pour les prompts chauds ;
+    la table SQLite permet au cache de survivre aux redémarrages. Les accès
+    servis par la mémoire sont reportés par lots dans `last_access`, sans quoi
+    l'éviction partagée traiterait comme froides les entrées chaudes d'un worker.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.SQL_CACHE_PATH,
+        max_entries: int = settings.SQL_CACHE_MAX_ENTRIES,
+        ttl: int = settings.SQL_CACHE_TTL,
+        access_flush_interval: float = settings.SQL_CACHE_ACCESS_FLUSH_INTERVAL
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.access_flush_interval = access_flush_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending_access: Dict[str, float] = {}
+        self._last_access_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Ouvre la base du cache et crée la table si nécessaire."""
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sql_cache (
+                cache_key TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                schema_fingerprint TEXT NOT NULL,
+                sql_query TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sql_cache_access ON sql_cache(last_access)")
+        return conn
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """Normalise le prompt (casse, espaces, ponctuation finale)."""
+        normalized = re.sub(r"\s+", " ", prompt.strip().lower())
+        return normalized.rstrip(" ?!.")
+
+    def make_key(self, prompt: str, schema_fingerprint: str) -> str:
+        """Construit la clé de cache à partir du prompt normalisé et de l'empreinte du schéma."""
+        raw = f"{schema_fingerprint}\x00{self.normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, prompt: str, schema_fingerprint: str) -> Optional[str]:
+        """Retourne la requête SQL en cache ou None."""
+        key = self.make_key(prompt, schema_fingerprint)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                sql_query, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._pending_access[key] = now
+                    if time.monotonic() - self._last_access_flush >= self.access_flush_interval:
+                        self._flush_access()
+                    self.hits += 1
+                    return sql_query
+                del self._memory[key]
+
+            try:
+                row = self._conn.execute(
+                    "SELECT sql_query, created_at FROM sql_cache WHERE cache_key = ?",
+                    (key,)
+                ).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    self._conn.execute("DELETE FROM sql_cache WHERE cache_key = ?", (key,))
+                    self.evictions += 1
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    return None
+                self._conn.execute(
+                    "UPDATE sql_cache SET last_access = MAX(last_access, ?) WHERE cache_key = ?",
+                    (now, key)
+                )
+            except sqlite3.Error as e:
+                logger.error("SQL cache read failed: %s", e)
+                self.misses += 1
+                return None
+
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+    def set(self, prompt: str, schema_fingerprint: str, sql_query: str) -> None:
+        """Enregistre une requête SQL validée."""
+        key = self.make_key(prompt, schema_fingerprint)
+        now = time.time()
+
+        with self._lock:
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO sql_cache
+                        (cache_key, prompt, schema_fingerprint, sql_query, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(cache_key) DO UPDATE SET
+                        sql_query = excluded.sql_query,
+                        created_at = excluded.created_at,
+                        last_access = excluded.last_access
+                    """,
+                    (key, self.normalize_prompt(prompt), schema_fingerprint, sql_query, now, now)
+                )
+                # L'éviction doit voir les accès récents servis par la mémoire
+                self._flush_access()
+                self._evict()
+            except sqlite3.Error as e:
+                logger.error("SQL cache write failed: %s", e)
+            self._remember(key, sql_query, now)
+
+    def _remember(self, key: str, sql_query: str, created_at: float) -> None:
+        """Ajoute l'entrée à la couche mémoire LRU (appelé sous verrou)."""
+        self._memory[key] = (sql_query, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_access(self) -> None:
+        """Reporte en base les accès servis par la couche mémoire (appelé sous verrou)."""
+        self._last_access_flush = time.monotonic()
+        if not self._pending_access:
+            return
+        pending = list(self._pending_access.items())
+        self._pending_access.clear()
+        try:
+            # Une seule transaction pour tout le lot
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE sql_cache SET last_access = MAX(last_access, ?) WHERE cache_key = ?",
+                    [(accessed_at, key) for key, accessed_at in pending]
+                )
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error("SQL cache access flush failed: %s", e)
+
+    def _evict(self) -> None:
+        """Supprime les entrées expirées puis les moins récemment utilisées (appelé sous verrou)."""
+        expired = self._conn.execute(
+            "DELETE FROM sql_cache WHERE created_at < ?",
+            (time.time() - self.ttl,)
+        ).rowcount
+        overflow = self._conn.execute(
+            """
+            DELETE FROM sql_cache WHERE cache_key IN (
+                SELECT cache_key FROM sql_cache
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        ).rowcount
+        self.evictions += max(expired, 0) + max(overflow, 0)
+
+    def clear(self) -> None:
+        """Vide le cache."""
+        with self._lock:
+            self._memory.clear()
+            self._pending_access.clear()
+            self._conn.execute("DELETE FROM sql_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs du cache."""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": size,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl
+            }
@@ -0,0 +1,112 @@
+import hashlib
+from typing import Any, Dict, List, NamedTuple
+import sqlparse
+from sqlparse import tokens as T
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+PARAM_PREFIX = "lit_"
+
+# Mots-clés après lesquels un littéral est une valeur de filtre ou de pagination
+_VALUE_KEYWORDS = {"LIKE", "GLOB", "ILIKE", "LIMIT", "OFFSET", "BETWEEN"}
+
+class SQLTemplate(NamedTuple):
+    """Requête dont les littéraux de filtre sont remplacés par des paramètres nommés."""
+    text: str
+    params: Dict[str, Any]
+    fingerprint: str
+
+def _literal_value(ttype, value: str) -> Any:
+    if ttype in T.Literal.String.Single:
+        return value[1:-1].replace("''", "'")
+    if ttype in T.Literal.Number.Integer:
+        return int(value)
+    return float(value)
+
+def _is_literal(ttype) -> bool:
+    return ttype in T.Literal.String.Single or (
+        ttype in T.Literal.Number and ttype not in T.Literal.Number.Hex
+    )
+
+def parameterize(sql_query: str) -> SQLTemplate:
+    """Sépare une requête en gabarit et paramètres.
+
+    Seuls les littéraux comparés à une colonne (=, <, LIKE, BETWEEN, IN (...))
+    et les valeurs de LIMIT/OFFSET deviennent des paramètres : les littéraux
+    de projection, de GROUP BY ou d'ORDER BY (formats de date, positions de
+    colonnes) changent le sens de la requête et restent dans le gabarit.
+    Les commentaires sont supprimés et les espaces normalisés, si bien que
+    « ventes de janvier » et « ventes de février » partagent le même gabarit.
+    """
+    parts: List[str] = []
+    params: Dict[str, Any] = {}
+    names: Dict[tuple, str] = {}
+    previous = None  # dernier token significatif (ttype, valeur en majuscules)
+    between_pending = False
+    # Pile des parenthèses : True si la parenthèse ouvre une liste IN (...)
+    paren_stack: List[bool] = []
+    in_list_start = False
+
+    for ttype, value in sqlparse.lexer.tokenize(sql_query.strip().rstrip(";")):
+        if ttype in T.Comment or ttype in T.Whitespace or ttype in T.Newline:
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+            continue
+
+        upper = value.upper()
+        if ttype in T.Punctuation and value == "(":
+            paren_stack.append(previous is not None and previous[1] == "IN")
+            in_list_start = paren_stack[-1]
+        elif ttype in T.Punctuation and value == ")":
+            if paren_stack:
+                paren_stack.pop()
+            in_list_start = False
+        else:
+            if in_list_start and ttype in T.Keyword.DML:
+                # IN (SELECT ...) : sous-requête, pas une liste de valeurs
+                paren_stack[-1] = False
+            in_list_start = False
+
+        bind = False
+        if _is_literal(ttype) and previous is not None:
+            prev_type, prev_value = previous
+            if prev_type in T.Operator.Comparison or prev_value in _VALUE_KEYWORDS:
+                bind = True
+            elif prev_value == "AND" and between_pending:
+                bind = True
+                between_pending = False
+            elif paren_stack and paren_stack[-1] and prev_value in ("(", ","):
+                bind = True
+
+        if bind:
+            # Une même valeur réutilise le même paramètre : une expression répétée
+            # (SELECT ... GROUP BY CASE WHEN amount > 100 ...) reste identique
+            literal = _literal_value(ttype, value)
+            key = (type(literal), literal)
+            if key not in names:
+                names[key] = f"{PARAM_PREFIX}{len(params)}"
+                params[names[key]] = literal
+            parts.append(f":{names[key]}")
+        else:
+            if ttype in T.Literal.String.Single:
+                # Gabarit destiné à sqlalchemy.text() : ':' échappé hors paramètres ('%H:%M')
+                value = value.replace(":", "\\:")
+            # La casse est conservée : elle détermine les noms de colonnes du résultat
+            parts.append(value)
+
+        if upper == "BETWEEN":
+            between_pending = True
+        previous = (ttype, upper)
+
+    text = "".join(parts).strip()
+    fingerprint = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return SQLTemplate(text, params, fingerprint)
+
+def execute_template(db: Session, sql_query: str):
+    """Exécute la requête sous forme de gabarit paramétré.
+
+    Le texte du gabarit ne varie pas avec les littéraux : l'instruction déjà
+    compilée est reprise du cache d'instructions du pilote (cached_statements).
+    """
+    template = parameterize(sql_query)
+    return db.execute(text(template.text), template.params)
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import asyncio
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from backend.app.core.config import settings
+from backend.app.core.logging import setup_logging
+from backend.app.core.metrics import registry
+from backend.app.services.inference import LocalClassifier
+
+# Serveur d'inférence partagé : un seul processus charge le classifieur, les
+# workers de l'API l'interrogent (INFERENCE_SERVER_URL). À lancer avec un
+# seul worker, par exemple :
+#   uvicorn backend.inference_main:app --uds /tmp/lm_inference.sock
+
+setup_logging()
+
+app = FastAPI(title=f"{settings.PROJECT_NAME} inference", version=settings.VERSION)
+
+classifier = LocalClassifier()
+# Un seul thread d'inférence : le pipeline n'est pas partagé entre threads
+inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+class ClassifyRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=64)
+
+class ClassifyResponse(BaseModel):
+    labels: List[Optional[str]]
+
+@app.post("/classify", response_model=ClassifyResponse)
+async def classify(request: ClassifyRequest):
+    loop = asyncio.get_running_loop()
+    labels = await loop.run_in_executor(inference_executor, classifier.classify, request.texts)
+    return ClassifyResponse(labels=labels)
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def startup_event():
+    # Chargé avant d'accepter des requêtes : le premier appel ne paie pas le chargement
+    await asyncio.get_running_loop().run_in_executor(inference_executor, classifier.load)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    inference_executor.shutdown(wait=False, cancel_futures=True)
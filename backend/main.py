@@ -1,14 +1,21 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from backend.app.core.config import settings
-from backend.app.core.logging import setup_logging
+from backend.app.core.logging import get_logger, setup_logging
 from backend.app.api.v1.api import api_router
-from backend.app.db.base import init_db
-from fastapi.responses import JSONResponse
+from backend.app.core.middleware import CatchExceptionsMiddleware, TimingMiddleware
+from backend.app.db.base import init_db, shutdown_db_executor
+from backend.app.api.v1.endpoints.query import rollup_manager
+from backend.app.services.columnar_sync import ColumnarMirror
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from backend.app.core.metrics import registry
+import asyncio
 import os
 
 # Configuration du logging
 setup_logging()
+logger = get_logger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -26,23 +33,58 @@ app.add_middleware(
 )
 
 # Middleware d'exception globale
-@app.middleware("http")
-async def catch_exceptions_middleware(request: Request, call_next):
-    try:
-        return await call_next(request)
-    except Exception as exc:
-        return JSONResponse(
-            status_code=500,
-            content={"detail": f"Erreur interne du serveur: {str(exc)}"}
-        )
+app.add_middleware(CatchExceptionsMiddleware)
+
+# Mesure des requêtes : métriques par route et en-tête Server-Timing par étape
+app.add_middleware(TimingMiddleware)
+
+columnar_mirror = ColumnarMirror()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métriques du processus au format texte Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 # Inclusion des routes
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+async def _run_periodically(fn, interval: float, initial_delay: float = 0) -> None:
+    """Exécute régulièrement `fn` dans le pool de threads.
+
+    Une erreur ponctuelle est journalisée sans arrêter les exécutions suivantes.
+    """
+    await asyncio.sleep(initial_delay)
+    while True:
+        try:
+            await run_in_threadpool(fn)
+        except Exception:
+            logger.exception("Periodic task %s failed", getattr(fn, "__qualname__", fn))
+        await asyncio.sleep(interval)
+
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    if settings.ROLLUPS_ENABLED:
+        # Intègre régulièrement les nouvelles ventes dans les tables d'agrégats
+        app.state.rollup_task = asyncio.create_task(
+            _run_periodically(rollup_manager.refresh, settings.ROLLUP_REFRESH_INTERVAL)
+        )
+    if columnar_mirror.enabled:
+        # Première copie avant d'accepter des requêtes : le miroir doit exister
+        await run_in_threadpool(columnar_mirror.sync, wait=True)
+        # La copie initiale vient d'être faite : première resynchronisation après un intervalle
+        app.state.columnar_task = asyncio.create_task(_run_periodically(
+            columnar_mirror.sync, settings.ANALYTICS_SYNC_INTERVAL,
+            initial_delay=settings.ANALYTICS_SYNC_INTERVAL
+        ))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Les requêtes encore en file ne seront plus servies ; un nouveau cycle
+    # de vie (client de test) recrée le pool
+    shutdown_db_executor()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # Logging déjà configuré à l'import (setup_logging) : uvicorn n'y touche pas
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None) 
\ No newline at end of file
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Configuration minimale avant l'import de backend.app (lue à l'import) :
+# toutes les bases et les logs vont dans un répertoire temporaire
+_tmp = tempfile.mkdtemp(prefix="lm_tests_")
+os.environ.setdefault("MISTRAL_API_KEY", "test-mistral-key")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'analytics.db')}")
+os.environ.setdefault("RATE_LIMIT_DB_PATH", os.path.join(_tmp, "rate_limits.db"))
+os.environ.setdefault("SQL_CACHE_PATH", os.path.join(_tmp, "sql_cache.db"))
+os.environ.setdefault("PROMPT_INDEX_PATH", os.path.join(_tmp, "prompt_index.db"))
+os.environ.setdefault("RESULT_STORE_PATH", os.path.join(_tmp, "results.db"))
+os.environ.setdefault("LOG_FILE", os.path.join(_tmp, "logs", "app.log"))
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+import pytest
+from backend.app.services.ai_service import AIService
+
+@pytest.fixture
+def service(monkeypatch):
+    service = AIService()
+    monkeypatch.setattr(service.schema_catalog, "fingerprint", lambda: "fp")
+    monkeypatch.setattr(type(service.schema_catalog), "ready", property(lambda self: True))
+    return service
+
+def test_cache_lookup_runs_off_the_event_loop(service, monkeypatch):
+    threads = []
+
+    def get(prompt, fingerprint):
+        threads.append(threading.current_thread())
+        return "SELECT 1"
+
+    monkeypatch.setattr(service.sql_cache, "get", get)
+    assert asyncio.run(service.agenerate_sql_query("ventes par produit")) == "SELECT 1"
+    assert threads and threads[0] is not threading.main_thread()
+
+@pytest.mark.parametrize("error", [asyncio.TimeoutError, asyncio.CancelledError])
+def test_timeouts_and_cancellation_are_not_wrapped(service, monkeypatch, error):
+    async def call_llm(*args):
+        raise error()
+
+    monkeypatch.setattr(service.sql_cache, "get", lambda prompt, fingerprint: None)
+    monkeypatch.setattr(service.prompt_index, "match", lambda prompt, fingerprint: (None, []))
+    monkeypatch.setattr(service, "_acall_llm", call_llm)
+    with pytest.raises(error):
+        asyncio.run(service.agenerate_sql_query("ventes par catégorie"))
+
+def test_other_errors_are_wrapped(service, monkeypatch):
+    async def call_llm(*args):
+        raise ConnectionError("LLM unavailable")
+
+    monkeypatch.setattr(service.sql_cache, "get", lambda prompt, fingerprint: None)
+    monkeypatch.setattr(service.prompt_index, "match", lambda prompt, fingerprint: (None, []))
+    monkeypatch.setattr(service, "_acall_llm", call_llm)
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.agenerate_sql_query("ventes par mois"))
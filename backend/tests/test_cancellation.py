@@ -0,0 +1,147 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from backend.app.api.v1.endpoints import query
+from backend.app.db.base import engine, read_engine
+from backend.main import app
+
+# Produit cartésien de 8e9 lignes : ne se termine pas de lui-même pendant le test
+SLOW_SQL = "SELECT COUNT(*) FROM sales a, sales b, sales c WHERE a.amount > b.amount"
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+@contextmanager
+def _running_server():
+    """Démarre l'application sous uvicorn dans un thread ; retourne le port."""
+    port = _free_port()
+    uvicorn_server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=uvicorn_server.run, daemon=True)
+    thread.start()
+    assert _wait_for(lambda: uvicorn_server.started, 10)
+    try:
+        yield port
+    finally:
+        uvicorn_server.should_exit = True
+        thread.join(10)
+
+@pytest.fixture
+def server(monkeypatch):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS sales (id INTEGER PRIMARY KEY, date DATE, product TEXT, "
+            "category TEXT, amount REAL, customer_age INTEGER)"
+        )
+        conn.exec_driver_sql("DELETE FROM sales")
+        conn.exec_driver_sql(
+            "INSERT INTO sales (date, product, category, amount, customer_age) VALUES (?, ?, ?, ?, ?)",
+            [("2024-01-01", f"p{i % 7}", f"c{i % 3}", float(i), 20 + i % 50) for i in range(2000)]
+        )
+
+    async def generate_sql(prompt):
+        return SLOW_SQL
+
+    monkeypatch.setattr(query.ai_service, "agenerate_sql_query", generate_sql)
+    monkeypatch.setattr(query.settings, "SQL_PLAN_GUARD_ENABLED", False)
+    monkeypatch.setattr(query.settings, "ROLLUPS_ENABLED", False)
+    monkeypatch.setattr(query.settings, "SQL_STATEMENT_TIMEOUT", 60.0)
+
+    started = threading.Event()
+    errors = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if "sales c" in statement:
+            started.set()
+
+    def on_error(context):
+        errors.append(str(context.original_exception))
+
+    event.listen(read_engine, "before_cursor_execute", on_execute)
+    event.listen(read_engine, "handle_error", on_error)
+
+    try:
+        with _running_server() as port:
+            yield port, started, errors
+    finally:
+        event.remove(read_engine, "before_cursor_execute", on_execute)
+        event.remove(read_engine, "handle_error", on_error)
+
+def test_client_disconnect_interrupts_statement(server):
+    port, started, errors = server
+    body = json.dumps({"prompt": "ventes par produit"}).encode("utf-8")
+    client = socket.create_connection(("127.0.0.1", port))
+    client.sendall(
+        b"POST /api/v1/query/query HTTP/1.1\r\nHost: test\r\n"
+        b"Content-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii")
+        + body
+    )
+    assert started.wait(10), "statement never started"
+
+    client.close()
+    dropped = time.monotonic()
+
+    # Détection (DISCONNECT_POLL_INTERVAL) puis interruption de l'instruction
+    assert _wait_for(lambda: errors, 5), "statement still running after the client left"
+    assert "interrupted" in errors[0]
+    assert time.monotonic() - dropped < 5
+
+def test_app_can_start_twice():
+    # Un second cycle de vie (client de test) recrée le pool des accès base
+    for _ in range(2):
+        with TestClient(app) as client:
+            assert client.get("/api/v1/query/health").status_code == 200
+
+@pytest.fixture
+def slow_llm(monkeypatch):
+    cancelled = []
+
+    async def generate_sql(prompt):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(prompt)
+            raise
+        return "SELECT 1"
+
+    monkeypatch.setattr(query.ai_service, "agenerate_sql_query", generate_sql)
+    return cancelled
+
+@pytest.mark.parametrize("path, payload", [
+    ("/api/v1/query/query", {"prompt": "ventes par produit"}),
+    ("/api/v1/query/query/batch", {"prompts": ["ventes par produit", "ventes par mois"]}),
+])
+def test_deadline_during_llm_call_returns_504(slow_llm, path, payload):
+    with _running_server() as port:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        started = time.monotonic()
+        connection.request(
+            "POST", path, body=json.dumps(payload),
+            headers={"Content-Type": "application/json", "X-Request-Timeout": "1"}
+        )
+        response = connection.getresponse()
+        body = json.loads(response.read())
+        connection.close()
+    assert response.status == 504, body
+    assert body["detail"] == "Request deadline exceeded"
+    # L'appel au LLM est annulé, pas attendu jusqu'au bout
+    assert slow_llm
+    assert time.monotonic() - started < 4
@@ -0,0 +1,25 @@
+import pytest
+from backend.app.services.chart_recommender import recommend_chart
+
+MONTHLY = (["month", "total"], [[f"2024-{m:02d}-01", 100.0 * m] for m in range(1, 13)])
+BY_CATEGORY = (["category", "total"], [["a", 10.0], ["b", 20.0], ["c", 5.0]])
+
+def test_keywords_do_not_override_data_shape():
+    # Une série temporelle reste une ligne, même si le prompt évoque une répartition
+    assert recommend_chart(*MONTHLY, prompt="répartition des ventes par mois") == "line"
+    assert recommend_chart(*MONTHLY, prompt="pourcentage par mois", hint="pie") == "line"
+
+def test_keywords_break_ties():
+    assert recommend_chart(*BY_CATEGORY) == "bar"
+    # bar (2) > pie (1) : le mot-clé ne renverse pas l'écart structurel
+    assert recommend_chart(*BY_CATEGORY, prompt="proportion par catégorie") == "bar"
+    assert recommend_chart(["x"], [], prompt="proportion des ventes") == "pie"
+
+@pytest.mark.parametrize("values", [
+    [f"2024-01-{d:02d}" for d in range(1, 29)],
+    [f"{d:02d}/01/2024" for d in range(1, 29)],
+    ["2024-01-01", "05/01/2024", "Jan 3 2024", "2024-01-04T10:00:00"] * 5,
+])
+def test_temporal_columns_are_detected(values):
+    rows = [[value, float(i)] for i, value in enumerate(values)]
+    assert recommend_chart(["date", "total"], rows) == "line"
@@ -0,0 +1,19 @@
+from backend.app.services.chart_reduction import OTHER_LABEL, reduce_for_chart
+
+def test_categorical_histogram_keeps_bars():
+    rows = [[f"p{i % 30}", f"c{i % 3}"] for i in range(3000)] + [["p0", "c0"]] * 50
+    columns, reduced, reduction = reduce_for_chart(["product", "category"], rows, "histogram", 20)
+
+    # Barres par catégorie, sans bascule vers le camembert ni regroupement « Autres »
+    assert reduction["method"] == "top_bars"
+    assert columns == ["product", "count"]
+    assert len(reduced) == 20
+    assert reduced[0] == ["p0", 150]
+    assert OTHER_LABEL not in [label for label, _ in reduced]
+    assert reduction["omitted_categories"] == 10
+
+def test_numeric_histogram_is_binned():
+    rows = [[float(i)] for i in range(1000)]
+    columns, reduced, reduction = reduce_for_chart(["amount"], rows, "histogram", 50)
+    assert reduction["method"] == "bins"
+    assert sum(count for _, _, count in reduced) == 1000
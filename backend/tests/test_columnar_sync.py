@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import create_engine
+from backend.app.db.base import _create_columnar_engine
+from backend.app.services import columnar_sync
+from backend.app.services.schema_catalog import SchemaCatalog
+
+def _insert(engine, count, start=0):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO sales (date, product, category, amount, customer_age) VALUES (?, ?, ?, ?, ?)",
+            [("2024-01-%02d" % (1 + i % 28), f"p{i % 7}", f"c{i % 3}", float(i), 20 + i % 50)
+             for i in range(start, start + count)]
+        )
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    source = create_engine(f"sqlite:///{tmp_path / 'sales.db'}")
+    with source.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE sales (id INTEGER PRIMARY KEY, date DATE, product TEXT, "
+            "category TEXT, amount REAL, customer_age INTEGER)"
+        )
+    _insert(source, 1000)
+    path = str(tmp_path / "analytics.duckdb")
+    columnar = _create_columnar_engine(f"duckdb:///{path}")
+    monkeypatch.setattr(columnar_sync, "engine", source)
+    monkeypatch.setattr(columnar_sync, "read_engine", columnar)
+    yield columnar_sync.ColumnarMirror(path), source, columnar
+    columnar.dispose()
+    source.dispose()
+
+def _mirror_rows(columnar):
+    with columnar.connect() as conn:
+        return conn.exec_driver_sql("SELECT COUNT(*), SUM(amount) FROM sales").one()
+
+def test_appends_only_new_rows(mirror):
+    mirror, source, columnar = mirror
+    assert mirror.sync(wait=True) == 1000
+    assert mirror.sync() == 0
+
+    _insert(source, 250, start=1000)
+    # Seules les lignes au-delà du plus grand id du miroir sont copiées
+    assert mirror.sync() == 250
+    assert _mirror_rows(columnar) == (1250, float(sum(range(1250))))
+
+def test_deletion_triggers_full_copy(mirror):
+    mirror, source, columnar = mirror
+    mirror.sync(wait=True)
+    with source.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM sales WHERE id <= 100")
+    _insert(source, 100, start=1000)
+    assert mirror.sync() == 1000
+    assert _mirror_rows(columnar)[0] == 1000
+
+def test_single_worker_syncs(mirror):
+    mirror, source, columnar = mirror
+    mirror.sync(wait=True)
+    _insert(source, 10, start=1000)
+    other_worker = columnar_sync.ColumnarMirror(mirror.path)
+    with other_worker._sync_lock(wait=True) as acquired:
+        assert acquired
+        # Synchronisation en cours ailleurs : pas de seconde copie
+        assert mirror.sync() == 0
+    assert mirror.sync() == 10
+
+def test_catalog_describes_the_columnar_engine(mirror):
+    mirror, source, columnar = mirror
+    mirror.sync(wait=True)
+    catalog = SchemaCatalog(bind=columnar)
+    block = catalog.prompt_block()
+    assert "Table sales (~1000 rows):" in block
+    assert "product VARCHAR" in block and "amount DOUBLE" in block
+    assert "'c0'" in block
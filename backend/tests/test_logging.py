@@ -0,0 +1,25 @@
+import logging
+import logging.config
+import uvicorn.config
+from backend.app.core import logging as app_logging
+
+def test_uvicorn_access_lines_are_written_once(capsys):
+    app_logging.shutdown_logging()
+    # Configuration appliquée par uvicorn avant l'import de l'application
+    logging.config.dictConfig(uvicorn.config.LOGGING_CONFIG)
+    app_logging.setup_logging()
+    try:
+        for name in ("uvicorn", "uvicorn.access"):
+            logger = logging.getLogger(name)
+            assert logger.handlers == []
+            assert logger.propagate
+
+        logging.getLogger("uvicorn.access").info(
+            '%s - "%s %s HTTP/%s" %d', "127.0.0.1:5000", "GET", "/api/v1/query/health", "1.1", 200
+        )
+    finally:
+        app_logging.shutdown_logging()
+
+    output = capsys.readouterr().out
+    assert output.count("/api/v1/query/health") == 1
+    app_logging.setup_logging()
@@ -0,0 +1,19 @@
+import asyncio
+from backend.main import _run_periodically
+
+def test_periodic_task_survives_errors():
+    calls = []
+
+    def flaky():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+
+    async def run():
+        task = asyncio.create_task(_run_periodically(flaky, 0.01))
+        while len(calls) < 3:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert len(calls) >= 3
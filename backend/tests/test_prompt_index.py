@@ -0,0 +1,43 @@
+import pytest
+from backend.app.services.prompt_index import PromptIndex, literal_tokens
+
+SEED = [
+    ("ventes totales par mois", "SELECT strftime('%m', date), SUM(amount) FROM sales GROUP BY 1"),
+    ("nombre de ventes par produit", "SELECT product, COUNT(*) FROM sales GROUP BY product"),
+    ("montant moyen par catégorie", "SELECT category, AVG(amount) FROM sales GROUP BY category"),
+    ("âge moyen des clients par catégorie", "SELECT category, AVG(customer_age) FROM sales GROUP BY category"),
+    ("ventes de janvier", "SELECT * FROM sales WHERE strftime('%m', date) = '01'"),
+    ("chiffre d'affaires par produit", "SELECT product, SUM(amount) FROM sales GROUP BY product"),
+    ("top 10 des produits", "SELECT product, SUM(amount) FROM sales GROUP BY product ORDER BY 2 DESC LIMIT 10"),
+    ("répartition des ventes par tranche d'âge", "SELECT customer_age / 10, COUNT(*) FROM sales GROUP BY 1"),
+]
+
+ASCENDING = "ventes par catégorie triées par ordre croissant"
+ASCENDING_SQL = "SELECT category, SUM(amount) FROM sales GROUP BY category ORDER BY 2 ASC"
+
+@pytest.fixture
+def index(tmp_path):
+    index = PromptIndex(path=str(tmp_path / "index.db"))
+    for prompt, sql in SEED + [(ASCENDING, ASCENDING_SQL)]:
+        index.add(prompt, sql, "fp")
+    return index
+
+def test_reuses_sql_of_a_rephrased_prompt(index):
+    sql, _ = index.match("Ventes par catégorie, triées par ordre croissant ?", "fp")
+    assert sql == ASCENDING_SQL
+
+@pytest.mark.parametrize("prompt", [
+    "ventes par catégorie triées par ordre décroissant",
+    "ventes par catégorie triées par ordre croissant, les moins vendues",
+])
+def test_opposite_direction_is_not_reused(index, prompt):
+    # Très proche textuellement, mais la requête attendue est différente
+    assert index.search(prompt, "fp")[0][2] == ASCENDING_SQL
+    sql, examples = index.match(prompt, "fp")
+    assert sql is None
+    assert (ASCENDING, ASCENDING_SQL) in examples
+
+def test_direction_words_are_guarded():
+    assert literal_tokens("top 5 des produits") != literal_tokens("flop 5 des produits")
+    assert literal_tokens("ventes avant mars") != literal_tokens("ventes après mars")
+    assert literal_tokens("montant max par produit") != literal_tokens("montant min par produit")
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import create_engine, text
+from backend.app.api.v1.endpoints import query
+from backend.app.services.result_store import ResultStore
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(path=str(tmp_path / "results.db"), max_rows=250, batch_size=100)
+
+@pytest.fixture
+def numbers():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        yield lambda count: conn.execute(text(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :count) SELECT i FROM n"
+        ), {"count": count})
+    engine.dispose()
+
+class CountingResult:
+    """Compte les lignes lues sur le curseur."""
+
+    def __init__(self, result):
+        self.result = result
+        self.fetched = 0
+
+    def keys(self):
+        return self.result.keys()
+
+    def fetchmany(self, size):
+        rows = self.result.fetchmany(size)
+        self.fetched += len(rows)
+        return rows
+
+    def close(self):
+        self.result.close()
+
+def test_materialize_stops_reading_at_the_cap(store, numbers):
+    result = CountingResult(numbers(10_000))
+    meta = store.materialize(result, "SELECT i FROM n")
+    assert result.fetched == store.max_rows + 1
+    assert meta["stored_count"] == store.max_rows
+    assert meta["truncated"] is True
+    assert meta["total_count"] is None
+
+def test_small_result_keeps_its_total(store, numbers):
+    meta = store.materialize(numbers(120), "SELECT i FROM n")
+    assert (meta["total_count"], meta["stored_count"], meta["truncated"]) == (120, 120, False)
+
+def test_pages_cover_only_stored_rows(store, numbers, monkeypatch):
+    monkeypatch.setattr(query, "result_store", store)
+    meta = store.materialize(numbers(10_000), "SELECT i FROM n", visualization_type="bar", title="t")
+    first = query._build_page_response(meta, 1, 100, 0.0)
+    assert first.total_pages == 3
+    assert first.total_count is None and first.truncated
+    last = query._build_page_response(meta, first.total_pages, 100, 0.0)
+    assert [row["i"] for row in last.data] == list(range(201, 251))
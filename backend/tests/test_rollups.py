@@ -0,0 +1,106 @@
+import datetime
+import math
+import random
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from backend.app.services import ingestion, rollups
+
+QUERIES = [
+    # Réécrites : doivent donner le même résultat que sur sales
+    "SELECT category, SUM(amount), COUNT(*) FROM sales GROUP BY category ORDER BY category",
+    "SELECT customer_age, AVG(amount) FROM sales GROUP BY customer_age ORDER BY customer_age",
+    "SELECT MIN(customer_age), MAX(customer_age) FROM sales",
+    "SELECT strftime('%Y-%m', date) AS month, SUM(amount) FROM sales "
+    "GROUP BY strftime('%Y-%m', date) ORDER BY month",
+    "SELECT category, MAX(amount) FROM sales WHERE product = 'p1' GROUP BY category ORDER BY category",
+    # Agrégats sur des dimensions : une ligne d'agrégat n'est pas une vente
+    "SELECT AVG(customer_age) FROM sales",
+    "SELECT SUM(customer_age) FROM sales",
+    "SELECT COUNT(customer_age) FROM sales",
+    "SELECT category, COUNT(product) FROM sales GROUP BY category ORDER BY category",
+    "SELECT category, TOTAL(amount) FROM sales GROUP BY category ORDER BY category",
+]
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sales.db'}")
+    monkeypatch.setattr(rollups, "engine", engine)
+    monkeypatch.setattr(rollups.settings, "ROLLUPS_ENABLED", True)
+    rng = random.Random(42)
+    start = datetime.date(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE sales (id INTEGER PRIMARY KEY, date DATE, product TEXT, "
+            "category TEXT, amount REAL, customer_age INTEGER)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO sales (date, product, category, amount, customer_age) VALUES (?, ?, ?, ?, ?)",
+            [
+                (str(start + datetime.timedelta(days=rng.randrange(200))), f"p{rng.randrange(30)}",
+                 f"c{rng.randrange(5)}", rng.random() * 100, rng.randrange(18, 80))
+                for _ in range(20_000)
+            ]
+        )
+    manager = rollups.RollupManager()
+    manager.refresh()
+    yield manager, engine
+    engine.dispose()
+
+def _same(left, right):
+    if len(left) != len(right):
+        return False
+    for row_left, row_right in zip(left, right):
+        for a, b in zip(row_left, row_right):
+            if isinstance(a, float) or isinstance(b, float):
+                if not math.isclose(a, b, rel_tol=1e-9):
+                    return False
+            elif a != b:
+                return False
+    return True
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_rollup_matches_base_table(manager, query):
+    manager, engine = manager
+    with Session(engine) as db:
+        rewritten, _ = manager.rewrite(db, query)
+        expected = db.execute(text(query)).fetchall()
+        actual = db.execute(text(rewritten)).fetchall()
+    assert _same(expected, actual), rewritten
+
+@pytest.mark.parametrize("query", QUERIES[5:])
+def test_dimension_aggregates_stay_on_base_table(manager, query):
+    manager, engine = manager
+    with Session(engine) as db:
+        assert manager.rewrite(db, query) == (query, None)
+
+def test_measure_aggregates_use_rollup(manager):
+    manager, engine = manager
+    with Session(engine) as db:
+        _, name = manager.rewrite(db, QUERIES[0])
+    assert name == "monthly_category"
+
+def test_truncating_load_never_serves_old_aggregates(manager, tmp_path, monkeypatch):
+    manager, engine = manager
+    monkeypatch.setattr(ingestion, "engine", engine)
+    monkeypatch.setattr(ingestion, "init_db", lambda: None)
+    csv = tmp_path / "ventes.csv"
+    csv.write_text("date,product,category,amount,customer_age\n2024-06-01,p1,c1,10.0,30\n")
+
+    seen_during_load = []
+    insert = ingestion.SalesIngestor._insert
+
+    def observe_insert(self, conn, rows):
+        # Lecture depuis une autre connexion, comme une requête concurrente
+        with Session(engine) as db:
+            seen_during_load.append(manager.rewrite(db, QUERIES[0])[1])
+        insert(self, conn, rows)
+
+    monkeypatch.setattr(ingestion.SalesIngestor, "_insert", observe_insert)
+    ingestion.SalesIngestor(defer_index_rows=10**9).ingest([str(csv)], truncate=True)
+
+    assert seen_during_load == [None]
+    with Session(engine) as db:
+        rewritten, name = manager.rewrite(db, QUERIES[0])
+        assert name == "monthly_category"
+        assert db.execute(text(rewritten)).fetchall() == [("c1", 10.0, 1)]
@@ -0,0 +1,27 @@
+import json
+import pytest
+from backend.app.services import serialization
+from backend.app.services.serialization import to_columnar_json, to_columns, unique_column_names
+
+def test_duplicate_column_names_are_kept():
+    # SELECT a.id, b.id, b.id_2 ...
+    columns = ["id", "id", "id_2", "id"]
+    rows = [[1, 2, 3, 4], [5, 6, 7, 8]]
+    assert unique_column_names(columns) == ["id", "id_3", "id_2", "id_4"]
+
+    data = to_columns(columns, rows)
+    assert list(data.values()) == [[1, 5], [2, 6], [3, 7], [4, 8]]
+
+    payload = json.loads(to_columnar_json(columns, rows, {}))
+    assert [payload["data"][name] for name in payload["columns"]] == [[1, 5], [2, 6], [3, 7], [4, 8]]
+
+def test_unique_names_are_unchanged():
+    assert unique_column_names(["product", "total"]) == ["product", "total"]
+    assert to_columns(["a", "a"], []) == {"a": [], "a_2": []}
+
+@pytest.mark.skipif(serialization.pa is None, reason="pyarrow n'est pas installé")
+def test_arrow_keeps_duplicate_columns():
+    payload = serialization.to_arrow_ipc(["id", "id"], [[1, 2]], {})
+    table = serialization.pa_ipc.open_stream(payload).read_all()
+    assert table.column_names == ["id", "id_2"]
+    assert table.to_pylist() == [{"id": 1, "id_2": 2}]
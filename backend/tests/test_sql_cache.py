@@ -0,0 +1,44 @@
+import sqlite3
+from backend.app.services.sql_cache import SQLQueryCache
+
+def _last_access(path, cache, prompt):
+    with sqlite3.connect(path) as conn:
+        row = conn.execute(
+            "SELECT last_access FROM sql_cache WHERE cache_key = ?",
+            (cache.make_key(prompt, "fp"),)
+        ).fetchone()
+    return row[0] if row else None
+
+def test_memory_hits_reach_shared_store(tmp_path):
+    path = str(tmp_path / "cache.db")
+    # Deux workers partagent la même base
+    hot_worker = SQLQueryCache(path=path, max_entries=2, access_flush_interval=0)
+    other_worker = SQLQueryCache(path=path, max_entries=2, access_flush_interval=3600)
+
+    hot_worker.set("ventes chaudes", "fp", "SELECT 1")
+    stored = _last_access(path, hot_worker, "ventes chaudes")
+    other_worker.set("ventes tièdes", "fp", "SELECT 2")
+
+    # Servi par la mémoire : l'accès est reporté en base
+    assert hot_worker.get("ventes chaudes", "fp") == "SELECT 1"
+    assert _last_access(path, hot_worker, "ventes chaudes") > stored
+
+    # L'entrée chaude survit à l'éviction déclenchée par l'autre worker
+    other_worker.set("ventes froides", "fp", "SELECT 3")
+    assert _last_access(path, hot_worker, "ventes chaudes") is not None
+    assert _last_access(path, hot_worker, "ventes tièdes") is None
+
+def test_memory_hits_are_batched(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLQueryCache(path=path, access_flush_interval=3600)
+    cache.set("ventes par mois", "fp", "SELECT 1")
+    stored = _last_access(path, cache, "ventes par mois")
+
+    for _ in range(10):
+        assert cache.get("ventes par mois", "fp") == "SELECT 1"
+    # Pas d'écriture par accès mémoire avant l'intervalle...
+    assert _last_access(path, cache, "ventes par mois") == stored
+
+    # ... mais reporté avant la prochaine éviction
+    cache.set("ventes par région", "fp", "SELECT 2")
+    assert _last_access(path, cache, "ventes par mois") > stored
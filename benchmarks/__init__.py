@@ -0,0 +1 @@
+"""Outils de mesure de performance : données synthétiques, faux Mistral et injecteur de charge."""
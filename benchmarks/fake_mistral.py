@@ -0,0 +1,138 @@
+"""Serveur local imitant l'API chat de Mistral, avec latence configurable.
+
+Renvoie des requêtes SQL pré-écrites choisies selon les mots-clés du prompt,
+ce qui permet de mesurer le backend sans réseau ni clé d'API.
+
+Exemple :
+    python -m benchmarks.fake_mistral --port 8900 --latency-ms 1500 --jitter-ms 500
+    MISTRAL_ENDPOINT=http://127.0.0.1:8900 uvicorn backend.main:app
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_SQL = [
+    (("mois", "mensuel", "month", "évolution", "evolution"),
+     "SELECT strftime('%Y-%m', date) AS month, SUM(amount) AS total FROM sales GROUP BY month ORDER BY month"),
+    (("catégorie", "categorie", "category"),
+     "SELECT category, SUM(amount) AS total FROM sales GROUP BY category ORDER BY total DESC"),
+    (("âge", "age"),
+     "SELECT (customer_age / 10) * 10 AS age_bucket, COUNT(*) AS sales_count FROM sales GROUP BY age_bucket ORDER BY age_bucket"),
+    (("produit", "product", "top"),
+     "SELECT product, SUM(amount) AS total FROM sales GROUP BY product ORDER BY total DESC LIMIT 10"),
+    (("jour", "daily", "day"),
+     "SELECT date, SUM(amount) AS total FROM sales GROUP BY date ORDER BY date"),
+]
+DEFAULT_SQL = "SELECT date, product, category, amount, customer_age FROM sales ORDER BY date DESC LIMIT 100"
+
+class FakeMistralHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+    stats = {"requests": 0, "errors": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        # Silencieux : le serveur est sollicité des milliers de fois
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.stats_lock:
+                self._send_json(200, dict(self.stats))
+        else:
+            self._send_json(404, {"message": "Not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"message": "Not found"})
+            return
+
+        with self.stats_lock:
+            self.stats["requests"] += 1
+
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        time.sleep(delay)
+
+        if random.random() < self.error_rate:
+            with self.stats_lock:
+                self.stats["errors"] += 1
+            self._send_json(503, {"message": "Service unavailable (simulated)"})
+            return
+
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []) if m.get("role") == "user")
+        sql = pick_sql(prompt)
+        prompt_tokens = len(prompt.split())
+        completion_tokens = len(sql.split())
+        self._send_json(200, {
+            "id": f"cmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake-mistral"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": sql},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+def pick_sql(prompt: str) -> str:
+    """Choisit la requête pré-écrite correspondant au prompt."""
+    prompt_lower = prompt.lower()
+    for keywords, sql in CANNED_SQL:
+        if any(keyword in prompt_lower for keyword in keywords):
+            return sql
+    return DEFAULT_SQL
+
+def serve(host: str, port: int, latency_ms: float, jitter_ms: float, error_rate: float) -> ThreadingHTTPServer:
+    """Crée le serveur (à démarrer avec serve_forever)."""
+    handler = type("ConfiguredHandler", (FakeMistralHandler,), {
+        "latency_ms": latency_ms,
+        "jitter_ms": jitter_ms,
+        "error_rate": error_rate,
+        "stats": {"requests": 0, "errors": 0},
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Faux serveur Mistral pour les benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=1500.0, help="Latence moyenne simulée")
+    parser.add_argument("--jitter-ms", type=float, default=300.0, help="Écart-type de la latence")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 503")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Faux Mistral sur http://{args.host}:{args.port} (latence {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
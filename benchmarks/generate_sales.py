@@ -0,0 +1,158 @@
+"""Génère une table `sales` synthétique pour les tests de charge.
+
+Les distributions imitent des données réelles : saisonnalité (week-ends,
+fin d'année), catégories et produits très inégalement représentés,
+montants log-normaux par catégorie et âges concentrés autour de 30-45 ans.
+
+Exemple :
+    python -m benchmarks.generate_sales --rows 1000000 --db ./data/bench.db
+"""
+import argparse
+import sqlite3
+import time
+from datetime import date, timedelta
+from pathlib import Path
+import numpy as np
+
+CATALOG = {
+    "Électronique": (["Laptop Pro", "Smartphone X", "Tablette Y", "Écouteurs Z", "Montre connectée"], 5.6, 0.8),
+    "Vêtements": (["T-shirt Basic", "Jean Classic", "Chaussures Sport", "Veste Hiver", "Robe Été"], 3.8, 0.6),
+    "Alimentation": (["Café Premium", "Thé Vert", "Biscuits Bio", "Chocolat Noir", "Huile d'Olive"], 2.6, 0.5),
+    "Maison": (["Lampe Design", "Coussin", "Cafetière", "Aspirateur", "Set de Couteaux"], 4.2, 0.9),
+    "Sport": (["Tapis de Yoga", "Haltères", "Vélo d'Appartement", "Ballon", "Raquette"], 4.0, 1.0),
+    "Livres": (["Roman Policier", "Livre de Cuisine", "Bande Dessinée", "Guide de Voyage", "Essai"], 2.9, 0.4),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY,
+    date DATE,
+    product VARCHAR(100),
+    category VARCHAR(50),
+    amount DECIMAL(10,2),
+    customer_age INTEGER
+)
+"""
+
+# Index déclarés par le modèle Sale (backend/app/models/sales.py)
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_sales_date ON sales (date)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_product ON sales (product)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_category ON sales (category)",
+    "CREATE INDEX IF NOT EXISTS idx_date_category ON sales (date, category)",
+    "CREATE INDEX IF NOT EXISTS idx_category_amount ON sales (category, amount)",
+]
+
+def _zipf_weights(n: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def _day_weights(start: date, days: int) -> np.ndarray:
+    """Poids journaliers : croissance annuelle, pic de décembre et des week-ends."""
+    offsets = np.arange(days)
+    dates = [start + timedelta(days=int(d)) for d in offsets]
+    weekday = np.array([d.weekday() for d in dates])
+    month = np.array([d.month for d in dates])
+    weights = 1.0 + 0.15 * offsets / 365.0
+    weights *= np.where(weekday >= 5, 1.4, 1.0)
+    weights *= np.where(month == 12, 1.8, np.where(month == 11, 1.3, 1.0))
+    weights *= np.where(month == 8, 0.8, 1.0)
+    return weights / weights.sum()
+
+def generate_chunk(rng: np.random.Generator, size: int, date_strings: np.ndarray, day_weights: np.ndarray):
+    """Génère un lot de lignes (date, product, category, amount, customer_age)."""
+    categories = list(CATALOG)
+    category_idx = rng.choice(len(categories), size=size, p=_zipf_weights(len(categories), 0.8))
+    day_idx = rng.choice(len(day_weights), size=size, p=day_weights)
+    product_idx = rng.choice(5, size=size, p=_zipf_weights(5))
+
+    mu = np.array([CATALOG[c][1] for c in categories])[category_idx]
+    sigma = np.array([CATALOG[c][2] for c in categories])[category_idx]
+    amounts = np.round(rng.lognormal(mu, sigma), 2)
+
+    # Mélange de deux populations de clients, borné à 18-85 ans
+    young = rng.random(size) < 0.6
+    ages = np.where(young, rng.normal(31, 6, size), rng.normal(48, 11, size))
+    ages = np.clip(np.round(ages), 18, 85).astype(int)
+
+    for i in range(size):
+        category = categories[category_idx[i]]
+        yield (
+            date_strings[day_idx[i]],
+            CATALOG[category][0][product_idx[i]],
+            category,
+            float(amounts[i]),
+            int(ages[i]),
+        )
+
+def generate(
+    db_path: str,
+    rows: int,
+    start: date = date(2021, 1, 1),
+    days: int = 3 * 365,
+    batch_size: int = 50_000,
+    seed: int = 42,
+    truncate: bool = False,
+) -> float:
+    """Remplit la table `sales` et retourne le débit en lignes par seconde."""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(SCHEMA)
+    if truncate:
+        conn.execute("DELETE FROM sales")
+
+    # Les index sont reconstruits après le chargement
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'sales' AND sql IS NOT NULL").fetchall():
+        conn.execute(f'DROP INDEX "{name}"')
+
+    rng = np.random.default_rng(seed)
+    day_weights = _day_weights(start, days)
+    date_strings = np.array([(start + timedelta(days=d)).isoformat() for d in range(days)])
+    started = time.perf_counter()
+    written = 0
+    while written < rows:
+        size = min(batch_size, rows - written)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO sales (date, product, category, amount, customer_age) VALUES (?, ?, ?, ?, ?)",
+            generate_chunk(rng, size, date_strings, day_weights)
+        )
+        conn.execute("COMMIT")
+        written += size
+        print(f"\r{written:,}/{rows:,} lignes", end="", flush=True)
+    print()
+
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.execute("ANALYZE")
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    return rows / elapsed if elapsed else float("inf")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Génère des ventes synthétiques")
+    parser.add_argument("--db", default="./data/bench.db", help="Fichier SQLite cible")
+    parser.add_argument("--rows", type=int, default=10_000, help="Nombre de lignes (10k à 50M)")
+    parser.add_argument("--days", type=int, default=3 * 365, help="Période couverte en jours")
+    parser.add_argument("--start", default="2021-01-01", help="Date de début (AAAA-MM-JJ)")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="Vide la table avant génération")
+    args = parser.parse_args()
+
+    rate = generate(
+        args.db,
+        args.rows,
+        start=date.fromisoformat(args.start),
+        days=args.days,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        truncate=args.truncate,
+    )
+    print(f"{args.rows:,} lignes écrites dans {args.db} ({rate:,.0f} lignes/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Injecteur de charge pour l'endpoint d'analyse.
+
+Envoie des prompts en parallèle et rapporte les latences p50/p95/p99, le débit,
+les erreurs et une décomposition par étape (temps serveur `execution_time`,
+surcoût réseau/sérialisation, et étapes de l'en-tête Server-Timing si présent).
+
+Exemple :
+    python -m benchmarks.load_driver --concurrency 16 --requests 500 \\
+        --json-out bench_output.json --baseline previous.json
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import requests
+
+DEFAULT_URL = "http://localhost:8000/api/v1/query/query"
+
+DEFAULT_PROMPTS = [
+    "Montre l'évolution des ventes par mois",
+    "Quelles sont les ventes par catégorie",
+    "Répartition des ventes par âge des clients",
+    "Top des produits les plus vendus",
+    "Ventes par jour sur la période",
+    "Liste des dernières ventes",
+]
+
+_SERVER_TIMING_RE = re.compile(r"([\w.-]+)(?:;[^,]*?dur=([\d.]+))?")
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Extrait les durées (ms) d'un en-tête Server-Timing."""
+    timings = {}
+    if not header:
+        return timings
+    for part in header.split(","):
+        match = _SERVER_TIMING_RE.search(part.strip())
+        if match and match.group(2):
+            timings[match.group(1)] = float(match.group(2))
+    return timings
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentile par interpolation linéaire."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class LoadDriver:
+    def __init__(self, url: str, prompts: List[str], page_size: int, timeout: float):
+        self.url = url
+        self.prompts = prompts
+        self.page_size = page_size
+        self.timeout = timeout
+        self._local = threading.local()
+        self.samples: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        # Une session (connexions keep-alive) par thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send_one(self, prompt: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        sample: Dict[str, Any] = {"prompt": prompt}
+        try:
+            response = self._session().post(
+                self.url,
+                json={"prompt": prompt, "page": 1, "page_size": self.page_size},
+                timeout=self.timeout
+            )
+            sample["status"] = response.status_code
+            sample["bytes"] = len(response.content)
+            sample["stages"] = parse_server_timing(response.headers.get("Server-Timing"))
+            if response.ok and response.headers.get("content-type", "").startswith("application/json"):
+                sample["server_time"] = response.json().get("execution_time")
+        except requests.RequestException as e:
+            sample["status"] = type(e).__name__
+        sample["latency"] = time.perf_counter() - started
+        with self._lock:
+            self.samples.append(sample)
+        return sample
+
+    def run(self, total: int, concurrency: int, warmup: int = 0) -> float:
+        """Exécute la charge et retourne sa durée (hors échauffement)."""
+        for _ in range(warmup):
+            self.send_one(random.choice(self.prompts))
+        self.samples.clear()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(self.send_one, (random.choice(self.prompts) for _ in range(total))))
+        return time.perf_counter() - started
+
+def summarize(samples: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    """Agrège les mesures : percentiles, débit, erreurs et étapes."""
+    ok = [s for s in samples if s.get("status") == 200]
+    latencies = [s["latency"] * 1000 for s in ok]
+    server = [s["server_time"] * 1000 for s in ok if s.get("server_time") is not None]
+    overhead = [
+        s["latency"] * 1000 - s["server_time"] * 1000
+        for s in ok if s.get("server_time") is not None
+    ]
+
+    stages = defaultdict(list)
+    for s in ok:
+        for name, value in s.get("stages", {}).items():
+            stages[name].append(value)
+    stages["server_total"] = server
+    stages["client_overhead"] = overhead
+
+    def describe(values: List[float]) -> Dict[str, float]:
+        return {
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+            "mean": statistics.fmean(values) if values else 0.0,
+        }
+
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "errors": dict(Counter(str(s["status"]) for s in samples if s.get("status") != 200)),
+        "duration_s": duration,
+        "throughput_rps": len(ok) / duration if duration else 0.0,
+        "latency_ms": describe(latencies),
+        "stages_ms": {name: describe(values) for name, values in sorted(stages.items()) if values},
+        "mean_bytes": statistics.fmean([s["bytes"] for s in ok]) if ok else 0.0,
+    }
+
+def print_report(report: Dict[str, Any]) -> None:
+    latency = report["latency_ms"]
+    print(f"Requêtes : {report['requests']} ({report['succeeded']} OK) en {report['duration_s']:.1f} s")
+    print(f"Débit    : {report['throughput_rps']:.1f} req/s")
+    print(f"Latence  : p50 {latency['p50']:.0f} ms | p95 {latency['p95']:.0f} ms | p99 {latency['p99']:.0f} ms")
+    if report["errors"]:
+        print(f"Erreurs  : {report['errors']}")
+    print("Étapes (ms) :")
+    for name, values in report["stages_ms"].items():
+        print(f"  {name:<20} p50 {values['p50']:>8.1f} | p95 {values['p95']:>8.1f} | p99 {values['p99']:>8.1f}")
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Liste les régressions au-delà de la tolérance par rapport à une exécution de référence."""
+    regressions = []
+    for key in ("p50", "p95", "p99"):
+        before = baseline["latency_ms"][key]
+        after = report["latency_ms"][key]
+        if before and after > before * (1 + tolerance):
+            regressions.append(f"latence {key} : {before:.0f} -> {after:.0f} ms")
+    before = baseline["throughput_rps"]
+    if before and report["throughput_rps"] < before * (1 - tolerance):
+        regressions.append(f"débit : {before:.1f} -> {report['throughput_rps']:.1f} req/s")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Test de charge de /api/v1/query")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--prompts", help="Fichier texte, un prompt par ligne")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-out", help="Écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--baseline", help="Rapport JSON de référence pour détecter les régressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Régression tolérée (0.10 = 10 %%)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts, encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+
+    driver = LoadDriver(args.url, prompts, args.page_size, args.timeout)
+    duration = driver.run(args.requests, args.concurrency, args.warmup)
+    report = summarize(driver.samples, duration)
+    print_report(report)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("Régressions détectées :")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
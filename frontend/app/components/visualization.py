@@ -1,22 +1,72 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Hashable, List, Optional, Tuple, Union
+from collections import OrderedDict
+import os
+import threading
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 
+# Au-delà de ce nombre de points, lignes et nuages sont rendus en WebGL (scattergl)
+WEBGL_POINT_THRESHOLD = int(os.getenv("WEBGL_POINT_THRESHOLD", "5000"))
+
+EXPORT_MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml"
+}
+
 class VisualizationFactory:
-    """Factory pour créer des visualisations Plotly."""
-    
+    """Factory pour créer des visualisations Plotly.
+
+    Une instance (partagée via st.cache_resource) mémorise les figures par
+    (résultat, type de visualisation) et les exports d'images, générés
+    uniquement à la demande.
+    """
+
+    def __init__(self, max_figures: int = 64):
+        self.max_figures = max_figures
+        self._figures: "OrderedDict[Tuple, go.Figure]" = OrderedDict()
+        self._images: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _point_count(df: pd.DataFrame) -> int:
+        """Nombre de points tracés : lignes × séries numériques."""
+        return len(df) * max(1, len(df.select_dtypes("number").columns))
+
     @staticmethod
     def create_visualization(
-        data: List[Dict[str, Any]],
+        data: Union[List[Dict[str, Any]], pd.DataFrame],
         viz_type: str,
-        title: str
+        title: str,
+        reduction: Optional[Dict[str, Any]] = None
     ) -> go.Figure:
-        """Crée une visualisation Plotly basée sur le type et les données."""
-        df = pd.DataFrame(data)
-        
+        """Crée une visualisation Plotly basée sur le type et les données.
+
+        reduction décrit les données déjà réduites par le backend : un
+        histogramme arrive en classes pré-calculées (ou en barres par catégorie
+        pour des données non numériques), un camembert en paires
+        (catégorie, valeur) regroupées.
+        """
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        method = (reduction or {}).get("method")
+        if method == "bins":
+            return go.Figure(
+                go.Bar(
+                    x=(df["bin_start"] + df["bin_end"]) / 2,
+                    y=df["count"],
+                    width=df["bin_end"] - df["bin_start"]
+                ),
+                layout={"title": title, "bargap": 0}
+            )
+        if method == "top_bars":
+            return px.bar(df, x=df.columns[0], y=df.columns[1], title=title)
+        if method == "top_k":
+            return px.pie(df, names=df.columns[0], values=df.columns[1], title=title)
+
+        render_mode = "webgl" if VisualizationFactory._point_count(df) > WEBGL_POINT_THRESHOLD else "svg"
+
         if viz_type == 'line':
-            return px.line(df, title=title)
+            return px.line(df, title=title, render_mode=render_mode)
         elif viz_type == 'bar':
             return px.bar(df, title=title)
         elif viz_type == 'pie':
@@ -24,8 +74,49 @@ class VisualizationFactory:
         elif viz_type == 'histogram':
             return px.histogram(df, title=title)
         else:
-            return px.scatter(df, title=title)
-    
+            return px.scatter(df, title=title, render_mode=render_mode)
+
+    def _remember(self, store: OrderedDict, key: Tuple, value: Any) -> None:
+        """Mémorise une figure ou une image dans le cache LRU borné à max_figures."""
+        with self._lock:
+            store[key] = value
+            store.move_to_end(key)
+            while len(store) > self.max_figures:
+                store.popitem(last=False)
+
+    def get_visualization(
+        self,
+        data: pd.DataFrame,
+        viz_type: str,
+        title: str,
+        result_key: Hashable,
+        reduction: Optional[Dict[str, Any]] = None
+    ) -> go.Figure:
+        """Retourne la figure mémorisée pour (résultat, type), construite au premier appel.
+
+        result_key identifie les données affichées : un rerun Streamlit sur
+        le même résultat ne reconstruit pas la figure.
+        """
+        key = (result_key, viz_type)
+        with self._lock:
+            fig = self._figures.get(key)
+            if fig is not None:
+                self._figures.move_to_end(key)
+                return fig
+        fig = self.create_visualization(data, viz_type, title, reduction)
+        self._remember(self._figures, key, fig)
+        return fig
+
+    def export_image(self, fig: go.Figure, result_key: Hashable, viz_type: str, fmt: str = "png") -> bytes:
+        """Exporte la figure (rendu kaleido), une seule fois par (résultat, type, format)."""
+        key = (result_key, viz_type, fmt)
+        with self._lock:
+            image = self._images.get(key)
+        if image is None:
+            image = fig.to_image(format=fmt)
+            self._remember(self._images, key, image)
+        return image
+
     @staticmethod
     def get_visualization_options() -> Dict[str, str]:
         """Retourne les options de visualisation disponibles."""
@@ -40,5 +131,5 @@ class VisualizationFactory:
     @staticmethod
     def create_multiple_visualizations(data: list, viz_types: List[str], title: str) -> List[go.Figure]:
         """Crée plusieurs visualisations pour les mêmes données"""
-        return [VisualizationFactory.create_visualization(data, viz_type, title) 
-                for viz_type in viz_types] 
\ No newline at end of file
+        return [VisualizationFactory.create_visualization(data, viz_type, title)
+                for viz_type in viz_types]
@@ -1,22 +1,90 @@
 import requests
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator, Tuple
 import os
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import logging
-from datetime import datetime, timedelta
 import json
-from functools import lru_cache
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # dépendance optionnelle
+    pa = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNAR_MEDIA_TYPE = "application/vnd.columnar+json"
+
+UNKNOWN_HEALTH = {
+    "status": "unknown",
+    "version": "unknown",
+    "database_status": "unknown",
+    "ai_service_status": "unknown"
+}
 
 logger = logging.getLogger(__name__)
 
+class ResponseCache:
+    """Cache LRU à durée de vie des réponses paginées, partagé entre sessions."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Retourne la réponse en cache si elle n'a pas expiré, sinon None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, response = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key: Tuple, response: Dict[str, Any]) -> None:
+        """Enregistre une réponse et évince les plus anciennes au-delà de la taille maximale."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
 class APIService:
+    """Client du backend, partagé par toutes les sessions Streamlit (st.cache_resource).
+
+    Les réponses sont mises en cache par (prompt, page, taille de page), la
+    page suivante est préchargée en arrière-plan et l'état de santé est
+    rafraîchi par un thread dédié : aucun rendu n'attend le backend pour
+    une information déjà connue.
+    """
+
     def __init__(self):
         self.base_url = os.getenv("BACKEND_URL", "http://localhost:8000/api")
         self.session = self._create_session()
-        self.last_health_check = None
-        self.health_check_interval = 60  # secondes
+        self.health_check_interval = float(os.getenv("HEALTH_CHECK_INTERVAL", "60"))  # secondes
+        # Budget transmis au backend (X-Request-Timeout) : il abandonne la requête au-delà
+        self.request_timeout = float(os.getenv("REQUEST_TIMEOUT", "30"))  # secondes
+        self.cache = ResponseCache(
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+            max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "128"))
+        )
+        # Préchargements en cours : une requête identique attend le même appel
+        self._pending: Dict[Tuple, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        self._health = dict(UNKNOWN_HEALTH)
+        self._stop = threading.Event()
+        self._health_thread = threading.Thread(target=self._refresh_health, name="health", daemon=True)
+        self._health_thread.start()
 
     def _create_session(self) -> requests.Session:
         """Crée une session avec retry automatique."""
@@ -24,54 +92,143 @@ class APIService:
         retry_strategy = Retry(
             total=3,
             backoff_factor=1,
-            status_forcelist=[500, 502, 503, 504]
+            # 504 : échéance dépassée côté backend, relancer referait le même travail
+            status_forcelist=[500, 502, 503]
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # Pool dimensionné pour les sessions Streamlit et les préchargements simultanés
+        adapter = HTTPAdapter(max_retries=retry_strategy, pool_maxsize=20)
         session.mount("http://", adapter)
         session.mount("https://", adapter)
         return session
 
-    def _check_health(self) -> bool:
-        """Vérifie la santé du backend avec cache."""
-        current_time = datetime.now()
-        
-        # Utilise le cache si la dernière vérification est récente
-        if (self.last_health_check and 
-            (current_time - self.last_health_check).total_seconds() < self.health_check_interval):
-            return True
-
+    def _fetch_health(self) -> Dict[str, Any]:
+        """Interroge l'endpoint de santé ; retourne un statut "unhealthy" en cas d'erreur."""
         try:
             response = self.session.get(
                 f"{self.base_url}/health",
                 timeout=5
             )
-            self.last_health_check = current_time
-            return response.status_code == 200
+            response.raise_for_status()
+            return response.json()
         except Exception as e:
-            logger.error(f"Health check failed: {str(e)}")
-            return False
+            logger.error("Error getting health status: %s", e)
+            return {**UNKNOWN_HEALTH, "status": "unhealthy"}
+
+    def _refresh_health(self) -> None:
+        """Boucle du thread de santé, jusqu'à l'appel de close()."""
+        while not self._stop.is_set():
+            self._health = self._fetch_health()
+            self._stop.wait(self.health_check_interval)
+
+    def close(self) -> None:
+        """Arrête le thread de santé et les préchargements, puis ferme la session HTTP."""
+        self._stop.set()
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def get_health_status(self) -> Dict[str, Any]:
+        """Retourne le dernier statut connu du backend, sans appel réseau."""
+        return self._health
 
     def analyze_query(
         self,
         prompt: str,
         page: int = 1,
-        page_size: int = 10
+        page_size: int = 10,
+        result_id: Optional[str] = None,
+        columnar: bool = False
+    ) -> Dict[str, Any]:
+        """Analyse une requête avec pagination.
+
+        Si result_id est fourni, la page est lue depuis le résultat déjà
+        matérialisé côté backend, sans nouvel appel au LLM.
+        Si columnar est vrai, la page est transférée en Arrow IPC (ou en JSON
+        colonnaire) et renvoyée directement sous la clé "dataframe".
+        Une page déjà chargée (ou en cours de préchargement) est servie sans
+        nouvel appel.
+        """
+        key = (prompt, page, page_size, columnar)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                return pending.result()
+            except Exception:
+                pass  # le préchargement a échoué : nouvel essai au premier plan
+        return self._load(key, result_id)
+
+    def _load(self, key: Tuple, result_id: Optional[str]) -> Dict[str, Any]:
+        """Appelle le backend pour la page `key` et met la réponse en cache."""
+        prompt, page, page_size, columnar = key
+        response = self._post_query(prompt, page, page_size, result_id, columnar)
+        self.cache.set(key, response)
+        return response
+
+    def prefetch(
+        self,
+        prompt: str,
+        page: int,
+        page_size: int,
+        result_id: Optional[str],
+        columnar: bool = False
+    ) -> None:
+        """Charge une page en arrière-plan (typiquement la suivante) dans le cache."""
+        key = (prompt, page, page_size, columnar)
+        if self.cache.get(key) is not None:
+            return
+        with self._pending_lock:
+            if key in self._pending:
+                return
+            future = self._prefetcher.submit(self._load, key, result_id)
+            self._pending[key] = future
+        future.add_done_callback(lambda done: self._forget_pending(key, done))
+
+    def _forget_pending(self, key: Tuple, future: Future) -> None:
+        """Retire un préchargement terminé de la liste des appels en cours."""
+        with self._pending_lock:
+            self._pending.pop(key, None)
+        if future.exception() is not None:
+            logger.warning("Prefetch of page %s failed: %s", key[1], future.exception())
+
+    def _post_query(
+        self,
+        prompt: str,
+        page: int,
+        page_size: int,
+        result_id: Optional[str],
+        columnar: bool
     ) -> Dict[str, Any]:
-        """Analyse une requête avec pagination."""
-        if not self._check_health():
-            raise ConnectionError("Le service backend n'est pas disponible")
+        """Envoie la requête d'analyse au backend et décode la réponse (JSON ou colonnaire)."""
+        params = None
+        headers = {"X-Request-Timeout": str(self.request_timeout)}
+        if columnar:
+            response_format = "arrow" if pa is not None else "columnar"
+            params = {"format": response_format}
+            headers["Accept"] = ARROW_MEDIA_TYPE if pa is not None else COLUMNAR_MEDIA_TYPE
 
         try:
             response = self.session.post(
                 f"{self.base_url}/query",
+                params=params,
+                headers=headers,
                 json={
                     "prompt": prompt,
                     "page": page,
-                    "page_size": page_size
+                    "page_size": page_size,
+                    "result_id": result_id
                 },
-                timeout=30
+                # Marge pour recevoir le 504 du backend plutôt qu'un timeout local
+                timeout=self.request_timeout + 5
             )
+            if response.status_code == 404 and result_id:
+                # Résultat expiré côté backend : relance l'analyse complète
+                return self._post_query(prompt, page, page_size, None, columnar)
             response.raise_for_status()
+            if columnar:
+                return self._decode_columnar(response)
             return response.json()
             
         except requests.exceptions.Timeout:
@@ -86,20 +243,93 @@ class APIService:
         except Exception as e:
             raise Exception(f"Erreur inattendue: {str(e)}")
 
-    def get_health_status(self) -> Dict[str, Any]:
-        """Récupère le statut détaillé du backend."""
+    def get_chart_data(self, result_id: str, max_points: int) -> Dict[str, Any]:
+        """Données du graphique : tout le résultat, réduit côté serveur à max_points éléments.
+
+        La réduction dépend du type de visualisation (LTTB, classes
+        d'histogramme, top-k) ; la réponse est mise en cache comme une page.
+        """
+        key = ("chart", result_id, max_points)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response_format = "arrow" if pa is not None else "columnar"
         try:
             response = self.session.get(
-                f"{self.base_url}/health",
-                timeout=5
+                f"{self.base_url}/results/{result_id}",
+                params={"max_points": max_points, "format": response_format},
+                headers={"Accept": ARROW_MEDIA_TYPE if pa is not None else COLUMNAR_MEDIA_TYPE},
+                timeout=30
             )
             response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Error getting health status: {str(e)}")
-            return {
-                "status": "unhealthy",
-                "version": "unknown",
-                "database_status": "unknown",
-                "ai_service_status": "unknown"
-            } 
\ No newline at end of file
+        except requests.exceptions.Timeout:
+            raise TimeoutError("La requête a expiré. Veuillez réessayer.")
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f"Erreur de connexion: {str(e)}")
+        chart = self._decode_columnar(response)
+        self.cache.set(key, chart)
+        return chart
+
+    @staticmethod
+    def _decode_columnar(response: requests.Response) -> Dict[str, Any]:
+        """Décode une réponse Arrow IPC ou JSON colonnaire en DataFrame, sans objets par ligne."""
+        content_type = response.headers.get("content-type", "")
+        if content_type.startswith(ARROW_MEDIA_TYPE) and pa is not None:
+            table = pa.ipc.open_stream(response.content).read_all()
+            metadata = json.loads(table.schema.metadata[b"query_metadata"])
+            metadata["dataframe"] = table.to_pandas()
+            return metadata
+
+        payload = response.json()
+        if "data" in payload and isinstance(payload["data"], dict):
+            df = pd.DataFrame(payload.pop("data"), columns=payload.get("columns"))
+        else:
+            # Le backend a répondu au format ligne par ligne
+            df = pd.DataFrame(payload.pop("data", []))
+        payload["dataframe"] = df
+        return payload
+
+    def stream_query(
+        self,
+        prompt: str,
+        batch_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """Consomme la variante NDJSON de /query et produit les événements au fil de l'eau.
+
+        Les événements sont, dans l'ordre : "meta" (SQL, type de visualisation,
+        colonnes), des lots "rows", puis "end" (ou "error").
+        """
+        try:
+            with self.session.post(
+                f"{self.base_url}/query/stream",
+                params={"batch_size": batch_size},
+                json={"prompt": prompt},
+                stream=True,
+                timeout=30
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("type") == "error":
+                        raise ConnectionError(f"Erreur de connexion: {event.get('detail')}")
+                    yield event
+
+        except requests.exceptions.Timeout:
+            raise TimeoutError("La requête a expiré. Veuillez réessayer.")
+
+        except requests.exceptions.RequestException as e:
+            if e.response is not None:
+                error_detail = e.response.json().get('detail', str(e))
+                raise ConnectionError(f"Erreur de connexion: {error_detail}")
+            raise ConnectionError(f"Erreur de connexion: {str(e)}")
+
+    def iter_stream_rows(self, prompt: str, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """Produit les lignes du flux par lots, sous forme de dictionnaires."""
+        columns: List[str] = []
+        for event in self.stream_query(prompt, batch_size=batch_size):
+            if event["type"] == "meta":
+                columns = event["columns"]
+            elif event["type"] == "rows":
+                yield [dict(zip(columns, row)) for row in event["rows"]]
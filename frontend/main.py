@@ -1,12 +1,26 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-from app.components.visualization import VisualizationFactory
+from app.components.visualization import EXPORT_MEDIA_TYPES, VisualizationFactory
 from app.components.history import QueryHistory
 from app.components.examples import QueryExamples
 from app.components.styles import Styles
 from app.services.api import APIService
 from typing import Optional
+import os
+
+PAGE_SIZES = [10, 25, 50, 100]
+# Nombre maximal de points demandés au backend pour un graphique
+MAX_CHART_POINTS = int(os.getenv("MAX_CHART_POINTS", "2000"))
+
+@st.cache_resource
+def get_api_service() -> APIService:
+    """Client du backend partagé par toutes les sessions et conservé entre les reruns."""
+    return APIService()
+
+@st.cache_resource
+def get_viz_factory() -> VisualizationFactory:
+    """Factory partagée : figures et exports mémorisés d'un rerun à l'autre."""
+    return VisualizationFactory()
 
 def initialize_session_state() -> None:
     """Initialise les variables de session."""
@@ -18,6 +32,10 @@ def initialize_session_state() -> None:
         st.session_state.last_error = None
     if 'is_loading' not in st.session_state:
         st.session_state.is_loading = False
+    if 'last_result' not in st.session_state:
+        st.session_state.last_result = None
+    if 'active_prompt' not in st.session_state:
+        st.session_state.active_prompt = None
 
 def render_sidebar(
     query_history: QueryHistory,
@@ -39,19 +57,143 @@ def render_sidebar(
             
     return None
 
+def render_results(
+    api_service: APIService,
+    viz_factory: VisualizationFactory
+) -> None:
+    """Affiche la page courante du résultat de la requête active."""
+    prompt = st.session_state.active_prompt
+    page = st.session_state.current_page
+    page_size = st.session_state.page_size
+
+    # Réutilise le résultat matérialisé si le prompt n'a pas changé
+    last_result = st.session_state.last_result
+    result_id = None
+    if last_result and last_result["prompt"] == prompt:
+        result_id = last_result["result_id"]
+
+    try:
+        st.session_state.is_loading = True
+        st.session_state.last_error = None
+        # Appel à l'API (immédiat si la page est en cache ou préchargée)
+        with st.spinner("Analyse en cours..."):
+            response = api_service.analyze_query(
+                prompt,
+                page=page,
+                page_size=page_size,
+                result_id=result_id,
+                columnar=True
+            )
+    except Exception as e:
+        st.session_state.last_error = str(e)
+        st.error(f"❌ Erreur lors de l'analyse: {str(e)}")
+        return
+    finally:
+        st.session_state.is_loading = False
+
+    st.session_state.last_result = {
+        "prompt": prompt,
+        "result_id": response.get("result_id")
+    }
+
+    # Préchargement de la page suivante pendant la lecture de celle-ci
+    total_pages = response['total_pages']
+    if page < total_pages:
+        api_service.prefetch(
+            prompt,
+            page=page + 1,
+            page_size=page_size,
+            result_id=response.get("result_id"),
+            columnar=True
+        )
+
+    # Affichage des résultats
+    st.success(f"✅ Analyse terminée en {response['execution_time']:.2f} secondes")
+
+    # Affichage de la requête SQL
+    with st.expander("Voir la requête SQL générée"):
+        st.code(response['sql_query'], language='sql')
+
+    # Le DataFrame est décodé directement depuis le format colonnaire
+    df = response['dataframe']
+
+    # Affichage des données
+    st.subheader("Données")
+    st.dataframe(df)
+
+    # Visualisation : tout le résultat, réduit côté serveur selon le type de graphique
+    st.subheader("Visualisation")
+    viz_type = response['visualization_type']
+    chart_df, reduction = df, None
+    result_key = (prompt, page, page_size)
+    if response.get("result_id"):
+        try:
+            chart = api_service.get_chart_data(response["result_id"], MAX_CHART_POINTS)
+            chart_df, reduction = chart['dataframe'], chart.get('reduction')
+            result_key = response["result_id"]
+        except Exception as e:
+            st.warning(f"⚠️ Graphique limité à la page courante: {str(e)}")
+    fig = viz_factory.get_visualization(chart_df, viz_type, response['title'], result_key, reduction)
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Pagination
+    if total_pages > 1:
+        st.subheader("Navigation")
+        col1, col2, col3 = st.columns([1, 2, 1])
+
+        with col1:
+            if st.button("◀️ Précédent", disabled=page == 1):
+                st.session_state.current_page -= 1
+                st.experimental_rerun()
+
+        with col2:
+            st.markdown(f"Page {page} sur {total_pages}")
+
+        with col3:
+            if st.button("Suivant ▶️", disabled=page == total_pages):
+                st.session_state.current_page += 1
+                st.experimental_rerun()
+
+    # Options de téléchargement
+    st.subheader("Téléchargement")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        csv = df.to_csv(index=False)
+        st.download_button(
+            "📥 Télécharger CSV",
+            csv,
+            "analyse.csv",
+            "text/csv"
+        )
+
+    with col2:
+        # L'image n'est rendue (kaleido) que si l'utilisateur la demande
+        export_format = st.radio("Format du graphique", list(EXPORT_MEDIA_TYPES), horizontal=True)
+        export_key = (result_key, viz_type, export_format)
+        if st.button("🖼️ Préparer le graphique"):
+            st.session_state.export_request = export_key
+        if st.session_state.get("export_request") == export_key:
+            image = viz_factory.export_image(fig, result_key, viz_type, export_format)
+            st.download_button(
+                "📥 Télécharger Graphique",
+                image,
+                f"graphique.{export_format}",
+                EXPORT_MEDIA_TYPES[export_format]
+            )
+
 def render_main_content(
     api_service: APIService,
     viz_factory: VisualizationFactory,
     query_history: QueryHistory
 ) -> None:
     """Affiche le contenu principal de l'application."""
-    # Vérification de la santé du backend
-    try:
-        health_status = api_service.get_health_status()
-        if health_status["status"] != "healthy":
-            st.warning("⚠️ Le service backend est en état dégradé")
-    except Exception as e:
+    # État de santé du backend, rafraîchi en arrière-plan par le client
+    health_status = api_service.get_health_status()
+    if health_status["status"] == "unhealthy":
         st.error("⚠️ Impossible de se connecter au backend")
+    elif health_status["status"] == "degraded":
+        st.warning("⚠️ Le service backend est en état dégradé")
 
     # Zone de saisie
     prompt = st.text_area(
@@ -66,98 +208,26 @@ def render_main_content(
     with col1:
         page_size = st.selectbox(
             "Résultats par page",
-            options=[10, 25, 50, 100],
-            index=st.session_state.page_size // 10 - 1
+            options=PAGE_SIZES,
+            index=PAGE_SIZES.index(st.session_state.page_size)
         )
+    if page_size != st.session_state.page_size:
+        st.session_state.page_size = page_size
+        st.session_state.current_page = 1
 
     # Bouton d'analyse
     if st.button("Analyser", disabled=st.session_state.is_loading):
         if not prompt:
             st.error("Veuillez entrer une question")
         else:
-            try:
-                st.session_state.is_loading = True
-                st.session_state.last_error = None
-                
-                # Ajoute à l'historique
-                query_history.add_query(prompt)
-                
-                # Appel à l'API
-                response = api_service.analyze_query(
-                    prompt,
-                    page=st.session_state.current_page,
-                    page_size=page_size
-                )
-                
-                # Affichage des résultats
-                st.success(f"✅ Analyse terminée en {response['execution_time']:.2f} secondes")
-                
-                # Affichage de la requête SQL
-                with st.expander("Voir la requête SQL générée"):
-                    st.code(response['sql_query'], language='sql')
-                
-                # Création du DataFrame
-                df = pd.DataFrame(response['data'])
-                
-                # Affichage des données
-                st.subheader("Données")
-                st.dataframe(df)
-                
-                # Visualisation
-                st.subheader("Visualisation")
-                fig = viz_factory.create_visualization(
-                    response['data'],
-                    response['visualization_type'],
-                    response['title']
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Pagination
-                total_pages = response['total_pages']
-                if total_pages > 1:
-                    st.subheader("Navigation")
-                    col1, col2, col3 = st.columns([1, 2, 1])
-                    
-                    with col1:
-                        if st.button("◀️ Précédent", disabled=st.session_state.current_page == 1):
-                            st.session_state.current_page -= 1
-                            st.experimental_rerun()
-                    
-                    with col2:
-                        st.markdown(f"Page {st.session_state.current_page} sur {total_pages}")
-                    
-                    with col3:
-                        if st.button("Suivant ▶️", disabled=st.session_state.current_page == total_pages):
-                            st.session_state.current_page += 1
-                            st.experimental_rerun()
-                
-                # Options de téléchargement
-                st.subheader("Téléchargement")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    csv = df.to_csv(index=False)
-                    st.download_button(
-                        "📥 Télécharger CSV",
-                        csv,
-                        "analyse.csv",
-                        "text/csv"
-                    )
-                
-                with col2:
-                    png = fig.to_image(format="png")
-                    st.download_button(
-                        "📥 Télécharger Graphique",
-                        png,
-                        "graphique.png",
-                        "image/png"
-                    )
-                
-            except Exception as e:
-                st.session_state.last_error = str(e)
-                st.error(f"❌ Erreur lors de l'analyse: {str(e)}")
-            finally:
-                st.session_state.is_loading = False
+            # Ajoute à l'historique
+            query_history.add_query(prompt)
+            st.session_state.active_prompt = prompt
+            st.session_state.current_page = 1
+
+    # Le résultat reste affiché d'un rerun à l'autre (navigation entre pages)
+    if st.session_state.active_prompt:
+        render_results(api_service, viz_factory)
 
     # Affichage des erreurs
     if st.session_state.last_error:
@@ -167,10 +237,6 @@ def render_main_content(
         </div>
         """, unsafe_allow_html=True)
 
-    # Indicateur de chargement
-    if st.session_state.is_loading:
-        st.spinner("Analyse en cours...")
-
 def main():
     """Point d'entrée principal de l'application."""
     # Configuration de la page
@@ -187,8 +253,8 @@ def main():
     Styles.render_title()
     
     # Initialisation des composants
-    api_service = APIService()
-    viz_factory = VisualizationFactory()
+    api_service = get_api_service()
+    viz_factory = get_viz_factory()
     query_history = QueryHistory()
     query_examples = QueryExamples()
     